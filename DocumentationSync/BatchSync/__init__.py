@@ -0,0 +1,18 @@
+# __init__.py
+"""
+BatchSync
+-----------------
+
+A Python package for building and syncing the documentation of many libraries in a single run.
+
+## Installation
+
+```python
+from BatchSync.batch_sync import BatchSync
+```
+
+## Example usage:
+libraries = BatchSync.load_manifest("/path/to/libraries.json")
+results = BatchSync.run(libraries, build_workers=None, upload_workers=4)
+BatchSync.print_report(results)
+"""
@@ -0,0 +1,332 @@
+# batch_sync.py
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import List, NamedTuple, Optional
+
+import requests
+
+from ConfluenceUploader.confluence_session import ConfluenceSession
+from ConfluenceUploader.confluence_uploader import ConfluenceUploader
+from ConfluenceUploader.delta_sync import DeltaSync
+from DocumentationBuilder.archive_store import ArchiveStore
+from DocumentationBuilder.build_cache import BuildCache
+from DocumentationBuilder.build_process import BuildProcess
+from DocumentationBuilder.dependency_cache import DependencyCache
+from DocumentationBuilder.documentation_builder import DocumentationBuilder
+from RepositoryIndex.repository_index import RepositoryIndex
+from utility import Utility
+
+
+class LibrarySpec(NamedTuple):
+    """
+    A single library entry of a batch manifest.
+    """
+    repo_file_path: str
+    doc_type: str
+    project_name: str
+    scheme_name: Optional[str] = None
+    readme_page_id: Optional[str] = None
+    changelog_page_id: Optional[str] = None
+    attachment_page_id: Optional[str] = None
+    delta_attachments: bool = False
+    changelog_sections_per_page: Optional[int] = None
+
+
+class LibraryResult:
+    """
+    The status and stage timings of a single library in a batch run.
+    """
+
+    def __init__(self, library: LibrarySpec):
+        self.library = library
+        self.errors = []
+        self.build_seconds = 0.0
+        self.upload_seconds = 0.0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def succeeded(self) -> bool:
+        return not self.errors
+
+    @property
+    def total_seconds(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+
+class BatchSync:
+    """
+    A class for building and syncing the documentation of many libraries in a single process.
+
+    DocC builds are CPU bound and run in a process pool sized to the available cores, while
+    Confluence uploads are I/O bound and run in a separate, independently bounded thread pool.
+    README and CHANGELOG uploads do not depend on the build and start right away, the archive
+    attachment upload starts as soon as the library's build finishes. The versions of all README and
+    CHANGELOG pages are prefetched up front in a few batched requests. A failing library is recorded
+    in its result and never aborts the rest of the batch.
+
+    The class includes the following methods:
+
+    - load_manifest(manifest_path: str) -> List[LibrarySpec]:
+    Reads the list of libraries to sync from a JSON manifest.
+
+    - run(libraries: List[LibrarySpec], build_workers: Optional[int], upload_workers: int, force: bool, build_cache_dir: Optional[str], dependency_cache_dir: Optional[str], archive_store_dir: Optional[str], keep_archive_versions: int) -> List[LibraryResult]:
+    Builds and uploads the documentation of every library and returns a result per library.
+
+    - print_report(results: List[LibraryResult]):
+    Prints a per-library timing and status report.
+    """
+
+    @staticmethod
+    def load_manifest(manifest_path: str) -> List[LibrarySpec]:
+        """
+        Reads the list of libraries to sync from a JSON manifest of the form:
+
+        {
+            "libraries": [
+                {
+                    "repo_file_path": "/path/to/repo",
+                    "doc_type": "Package",
+                    "project_name": "MyPackageTarget",
+                    "scheme_name": null,
+                    "readme_page_id": "123",
+                    "changelog_page_id": "456",
+                    "attachment_page_id": "123",
+                    "delta_attachments": true,
+                    "changelog_sections_per_page": 20
+                }
+            ]
+        }
+
+        When an entry has no "doc_type", it is inferred from the build definition found at "repo_file_path",
+        which then also provides defaults for "project_name" and "scheme_name".
+
+        :param manifest_path: The path to the JSON manifest.
+        :return: The libraries listed in the manifest.
+        :raises ValueError: If a library entry is missing a required key, has unknown keys, or its doc_type can not be inferred.
+        """
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            entries = json.load(file)['libraries']
+
+        libraries = []
+        for index, entry in enumerate(entries):
+            if 'doc_type' not in entry and 'repo_file_path' in entry:
+                entry = BatchSync.__infer_build(entry, manifest_path, index)
+            try:
+                libraries.append(LibrarySpec(**entry))
+            except TypeError as e:
+                raise ValueError(f'Invalid library entry {index} in {manifest_path}: {e}')
+        return libraries
+
+    @staticmethod
+    def __infer_build(entry: dict, manifest_path: str, index: int) -> dict:
+        repository = RepositoryIndex.inspect(entry['repo_file_path'])
+        if repository.doc_type is None:
+            raise ValueError(
+                f'Invalid library entry {index} in {manifest_path}: no doc_type given, '
+                f'and no Package.swift, .xcodeproj or .xcframework found in {repository.path}')
+        entry = dict(entry, repo_file_path=repository.build_path, doc_type=repository.doc_type)
+        entry.setdefault('project_name', repository.target_name)
+        if repository.scheme_name:
+            entry.setdefault('scheme_name', repository.scheme_name)
+        return entry
+
+    @staticmethod
+    def run(
+        libraries: List[LibrarySpec],
+        build_workers: Optional[int] = None,
+        upload_workers: int = 4,
+        force: bool = False,
+        build_cache_dir: Optional[str] = None,
+        dependency_cache_dir: Optional[str] = None,
+        archive_store_dir: Optional[str] = None,
+        keep_archive_versions: int = ArchiveStore.DEFAULT_KEEP_VERSIONS
+    ) -> List[LibraryResult]:
+        """
+        Builds and uploads the documentation of every library.
+
+        :param libraries: The libraries to sync.
+        :param build_workers: The size of the build process pool, defaults to the number of available cores.
+        :param upload_workers: The size of the upload thread pool, and of the shared Confluence connection pool.
+        :param force: Publish every page, even if the sync manifest reports it as unchanged.
+        :param build_cache_dir: The directory of a build cache shared by all builds, or None to always build.
+        :param dependency_cache_dir: The directory of a dependency cache shared by all builds, or None to build
+            every library in its own directories.
+        :param archive_store_dir: The directory of an archive store shared by all builds, or None to keep every
+            archive as built.
+        :param keep_archive_versions: The number of versions of every library kept in the archive store.
+        :return: One result per library, in the order of `libraries`.
+        """
+        results = [LibraryResult(library) for library in libraries]
+        build_workers = build_workers or os.cpu_count() or 1
+        uploader = ConfluenceUploader(ConfluenceSession(pool_size=upload_workers), max_concurrency=upload_workers)
+
+        page_ids = [
+            page_id
+            for library in libraries
+            for page_id in (library.readme_page_id, library.changelog_page_id)
+            if page_id
+        ]
+        try:
+            uploader.prefetch_page_versions(page_ids)
+        except requests.exceptions.RequestException as e:
+            # Without the prefetch, every page update reads its own version.
+            print(f'Warning: could not prefetch page versions: {e}')
+
+        with ProcessPoolExecutor(max_workers=build_workers, initializer=_init_build_worker) as build_pool, \
+                ThreadPoolExecutor(max_workers=upload_workers) as upload_pool:
+            try:
+                upload_futures = {}
+                build_futures = {}
+
+                for result in results:
+                    upload_futures[upload_pool.submit(_upload_pages, uploader, result, force)] = result
+                    build_futures[build_pool.submit(
+                        _build_archive, result.library, build_cache_dir, dependency_cache_dir, archive_store_dir
+                    )] = result
+
+                for future in as_completed(build_futures):
+                    result = build_futures[future]
+                    try:
+                        archive_path, result.build_seconds = future.result()
+                    except Exception as e:
+                        result.errors.append(f'build: {e}')
+                        continue
+
+                    if archive_path is None:
+                        result.errors.append('build: no .doccarchive was produced')
+                    elif result.library.attachment_page_id:
+                        upload_futures[upload_pool.submit(
+                            _upload_archive, uploader, result.library, archive_path, force
+                        )] = result
+
+                for future in as_completed(upload_futures):
+                    result = upload_futures[future]
+                    try:
+                        result.upload_seconds += future.result()
+                    except Exception as e:
+                        result.errors.append(f'upload: {e}')
+            except BaseException:
+                # The builds run in process groups of their own, which only their worker can kill.
+                BatchSync.__terminate_build_workers(build_pool)
+                raise
+
+        uploader.close()
+        for result in results:
+            result.finished_at = time.monotonic()
+
+        if build_cache_dir:
+            BuildCache(build_cache_dir).print_stats()
+        if dependency_cache_dir:
+            DependencyCache(dependency_cache_dir).print_stats()
+        if archive_store_dir:
+            archive_store = ArchiveStore(archive_store_dir, keep_archive_versions)
+            archive_store.collect_garbage()
+            archive_store.print_stats()
+        return results
+
+    @staticmethod
+    def __terminate_build_workers(build_pool: ProcessPoolExecutor):
+        # Sends SIGTERM to every worker, which kills its builds, see `_init_build_worker`. ProcessPoolExecutor
+        # only has a public way to do so from Python 3.14 on. Queued builds are dropped.
+        workers = list((build_pool._processes or {}).values())
+        build_pool.shutdown(wait=False, cancel_futures=True)
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    @staticmethod
+    def print_report(results: List[LibraryResult]):
+        """
+        Prints a per-library timing and status report.
+
+        :param results: The results returned by `run`.
+        """
+        print(f'{"Library":<32} {"Status":<8} {"Build":>9} {"Upload":>9} {"Total":>9}')
+        for result in results:
+            status = 'ok' if result.succeeded else 'FAILED'
+            print(
+                f'{result.library.project_name:<32} {status:<8} '
+                f'{result.build_seconds:>8.1f}s {result.upload_seconds:>8.1f}s {result.total_seconds:>8.1f}s')
+            for error in result.errors:
+                print(f'    {error}')
+
+        failed = sum(1 for result in results if not result.succeeded)
+        print(f'Synced {len(results) - failed} of {len(results)} libraries, {failed} failed.')
+
+
+def _init_build_worker():
+    # Runs in every build worker process. Ctrl-C reaches the whole foreground process group, but only the
+    # batch process handles it, and terminates the workers. A SIGTERM kills the builds of the worker, which
+    # run in process groups of their own, and fails the builds it would still start.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: BuildProcess.cancel_all())
+
+
+def _build_archive(
+    library: LibrarySpec,
+    build_cache_dir: Optional[str],
+    dependency_cache_dir: Optional[str],
+    archive_store_dir: Optional[str]
+):
+    # Runs in a worker process, so it has to be a module level function.
+    start = time.monotonic()
+    archive_path = DocumentationBuilder.build_documentation_archive(
+        library.repo_file_path,
+        library.doc_type,
+        library.project_name,
+        library.scheme_name,
+        BuildCache(build_cache_dir) if build_cache_dir else None,
+        dependency_cache=DependencyCache(dependency_cache_dir) if dependency_cache_dir else None,
+        archive_store=ArchiveStore(archive_store_dir) if archive_store_dir else None
+    )
+    return archive_path, time.monotonic() - start
+
+
+def _upload_pages(uploader: ConfluenceUploader, result: LibraryResult, force: bool) -> float:
+    start = time.monotonic()
+    library = result.library
+    if library.readme_page_id or library.changelog_page_id:
+        repository = RepositoryIndex.inspect(library.repo_file_path)
+
+        # A missing file is recorded in the result, the other page is still published.
+        if library.readme_page_id and repository.readme_file is None:
+            result.errors.append(f'upload: README.md not found in {repository.path}')
+        elif library.readme_page_id:
+            uploader.update_confluence_page(
+                library.project_name,
+                repository.readme_file,
+                library.readme_page_id,
+                force
+            )
+
+        if library.changelog_page_id and repository.changelog_file is None:
+            result.errors.append(f'upload: CHANGELOG.md not found in {repository.path}')
+        elif library.changelog_page_id:
+            uploader.update_changelog_page(
+                f'{library.project_name} CHANGELOG',
+                repository.changelog_file,
+                library.changelog_page_id,
+                force,
+                library.changelog_sections_per_page
+            )
+    return time.monotonic() - start
+
+
+def _upload_archive(uploader: ConfluenceUploader, library: LibrarySpec, archive_path: str, force: bool) -> float:
+    start = time.monotonic()
+    if library.delta_attachments:
+        DeltaSync(uploader).sync_archive(str(archive_path), library.attachment_page_id, full=force)
+        return time.monotonic() - start
+
+    # A deterministic zip of an unchanged archive is byte-identical, so its upload is skipped by hash.
+    archive_zip = Utility.create_zip(str(archive_path), deterministic=True)
+    uploader.upload_file_to_confluence_page_as_attachment(
+        archive_zip,
+        library.attachment_page_id,
+        force
+    )
+    return time.monotonic() - start
@@ -0,0 +1,28 @@
+# __init__.py
+"""
+Benchmarks
+-----------------
+
+A Python package for measuring the performance of DocumentationSync without a Swift toolchain or a Confluence instance.
+
+A fake `swift`/`xcodebuild` produces synthetic .doccarchive trees, and a local HTTP server stands in for the
+Confluence v2 pages and attachment endpoints, with configurable latency and rate limiting.
+
+## Installation
+
+```python
+from Benchmarks.benchmark_suite import BenchmarkSuite
+```
+
+## Example usage:
+suite = BenchmarkSuite(repeat=5)
+results = suite.run()
+suite.store(results)
+
+## Command line:
+
+```bash
+cd DocumentationSync
+python3 -m Benchmarks --repeat 5 --file-count 2000 --latency-ms 50 --throttle-every 10
+```
+"""
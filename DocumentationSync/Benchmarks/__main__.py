@@ -0,0 +1,53 @@
+# __main__.py
+import argparse
+import sys
+
+from .benchmark_suite import BenchmarkSuite
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the DocumentationSync benchmarks against a fake toolchain and a local Confluence stand-in."
+    )
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        metavar="BENCHMARK",
+        help=f"The benchmarks to run, any of: {', '.join(BenchmarkSuite.BENCHMARKS)} (defaults to all).",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="The number of timed rounds of every benchmark.")
+    parser.add_argument("--file-count", type=int, default=500, help="The number of files of the synthetic .doccarchive.")
+    parser.add_argument("--file-bytes", type=int, default=4096, help="The size of every file of the synthetic .doccarchive.")
+    parser.add_argument("--markdown-sections", type=int, default=200, help="The number of sections of the synthetic README.")
+    parser.add_argument("--memory-probe-mb", type=float, default=8.0, help="The size of the CHANGELOG of the peak RSS benchmark.")
+    parser.add_argument("--page-count", type=int, default=20, help="The number of pages of the batch update benchmark.")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="The latency of every fake Confluence response.")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Answer every n-th request with a 429 (0 to never throttle).")
+    parser.add_argument("--results", default=None, help=f"The results file (defaults to {BenchmarkSuite.DEFAULT_RESULTS_PATH}).")
+    parser.add_argument("--threshold", type=float, default=10.0, help="The median slowdown, in percent, reported as a regression.")
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="Exit with status 1 if any benchmark regressed against the previous comparable run.",
+    )
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BenchmarkSuite.BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    suite = BenchmarkSuite(
+        repeat=args.repeat,
+        file_count=args.file_count,
+        file_bytes=args.file_bytes,
+        markdown_sections=args.markdown_sections,
+        memory_probe_bytes=int(args.memory_probe_mb * 1024 * 1024),
+        page_count=args.page_count,
+        latency_seconds=args.latency_ms / 1000.0,
+        throttle_every=args.throttle_every,
+        regression_threshold=args.threshold / 100.0,
+        results_path=args.results
+    )
+    results = suite.run(args.benchmarks)
+    previous = suite.store(results)
+    regressions = suite.print_report(results, previous)
+    sys.exit(1 if regressions and args.fail_on_regression else 0)
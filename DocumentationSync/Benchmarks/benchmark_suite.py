@@ -0,0 +1,589 @@
+# benchmark_suite.py
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import runpy
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List, Optional
+
+import markdown
+
+from . import import_probe
+from .fake_confluence import FakeConfluenceServer
+from .fake_toolchain import FakeToolchain
+from ConfluenceUploader.config import Config
+from ConfluenceUploader.confluence_uploader import ConfluenceUploader
+from ConfluenceUploader.sync_manifest import SyncManifest
+from DocumentationBuilder.archive_store import ArchiveStore
+from markdown_renderer import MarkdownRenderer
+from utility import Utility
+
+
+class BenchmarkSuite:
+    """
+    A class for running reproducible performance benchmarks of DocumentationSync, entirely locally.
+
+    Builds run against `FakeToolchain` and uploads against `FakeConfluenceServer`, so the suite runs on
+    any machine with Python. Inputs are generated from fixed seeds and sizes, every benchmark runs a
+    warm-up round before its timed rounds, and results are appended, with the git commit they were
+    measured on, to a JSON lines file, where every run is compared against the previous run with the
+    same parameters.
+
+    The class includes the following methods:
+
+    - run(names: Optional[List[str]]) -> dict:
+    Runs the benchmarks and returns their timings.
+
+    - store(results: dict) -> Optional[dict]:
+    Appends results to the results file and returns the previous comparable results, if any.
+
+    - print_report(results: dict, previous: Optional[dict]) -> List[str]:
+    Prints the timings next to the previous results, and returns the names of the regressed benchmarks.
+    """
+
+    BENCHMARKS = ('create_zip', 'store_archive', 'render_markdown_cold', 'render_markdown_warm',
+                  'render_storage_format', 'update_confluence_page', 'update_confluence_pages',
+                  'update_reformatted_page', 'main', 'markdown_peak_rss', 'import_time_build', 'import_time_upload')
+    # The highest peak RSS growth, per byte of Markdown input, of rendering and serializing a large page.
+    PEAK_RSS_CEILING_RATIO = 6.0
+    # Smaller CHANGELOGs probed by `markdown_peak_rss` besides `memory_probe_bytes`, as the ceiling holds for
+    # every size: fixed costs weigh the most on small pages. Below 256 KiB, fixed-size buffers dominate.
+    MEMORY_PROBE_SMALL_SIZES = (256 * 1024, 1024 * 1024 - 4096, 1024 * 1024)
+    # The most time a fresh interpreter may spend importing modules for a build-only and an upload-only
+    # command, and the modules it must not import at all. A build imports asyncio, about 30 ms, to supervise
+    # its subprocess.
+    IMPORT_BUDGETS = {
+        'import_time_build': (0.1, ('markdown', 'requests')),
+        'import_time_upload': (0.3, ()),
+    }
+    DEFAULT_RESULTS_PATH = '~/.documentation_sync/benchmarks/results.jsonl'
+
+    def __init__(
+        self,
+        repeat: int = 5,
+        file_count: int = 500,
+        file_bytes: int = 4096,
+        markdown_sections: int = 200,
+        memory_probe_bytes: int = 8 * 1024 * 1024,
+        page_count: int = 20,
+        latency_seconds: float = 0.02,
+        throttle_every: int = 0,
+        regression_threshold: float = 0.10,
+        results_path: Optional[str] = None
+    ):
+        """
+        :param repeat: The number of timed rounds of every benchmark.
+        :param file_count: The number of files of the synthetic .doccarchive.
+        :param file_bytes: The size of every file of the synthetic .doccarchive.
+        :param markdown_sections: The number of sections of the synthetic README.
+        :param memory_probe_bytes: The size of the generated CHANGELOG of the `markdown_peak_rss` benchmark.
+        :param page_count: The number of pages updated by the `update_confluence_pages` benchmark.
+        :param latency_seconds: The latency of every response of the fake Confluence server.
+        :param throttle_every: Answer every n-th request with a 429, or 0 to never throttle.
+        :param regression_threshold: The relative slowdown of a median reported as a regression.
+        :param results_path: The JSON lines file results are stored in.
+        """
+        self.repeat = repeat
+        self.parameters = {
+            'file_count': file_count,
+            'file_bytes': file_bytes,
+            'markdown_sections': markdown_sections,
+            'memory_probe_bytes': memory_probe_bytes,
+            'page_count': page_count,
+            'latency_seconds': latency_seconds,
+            'throttle_every': throttle_every
+        }
+        self.regression_threshold = regression_threshold
+        self.results_path = os.path.expanduser(results_path or BenchmarkSuite.DEFAULT_RESULTS_PATH)
+
+    def run(self, names: Optional[List[str]] = None) -> dict:
+        """
+        Runs the benchmarks in an isolated working directory, with the fake toolchain and Confluence server.
+
+        :param names: The benchmarks to run, defaults to all of `BENCHMARKS`.
+        :return: The commit, environment, parameters and the timings of every benchmark.
+        :raises ValueError: If an unknown benchmark name is given.
+        """
+        names = names or list(BenchmarkSuite.BENCHMARKS)
+        unknown = set(names) - set(BenchmarkSuite.BENCHMARKS)
+        if unknown:
+            raise ValueError(f'Unknown benchmarks: {", ".join(sorted(unknown))}')
+
+        work_dir = tempfile.mkdtemp(prefix='documentation-sync-benchmark-')
+        toolchain = FakeToolchain(
+            os.path.join(work_dir, 'bin'),
+            self.parameters['file_count'],
+            self.parameters['file_bytes']
+        )
+        toolchain.install()
+        server = FakeConfluenceServer(
+            self.parameters['latency_seconds'],
+            self.parameters['throttle_every']
+        )
+
+        saved_environment = dict(os.environ)
+        saved_config = {name: getattr(Config, name) for name in dir(Config) if name.isupper()}
+        saved_renderer = Utility.MARKDOWN_RENDERER
+        try:
+            os.environ.update(toolchain.environment())
+            server.start()
+            Config.CONFLUENCE_BASE_URL = server.base_url
+            Config.SYNC_MANIFEST_PATH = os.path.join(work_dir, 'sync_manifest.json')
+            Config.DELTA_INDEX_DIRECTORY = os.path.join(work_dir, 'delta_indexes')
+            Config.PUBLISHED_STORAGE_DIRECTORY = os.path.join(work_dir, 'published_storage')
+            Config.PUBLISH_JOURNAL_DIRECTORY = os.path.join(work_dir, 'publish_journal')
+            Config.CONFLUENCE_PARENT_PAGE_ID = '1'
+            Config.CONFLUENCE_CHANGELOG_PAGE_ID = '2'
+            # Throttled requests are retried right away, a benchmark measures the retries, not the backoff.
+            Config.CONFLUENCE_BACKOFF_SECONDS = 0.01
+
+            # Renders never hit the on-disk render cache of previous runs.
+            Utility.MARKDOWN_RENDERER = MarkdownRenderer(cache_dir=None)
+
+            benchmark_functions = {
+                'create_zip': self.__benchmark_create_zip,
+                'store_archive': self.__benchmark_store_archive,
+                'render_markdown_cold': self.__benchmark_render_markdown_cold,
+                'render_markdown_warm': self.__benchmark_render_markdown_warm,
+                'render_storage_format': self.__benchmark_render_storage_format,
+                'update_confluence_page': self.__benchmark_update_confluence_page,
+                'update_confluence_pages': self.__benchmark_update_confluence_pages,
+                'update_reformatted_page': self.__benchmark_update_reformatted_page,
+                'main': self.__benchmark_main,
+                'markdown_peak_rss': self.__benchmark_markdown_peak_rss,
+                'import_time_build': self.__benchmark_import_time_build,
+                'import_time_upload': self.__benchmark_import_time_upload
+            }
+            repo_path = self.__create_repository(work_dir)
+            benchmarks = {}
+            for name in names:
+                print(f'Running benchmark {name}...')
+                benchmarks[name] = benchmark_functions[name](repo_path, server)
+        finally:
+            server.stop()
+            os.environ.clear()
+            os.environ.update(saved_environment)
+            for name, value in saved_config.items():
+                setattr(Config, name, value)
+            Utility.MARKDOWN_RENDERER = saved_renderer
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return {
+            'commit': BenchmarkSuite.__git_commit(),
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': dict(self.parameters, repeat=self.repeat),
+            'benchmarks': benchmarks
+        }
+
+    def store(self, results: dict) -> Optional[dict]:
+        """
+        Appends results to the results file.
+
+        :param results: The results returned by `run`.
+        :return: The most recent stored results with the same parameters, or None.
+        """
+        previous = None
+        try:
+            with open(self.results_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('parameters') == results['parameters']:
+                        previous = entry
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(self.results_path), exist_ok=True)
+        with open(self.results_path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(results) + '\n')
+        print(f'Stored benchmark results in {self.results_path}')
+        return previous
+
+    def print_report(self, results: dict, previous: Optional[dict] = None) -> List[str]:
+        """
+        Prints the median of every benchmark next to the previous results.
+
+        :param results: The results returned by `run`.
+        :param previous: The previous results returned by `store`, if any.
+        :return: The names of the benchmarks whose median regressed by more than the regression threshold,
+            whose peak RSS exceeded its ceiling, whose imports exceeded their budget, that wrote pages
+            that were structurally unchanged, or whose storage format render is slower than a plain render.
+        """
+        regressions = []
+        previous_benchmarks = (previous or {}).get('benchmarks', {})
+        baseline = f' (vs {previous["commit"][:10]})' if previous else ''
+        print(f'Benchmarks at {results["commit"][:10]}{baseline}')
+        print(f'{"Benchmark":<26} {"Median":>10} {"Min":>10} {"Stdev":>10} {"Previous":>10} {"Change":>8}')
+        for name, benchmark in results['benchmarks'].items():
+            line = (f'{name:<26} {benchmark["median"]:>9.4f}s {benchmark["min"]:>9.4f}s '
+                    f'{benchmark["stdev"]:>9.4f}s')
+            previous_benchmark = previous_benchmarks.get(name)
+            if previous_benchmark:
+                change = benchmark['median'] / previous_benchmark['median'] - 1 if previous_benchmark['median'] else 0.0
+                line += f' {previous_benchmark["median"]:>9.4f}s {change:>+7.1%}'
+                if change > self.regression_threshold:
+                    line += '  REGRESSION'
+                    regressions.append(name)
+            if 'rss_ratio' in benchmark:
+                line += f'  peak RSS {benchmark["rss_ratio"]:.1f}x input (ceiling {benchmark["rss_ceiling_ratio"]:.1f}x)'
+                if benchmark['rss_ratio'] > benchmark['rss_ceiling_ratio']:
+                    line += '  OVER CEILING'
+                    if name not in regressions:
+                        regressions.append(name)
+            if 'import_seconds' in benchmark:
+                line += (f'  imports {benchmark["import_seconds"] * 1000:.1f}ms '
+                         f'(budget {benchmark["import_budget_seconds"] * 1000:.0f}ms)')
+                over_budget = benchmark['import_seconds'] > benchmark['import_budget_seconds']
+                if over_budget:
+                    line += '  OVER BUDGET'
+                if benchmark['forbidden_imports']:
+                    line += f'  IMPORTS {", ".join(benchmark["forbidden_imports"])}'
+                if (over_budget or benchmark['forbidden_imports']) and name not in regressions:
+                    regressions.append(name)
+            if 'blob_bytes' in benchmark:
+                line += (f'  {benchmark["archive_bytes"] / 1024 ** 2:.1f} MB of archives stored in '
+                         f'{benchmark["blob_bytes"] / 1024 ** 2:.1f} MB')
+            if 'plain_median' in benchmark:
+                line += f'  {benchmark["plain_ratio"]:.2f}x plain render ({benchmark["plain_median"]:.4f}s)'
+                if benchmark['plain_ratio'] > 1 + self.regression_threshold:
+                    line += '  SLOWER THAN PLAIN RENDER'
+                    if name not in regressions:
+                        regressions.append(name)
+            if 'page_writes' in benchmark:
+                line += f'  {benchmark["page_writes"]} page writes'
+                if benchmark['page_writes']:
+                    line += '  UNCHANGED PAGES WRITTEN'
+                    if name not in regressions:
+                        regressions.append(name)
+            print(line)
+        return regressions
+
+    def __benchmark_create_zip(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        archive_path = self.__build_archive(repo_path)
+        zip_path = f'{os.path.splitext(archive_path)[0]}.zip'
+
+        def create_zip():
+            Utility.create_zip(archive_path)
+            return {'zip_bytes': os.path.getsize(zip_path)}
+
+        return self.__measure(create_zip)
+
+    def __benchmark_store_archive(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        archive_path = self.__build_archive(repo_path)
+        work_dir = os.path.dirname(repo_path)
+        archive_store = ArchiveStore(os.path.join(work_dir, 'archive_store'))
+        rounds = iter(range(self.repeat + 1))
+
+        def store_archive():
+            # Every round is a new version of the archive, with one changed file.
+            with open(os.path.join(archive_path, 'benchmark-version.json'), 'w', encoding='utf-8') as file:
+                json.dump({'round': next(rounds)}, file)
+            manifest = archive_store.put('BenchmarkKit', archive_path)
+            archive_store.materialize('BenchmarkKit', os.path.join(work_dir, 'materialized'), manifest.version)
+            stats = archive_store.stats()
+            return {'archive_bytes': stats['archive_bytes'], 'blob_bytes': stats['blob_bytes']}
+
+        return self.__measure(store_archive)
+
+    def __benchmark_render_markdown_cold(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        readme_path = os.path.join(repo_path, 'README.md')
+
+        def render():
+            Utility.MARKDOWN_RENDERER = MarkdownRenderer(cache_dir=None)
+            Utility.render_markdown_file_as_HTML(readme_path)
+
+        return self.__measure(render)
+
+    def __benchmark_render_markdown_warm(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        readme_path = os.path.join(repo_path, 'README.md')
+        Utility.MARKDOWN_RENDERER = MarkdownRenderer(cache_dir=None)
+        return self.__measure(lambda: Utility.render_markdown_file_as_HTML(readme_path))
+
+    def __benchmark_render_storage_format(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        corpus = BenchmarkSuite.__create_storage_corpus(self.parameters['markdown_sections'])
+        plain_parser = markdown.Markdown(output_format='xhtml')
+
+        def render_storage_format():
+            renderer = MarkdownRenderer(cache_dir=None)
+            return {'storage_bytes': sum(len(renderer.render(source)) for source in corpus)}
+
+        def render_plain():
+            # The render the storage format render replaced: plain XHTML, then every `&` escaped.
+            for source in corpus:
+                plain_parser.reset().convert(source).replace('&', '&amp;')
+
+        measurement = self.__measure(render_storage_format, baseline=render_plain)
+        measurement['corpus_bytes'] = sum(len(source.encode('utf-8')) for source in corpus)
+        measurement['plain_median'] = statistics.median(measurement['baseline_rounds'])
+        # Every round is compared with the plain render of the same round, the median ratio ignores rounds
+        # that another process slowed down.
+        measurement['plain_ratio'] = statistics.median(
+            storage_seconds / plain_seconds
+            for storage_seconds, plain_seconds in zip(measurement['rounds'], measurement['baseline_rounds'])
+        )
+        return measurement
+
+    def __benchmark_update_confluence_page(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        readme_path = os.path.join(repo_path, 'README.md')
+        uploader = ConfluenceUploader(manifest=SyncManifest(Config.SYNC_MANIFEST_PATH))
+        try:
+            return self.__measure(
+                lambda: uploader.update_confluence_page('Benchmark', readme_path, '10', force=True),
+                server
+            )
+        finally:
+            uploader.close()
+
+    def __benchmark_update_confluence_pages(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        readme_path = os.path.join(repo_path, 'README.md')
+        updates = [(f'Benchmark {index}', readme_path, str(1000 + index))
+                   for index in range(self.parameters['page_count'])]
+        uploader = ConfluenceUploader(manifest=SyncManifest(Config.SYNC_MANIFEST_PATH))
+        try:
+            def update_pages():
+                errors = [error for error in uploader.update_confluence_pages(updates, force=True) if error]
+                if errors:
+                    raise errors[0]
+
+            return self.__measure(update_pages, server)
+        finally:
+            uploader.close()
+
+    def __benchmark_update_reformatted_page(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        readme_path = os.path.join(repo_path, 'README.md')
+        body_content = Utility.render_markdown_file_as_HTML(readme_path)
+        # The same page with other line breaks between its blocks, like the output of an upgraded renderer.
+        renderings = [body_content, re.sub(r'(</(?:p|h[1-6]|ul|ol|table|blockquote)>)', r'\1\n\n', body_content)]
+        uploader = ConfluenceUploader(manifest=SyncManifest(Config.SYNC_MANIFEST_PATH))
+        rounds = iter(range(self.repeat + 1))
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                uploader.update_confluence_page_content('Benchmark reformatted', body_content, '20', force=True)
+
+            def update_page():
+                # Alternating renderings never match the manifest digest, so every round diffs the page.
+                uploader.update_confluence_page_content('Benchmark reformatted', renderings[(next(rounds) + 1) % 2], '20')
+                return {'page_writes': server.request_counts['PUT']}
+
+            return self.__measure(update_page, server)
+        finally:
+            uploader.close()
+
+    def __benchmark_main(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        main = runpy.run_path(
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '__main__.py'),
+            run_name='documentation_sync_main'
+        )['main']
+
+        def run_main():
+            Utility.MARKDOWN_RENDERER = MarkdownRenderer(cache_dir=None)
+            shutil.rmtree(os.path.join(repo_path, '.build'), ignore_errors=True)
+            if not main('Package', repo_path, 'BenchmarkKit', None, force=True):
+                raise RuntimeError('main reported a failed stage')
+
+        return self.__measure(run_main, server)
+
+    def __benchmark_markdown_peak_rss(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        rss_ratios = []
+
+        def probe():
+            result = None
+            for size_bytes in (*BenchmarkSuite.MEMORY_PROBE_SMALL_SIZES, self.parameters['memory_probe_bytes']):
+                # A fresh process for every size and round, which measures the peak RSS of its render alone.
+                output = subprocess.run(
+                    [sys.executable, '-m', 'Benchmarks.memory_probe', '--size-mb', str(size_bytes / 1024 / 1024)],
+                    capture_output=True, text=True, check=True,
+                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+                ).stdout
+                result = json.loads(output)
+                rss_ratios.append((result['peak_rss_bytes'] - result['baseline_rss_bytes']) / result['input_bytes'])
+            # The sizes stored with the timings are those of the `memory_probe_bytes` CHANGELOG.
+            return result
+
+        measurement = self.__measure(probe)
+        # The worst round and size counts, a ceiling holds for every render.
+        measurement['rss_ratio'] = max(rss_ratios)
+        measurement['rss_ceiling_ratio'] = BenchmarkSuite.PEAK_RSS_CEILING_RATIO
+        return measurement
+
+    def __benchmark_import_time_build(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        return self.__measure_imports('import_time_build', [repo_path, 'BenchmarkKit', 'Package', '--build-only'])
+
+    def __benchmark_import_time_upload(self, repo_path: str, server: FakeConfluenceServer) -> dict:
+        return self.__measure_imports(
+            'import_time_upload', [repo_path, 'BenchmarkKit', 'Package', '--upload-only'], server)
+
+    def __measure_imports(self, name: str, argv: List[str], server: Optional[FakeConfluenceServer] = None) -> dict:
+        # The command runs in a fresh interpreter, which only sees the Config overrides passed to it.
+        config = {attribute: getattr(Config, attribute) for attribute in (
+            'CONFLUENCE_BASE_URL', 'CONFLUENCE_PARENT_PAGE_ID', 'CONFLUENCE_CHANGELOG_PAGE_ID',
+            'SYNC_MANIFEST_PATH', 'DELTA_INDEX_DIRECTORY', 'PUBLISHED_STORAGE_DIRECTORY', 'PUBLISH_JOURNAL_DIRECTORY',
+            'CONFLUENCE_BACKOFF_SECONDS'
+        )}
+        # The render cache and every other default path under ~ stay inside the working directory.
+        environment = dict(os.environ, HOME=os.path.dirname(argv[0]))
+        import_seconds = []
+
+        def run_command():
+            result = import_probe.probe(argv, config, environment)
+            if result['exit_code'] != 0:
+                raise RuntimeError(f'{" ".join(argv)} exited with status {result["exit_code"]}')
+            import_seconds.append(result['import_seconds'])
+            return result
+
+        measurement = self.__measure(run_command, server)
+        budget_seconds, forbidden_modules = BenchmarkSuite.IMPORT_BUDGETS[name]
+        # The first import time is from the warm-up round.
+        measurement['import_seconds'] = statistics.median(import_seconds[1:])
+        measurement['import_budget_seconds'] = budget_seconds
+        measurement['forbidden_imports'] = sorted(set(forbidden_modules) & set(measurement['modules']))
+        measurement['modules'] = len(measurement['modules'])
+        return measurement
+
+    def __measure(
+        self,
+        function: Callable,
+        server: Optional[FakeConfluenceServer] = None,
+        baseline: Optional[Callable] = None
+    ) -> dict:
+        seconds = []
+        baseline_seconds = []
+
+        def run_baseline(round_number: int):
+            start = time.perf_counter()
+            baseline()
+            if round_number > 0:
+                baseline_seconds.append(time.perf_counter() - start)
+
+        for round_number in range(self.repeat + 1):
+            if server is not None:
+                server.reset_counts()
+            with contextlib.redirect_stdout(io.StringIO()):
+                # A baseline runs next to the function in every round, so both see the same machine load, and
+                # alternately before and after it, so neither always runs on the heap the other left behind.
+                if baseline is not None and round_number % 2:
+                    run_baseline(round_number)
+                start = time.perf_counter()
+                result = function()
+                elapsed = time.perf_counter() - start
+                if baseline is not None and not round_number % 2:
+                    run_baseline(round_number)
+            # Benchmarked functions may return a dict of details, such as output sizes, to store with the timings.
+            details = result if isinstance(result, dict) else {}
+            # The first round warms up caches, connections and imports and is not timed.
+            if round_number > 0:
+                seconds.append(elapsed)
+
+        if server is not None:
+            details = dict(
+                details,
+                requests=dict(server.request_counts),
+                request_bytes=server.received_bytes
+            )
+        if baseline is not None:
+            details = dict(details, baseline_rounds=baseline_seconds)
+        return dict(
+            details,
+            rounds=seconds,
+            median=statistics.median(seconds),
+            mean=statistics.fmean(seconds),
+            min=min(seconds),
+            stdev=statistics.stdev(seconds) if len(seconds) > 1 else 0.0
+        )
+
+    def __build_archive(self, repo_path: str) -> str:
+        shutil.rmtree(os.path.join(repo_path, '.build'), ignore_errors=True)
+        subprocess.run(
+            ['swift', 'package', 'generate-documentation', '--target', 'BenchmarkKit'],
+            check=True,
+            cwd=repo_path,
+            stderr=subprocess.DEVNULL
+        )
+        return os.path.join(repo_path, '.build', 'plugins', 'Swift-DocC', 'outputs', 'BenchmarkKit.doccarchive')
+
+    def __create_repository(self, work_dir: str) -> str:
+        repo_path = os.path.join(work_dir, 'BenchmarkKit')
+        os.makedirs(os.path.join(repo_path, 'Sources', 'BenchmarkKit'))
+        with open(os.path.join(repo_path, 'Package.swift'), 'w', encoding='utf-8') as file:
+            file.write('// swift-tools-version:5.7\n')
+        with open(os.path.join(repo_path, 'Sources', 'BenchmarkKit', 'BenchmarkKit.swift'), 'w') as file:
+            file.write('public struct BenchmarkKit {}\n')
+
+        generator = random.Random(0)
+        words = ('documentation', 'archive', 'confluence', 'render', 'swift', 'package', 'target', 'scheme')
+        readme = ['# BenchmarkKit\n']
+        for index in range(self.parameters['markdown_sections']):
+            sentence = ' '.join(generator.choice(words) for _ in range(40))
+            readme.append(
+                f'\n## Section {index}\n\n{sentence} & *more* `code`.\n\n'
+                f'- [Link {index}](https://example.com/{index})\n- **Item** {index}\n\n'
+                f'```swift\nlet value{index} = BenchmarkKit()\n```\n'
+            )
+        with open(os.path.join(repo_path, 'README.md'), 'w', encoding='utf-8') as file:
+            file.write(''.join(readme))
+
+        changelog = ['# Changelog\n']
+        for index in range(self.parameters['markdown_sections'] // 4, 0, -1):
+            changelog.append(f'\n## [1.{index}.0]\n### Added\n- {" ".join(generator.choice(words) for _ in range(12))}\n')
+        with open(os.path.join(repo_path, 'CHANGELOG.md'), 'w', encoding='utf-8') as file:
+            file.write(''.join(changelog))
+        return repo_path
+
+    @staticmethod
+    def __create_storage_corpus(sections: int) -> List[str]:
+        # Large READMEs and CHANGELOGs with everything the storage format render converts.
+        generator = random.Random(1)
+        words = ('documentation', 'archive', 'confluence', 'render', 'swift', 'package', 'target', 'scheme')
+        corpus = []
+        for document in range(2):
+            readme = [f'# StorageKit {document}\n\n![Logo](Resources/logo.png) [![CI](https://ci.example.com/badge.svg)]'
+                      f'(https://ci.example.com)\n']
+            for index in range(sections * 2):
+                sentence = ' '.join(generator.choice(words) for _ in range(40))
+                readme.append(
+                    f'\n## Section {index}\n\n{sentence} & *more* `code` &lt;T&gt;.\n\n'
+                    f'See [the guide](Documentation/Guide.md), [Section {index // 2}](#section-{index // 2}) '
+                    f'and [the site](https://example.com/{index}?a=1&b=2).\n\n'
+                    f'```swift\nlet value{index} = StorageKit<Int>(rate: 1 & 2)\n```\n\n'
+                    f'    swift build -c release\n'
+                )
+            corpus.append(''.join(readme))
+
+            changelog = ['# Changelog\n']
+            for index in range(sections * 2, 0, -1):
+                changelog.append(
+                    f'\n## [1.{index}.0]\n### Added\n- {" ".join(generator.choice(words) for _ in range(12))}\n'
+                    f'### Fixed\n- {" ".join(generator.choice(words) for _ in range(12))} (see [#{index}](#{index}))\n'
+                )
+            corpus.append(''.join(changelog))
+        return corpus
+
+    @staticmethod
+    def __git_commit() -> str:
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'],
+                capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            ).stdout.strip()
+            dirty = subprocess.run(
+                ['git', 'status', '--porcelain', '--untracked-files=no'],
+                capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return 'unknown'
+        return f'{commit}-dirty' if dirty else commit
@@ -0,0 +1,219 @@
+# fake_confluence.py
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeConfluenceServer:
+    """
+    A local stand-in for the Confluence v2 pages and attachment endpoints.
+
+    Pages are kept in memory and versioned like on Confluence: an update must carry the next version
+    number, or it is rejected with a 409 conflict. Every response is delayed by `latency_seconds`, and
+    every `throttle_every`-th request is answered with a 429 and a `Retry-After` header instead, so
+    benchmarks see the round trips and rate limiting of a real instance.
+
+    Supported endpoints:
+    - `GET /pages/{id}`, `PUT /pages/{id}`
+    - `GET /pages?id=...` (paginated multi-id listing) and `GET /pages?title=...`, `POST /pages`
+    - `PUT /content/{id}/child/attachment`, whose body is read and discarded
+    """
+
+    LISTING_PAGE_SIZE = 25
+
+    def __init__(self, latency_seconds: float = 0.0, throttle_every: int = 0, retry_after_seconds: int = 0):
+        """
+        :param latency_seconds: The delay added to every response.
+        :param throttle_every: Answer every n-th request with a 429, or 0 to never throttle.
+        :param retry_after_seconds: The `Retry-After` value of throttled responses.
+        """
+        self.latency_seconds = latency_seconds
+        self.throttle_every = throttle_every
+        self.retry_after_seconds = retry_after_seconds
+        self.pages = {}
+        self.request_counts = Counter()
+        self.received_bytes = 0
+        self._request_number = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        """
+        The URL to use as `Config.CONFLUENCE_BASE_URL`.
+        """
+        return f'http://127.0.0.1:{self._server.server_port}/wiki/api/v2'
+
+    def start(self) -> 'FakeConfluenceServer':
+        """
+        Starts serving on a free local port, on a background thread.
+        """
+        fake = self
+
+        class Handler(_FakeConfluenceHandler):
+            server_state = fake
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='fake-confluence', daemon=True).start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset_counts(self):
+        """
+        Resets the request counters, keeping the pages.
+        """
+        with self._lock:
+            self.request_counts.clear()
+            self.received_bytes = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _admit(self, method: str) -> bool:
+        # Returns False when the request must be throttled.
+        with self._lock:
+            self._request_number += 1
+            throttled = self.throttle_every and self._request_number % self.throttle_every == 0
+            self.request_counts['429' if throttled else method] += 1
+        return not throttled
+
+    def _page(self, page_id: str) -> dict:
+        with self._lock:
+            return self.pages.setdefault(page_id, {'id': page_id, 'title': f'Page {page_id}', 'version': 1, 'body': ''})
+
+
+class _FakeConfluenceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_state = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if not self.__admit():
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path.rstrip('/').split('/')
+        state = self.server_state
+
+        if path[-1] != 'pages':
+            self.__send(200, self.__page_json(state._page(path[-1])))
+        elif 'title' in query:
+            with state._lock:
+                pages = [page for page in state.pages.values() if page['title'] == query['title'][0]]
+            self.__send(200, {'results': [self.__page_json(page) for page in pages], '_links': {}})
+        else:
+            page_ids = [page_id for value in query.get('id', []) for page_id in value.split(',')]
+            start = int(query.get('cursor', ['0'])[0])
+            size = FakeConfluenceServer.LISTING_PAGE_SIZE
+            links = {}
+            if start + size < len(page_ids):
+                links['next'] = '/wiki/api/v2/pages?' + '&'.join(f'id={page_id}' for page_id in page_ids) + \
+                                f'&cursor={start + size}'
+            results = [self.__page_json(state._page(page_id)) for page_id in page_ids[start:start + size]]
+            self.__send(200, {'results': results, '_links': links})
+
+    def do_PUT(self):
+        path = urlparse(self.path).path.rstrip('/').split('/')
+        # Attachments can be large, they are counted and discarded instead of being kept in memory.
+        body = self.__read_body(keep='attachment' not in path)
+        if not self.__admit():
+            return
+        if 'attachment' in path:
+            self.__send(200, {'results': [{'id': f'att{path[-3]}', 'title': 'attachment'}]})
+            return
+
+        update = json.loads(body)
+        page = self.server_state._page(path[-1])
+        with self.server_state._lock:
+            conflict = update['version']['number'] != page['version'] + 1
+            if not conflict:
+                page.update(title=update['title'], body=update['body']['value'], version=page['version'] + 1,
+                            message=update['version'].get('message'))
+        if conflict:
+            self.__send(409, {'message': 'Version conflict'})
+        else:
+            self.__send(200, self.__page_json(page))
+
+    def do_POST(self):
+        body = self.__read_body()
+        if not self.__admit():
+            return
+        created = json.loads(body)
+        state = self.server_state
+        with state._lock:
+            page_id = str(100000 + len(state.pages))
+            state.pages[page_id] = {'id': page_id, 'title': created['title'], 'version': 1, 'body': ''}
+        self.__send(200, self.__page_json(state.pages[page_id]))
+
+    def __admit(self) -> bool:
+        state = self.server_state
+        if state.latency_seconds:
+            time.sleep(state.latency_seconds)
+        if state._admit(self.command):
+            return True
+        self.__send(429, {'message': 'Rate limited'}, {'Retry-After': str(state.retry_after_seconds)})
+        return False
+
+    def __read_body(self, keep: bool = True) -> bytes:
+        chunks = []
+        received = 0
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunk = self.rfile.read(size)
+                self.rfile.readline()
+                received += len(chunk)
+                if keep:
+                    chunks.append(chunk)
+        else:
+            remaining = int(self.headers.get('Content-Length') or 0)
+            while remaining:
+                chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                received += len(chunk)
+                if keep:
+                    chunks.append(chunk)
+        with self.server_state._lock:
+            self.server_state.received_bytes += received
+        return b''.join(chunks)
+
+    def __send(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def __page_json(page: dict) -> dict:
+        return {
+            'id': page['id'],
+            'title': page['title'],
+            'version': {'number': page['version']},
+            'body': {'storage': {'value': page['body'], 'representation': 'storage'}}
+        }
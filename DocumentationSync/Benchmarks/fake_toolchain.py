@@ -0,0 +1,123 @@
+# fake_toolchain.py
+import os
+import stat
+import sys
+from typing import Dict
+
+
+# The stub shared by `swift` and `xcodebuild`. It writes a synthetic .doccarchive where
+# DocumentationBuilder expects the real tool to put it, sized by the BENCHMARK_* environment variables.
+_STUB_SOURCE = '''#!{python}
+import json, os, random, sys, time
+
+arguments = sys.argv[1:]
+
+def option(name, default=None):
+    return arguments[arguments.index(name) + 1] if name in arguments else default
+
+tool = os.path.basename(sys.argv[0])
+if arguments[:2] == ['package', 'resolve'] or '-resolvePackageDependencies' in arguments:
+    time.sleep(float(os.environ.get('BENCHMARK_RESOLVE_SECONDS', '0')))
+    sys.exit(0)
+
+if tool == 'swift':
+    target = option('--target')
+    archive_path = os.path.join(
+        option('--scratch-path', '.build'), 'plugins', 'Swift-DocC', 'outputs', target + '.doccarchive')
+elif '-xcframework' in arguments:
+    xcframework = option('-xcframework').rstrip('/')
+    target = os.environ.get('BENCHMARK_DOCC_TARGET') or os.path.splitext(os.path.basename(xcframework))[0]
+    archive_path = os.path.join(option('-derivedDataPath'), target + '.doccarchive')
+else:
+    scheme = option('-scheme')
+    target = os.environ.get('BENCHMARK_DOCC_TARGET') or scheme
+    # Like xcodebuild, the products directory is named after the SDK of the destination, and is plain for macOS.
+    platform = (option('-destination') or 'generic/platform=iOS').split('=', 1)[1]
+    sdk = {{'iOS': 'iphoneos', 'iOS Simulator': 'iphonesimulator', 'macOS': '', 'tvOS': 'appletvos',
+           'watchOS': 'watchos', 'visionOS': 'xros'}}[platform]
+    archive_path = os.path.join(
+        option('-derivedDataPath'), 'Build', 'Products', 'Debug-' + sdk if sdk else 'Debug', target + '.doccarchive')
+
+file_count = int(os.environ.get('BENCHMARK_DOCC_FILE_COUNT', '500'))
+file_bytes = int(os.environ.get('BENCHMARK_DOCC_FILE_BYTES', '4096'))
+build_seconds = float(os.environ.get('BENCHMARK_BUILD_SECONDS', '0'))
+
+# The output of the real tools, for the build progress to follow, spread over the build time.
+steps = 20
+if tool == 'swift':
+    print('Building for debugging...', flush=True)
+    for step in range(1, steps + 1):
+        print('[%d/%d] Compiling %s File%d.swift' % (step, steps, target, step), flush=True)
+        time.sleep(build_seconds / 2 / steps)
+    print("Extracting symbol information for '%s'..." % target, flush=True)
+    time.sleep(build_seconds / 4)
+    print("Generating documentation for '%s'..." % target, flush=True)
+else:
+    for step in range(1, steps + 1):
+        print("SwiftCompile normal arm64 File%d.swift (in target '%s' from project '%s')" % (step, target, target), flush=True)
+        print('    cd %s' % os.getcwd(), flush=True)
+        time.sleep(build_seconds / 2 / steps)
+    print("ExtractAPI %s (in target '%s')" % (target, target), flush=True)
+    time.sleep(build_seconds / 4)
+    print("CompileDocumentation %s.docc (in target '%s')" % (target, target), flush=True)
+time.sleep(build_seconds / 4)
+
+# Seeded by the target, so the same configuration always produces the same archive.
+generator = random.Random(target)
+for index in range(file_count):
+    # Like real archives: mostly compressible JSON, some already compressed images.
+    if index % 5 == 4:
+        path = os.path.join(archive_path, 'images', target, 'image-%d.png' % index)
+        contents = generator.randbytes(file_bytes)
+    else:
+        path = os.path.join(archive_path, 'data', 'documentation', target.lower(), 'symbol-%d.json' % index)
+        words = ' '.join(generator.choice(('func', 'struct', 'var', 'let', 'init', target)) for _ in range(file_bytes // 6))
+        contents = json.dumps({{'identifier': index, 'abstract': words}})[:file_bytes].encode('utf-8')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(contents)
+'''
+
+
+class FakeToolchain:
+    """
+    A stand-in for `swift` and `xcodebuild` that produces synthetic .doccarchive trees.
+
+    Both executables are written to a directory that is put first on PATH, so `DocumentationBuilder`
+    runs them instead of the real tools. The generated archives have `file_count` files averaging
+    `file_bytes` bytes, mostly JSON with some incompressible images, and are identical across runs.
+    """
+
+    def __init__(self, bin_dir: str, file_count: int = 500, file_bytes: int = 4096, build_seconds: float = 0.0):
+        """
+        :param bin_dir: The directory to write the fake executables to.
+        :param file_count: The number of files of every generated archive.
+        :param file_bytes: The size of every generated file.
+        :param build_seconds: How long every fake build sleeps, to stand in for the real build time.
+        """
+        self.bin_dir = bin_dir
+        self.file_count = file_count
+        self.file_bytes = file_bytes
+        self.build_seconds = build_seconds
+
+    def install(self):
+        """
+        Writes the fake `swift` and `xcodebuild` executables.
+        """
+        os.makedirs(self.bin_dir, exist_ok=True)
+        for tool in ('swift', 'xcodebuild'):
+            path = os.path.join(self.bin_dir, tool)
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(_STUB_SOURCE.format(python=sys.executable))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    def environment(self) -> Dict[str, str]:
+        """
+        Returns the environment variables that put the fake tools on PATH and configure them.
+        """
+        return {
+            'PATH': self.bin_dir + os.pathsep + os.environ.get('PATH', ''),
+            'BENCHMARK_DOCC_FILE_COUNT': str(self.file_count),
+            'BENCHMARK_DOCC_FILE_BYTES': str(self.file_bytes),
+            'BENCHMARK_BUILD_SECONDS': str(self.build_seconds)
+        }
@@ -0,0 +1,77 @@
+# import_probe.py
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+# Runs the command line of DocumentationSync as `python __main__.py` would, after applying the Config overrides.
+_BOOTSTRAP = '''
+import runpy, sys
+from ConfluenceUploader.config import Config
+for name, value in {config!r}.items():
+    setattr(Config, name, value)
+sys.argv = {argv!r}
+runpy.run_path({script!r}, run_name='__main__')
+'''
+
+_PACKAGE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _importtime(code: str, environment: Optional[Dict[str, str]]) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=_PACKAGE_DIRECTORY, env=environment
+    )
+
+
+def _parse(stderr: str) -> List[tuple]:
+    # Lines look like "import time:       352 |      12449 |       instrumentation", nested imports are indented.
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return imports
+
+
+def probe(argv: List[str], config: Optional[dict] = None, environment: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Runs a DocumentationSync command line in a fresh interpreter under `python -X importtime`, and measures
+    the time it spends importing modules that a bare interpreter does not import.
+
+    :param argv: The command line arguments, e.g. `["/path/to/repo", "Target", "Package", "--build-only"]`.
+    :param config: `Config` attributes to override in the fresh interpreter, e.g. the Confluence base URL.
+    :param environment: The environment of the fresh interpreter, defaults to the current one.
+    :return: The exit status, the import time in seconds, the imported module names and the heaviest
+        top-level imports with their cumulative time.
+    """
+    baseline = {name for name, *_ in _parse(_importtime('import runpy', environment).stderr)}
+
+    completed = _importtime(
+        _BOOTSTRAP.format(config=config or {}, argv=['__main__.py'] + argv, script='__main__.py'),
+        environment
+    )
+    imports = [entry for entry in _parse(completed.stderr) if entry[0] not in baseline]
+    heaviest = sorted((entry for entry in imports if entry[1] == 0), key=lambda entry: entry[3], reverse=True)
+    return {
+        'exit_code': completed.returncode,
+        'import_seconds': sum(entry[2] for entry in imports),
+        'modules': sorted(entry[0] for entry in imports),
+        'heaviest': [[name, cumulative] for name, _, _, cumulative in heaviest[:10]]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the import time of a DocumentationSync command line, e.g. "
+                    "`python -m Benchmarks.import_probe -- /path/to/repo Target Package --build-only`."
+    )
+    parser.add_argument("arguments", nargs=argparse.REMAINDER, help="The DocumentationSync command line.")
+    args = parser.parse_args()
+    arguments = args.arguments[1:] if args.arguments[:1] == ['--'] else args.arguments
+    result = probe(arguments)
+    print(json.dumps(dict(result, modules=len(result['modules'])), indent=2))
@@ -0,0 +1,113 @@
+# memory_probe.py
+import argparse
+import json
+import os
+import random
+import tempfile
+import tracemalloc
+from typing import Optional
+
+
+def _reset_peak_rss() -> Optional[int]:
+    """
+    Resets the peak RSS of this process to its current RSS. `ru_maxrss` can not be used: it is a high-water
+    mark that a process inherits from its parent, so a probe started by the benchmark suite would report the
+    peak of the suite.
+
+    :return: The current RSS, or None if the kernel can not reset the peak, on anything but Linux.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        return None
+    return _status_bytes('VmRSS')
+
+
+def _status_bytes(field: str) -> int:
+    with open('/proc/self/status', encoding='ascii') as file:
+        for line in file:
+            if line.startswith(f'{field}:'):
+                # Reported in kilobytes.
+                return int(line.split()[1]) * 1024
+    raise RuntimeError(f'/proc/self/status has no {field}')
+
+
+def _write_changelog(path: str, size_bytes: int):
+    # Written a release at a time, so generating the input does not raise the peak RSS.
+    generator = random.Random(0)
+    words = ('added', 'fixed', 'changed', 'removed', 'deprecated', 'symbol', 'archive', 'page')
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('# Changelog\n')
+        release = 0
+        while file.tell() < size_bytes:
+            release += 1
+            entries = ''.join(
+                f'- {" ".join(generator.choice(words) for _ in range(12))} & `code` [#{release}{index}]\n'
+                for index in range(20)
+            )
+            file.write(f'\n## [{release}.0.0]\n### Changed\n{entries}')
+
+
+def probe(size_bytes: int) -> dict:
+    """
+    Measures the peak RSS of rendering a large generated CHANGELOG and serializing it as a page update,
+    along the same path as `update_confluence_page`. Runs in its own process, so the peak is not polluted
+    by anything else.
+
+    :param size_bytes: The approximate size of the generated Markdown input.
+    :return: The input and payload sizes, the RSS before rendering and the peak RSS, in bytes, and the
+        method the peak was measured with, "vm_hwm" or, where the peak RSS can not be reset, "tracemalloc".
+    """
+    from ConfluenceUploader.config import Config
+    from ConfluenceUploader.page_payload_stream import PagePayloadStream
+    from ConfluenceUploader.sync_manifest import SyncManifest
+    from markdown_renderer import MarkdownRenderer
+    from utility import Utility
+
+    work_dir = tempfile.mkdtemp(prefix='documentation-sync-memory-')
+    path = os.path.join(work_dir, 'CHANGELOG.md')
+    _write_changelog(path, size_bytes)
+    input_bytes = os.path.getsize(path)
+
+    Utility.MARKDOWN_RENDERER = MarkdownRenderer(cache_dir=None)
+    # Builds the parser, which imports markdown and its extensions, a cost that does not grow with the input.
+    Utility.MARKDOWN_RENDERER.render('# Memory Probe')
+    # Only the render and the serialization are measured, not the imports or the generation of the input.
+    baseline_rss_bytes = _reset_peak_rss()
+    method = 'vm_hwm'
+    if baseline_rss_bytes is None:
+        # Without a resettable peak RSS, the peak of Python allocations is the closest measure.
+        method = 'tracemalloc'
+        baseline_rss_bytes = 0
+        tracemalloc.start()
+
+    body_content = Utility.render_markdown_file_as_HTML(path)
+    SyncManifest.digest('Memory Probe', body_content)
+    payload = PagePayloadStream('1', 'Memory Probe', body_content, 2, Config.CONFLUENCE_SPACE_KEY)
+    payload_bytes = len(payload)
+    while payload.read(16384):
+        pass
+
+    if method == 'vm_hwm':
+        peak_rss_bytes = _status_bytes('VmHWM')
+    else:
+        peak_rss_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    os.remove(path)
+    os.rmdir(work_dir)
+    return {
+        'input_bytes': input_bytes,
+        'payload_bytes': payload_bytes,
+        'method': method,
+        'baseline_rss_bytes': baseline_rss_bytes,
+        'peak_rss_bytes': peak_rss_bytes
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the peak RSS of rendering and serializing a large Markdown file.")
+    parser.add_argument("--size-mb", type=float, default=8.0, help="The size of the generated Markdown input.")
+    args = parser.parse_args()
+    print(json.dumps(probe(int(args.size_mb * 1024 * 1024))))
@@ -0,0 +1,669 @@
+# async_confluence_uploader.py
+import asyncio
+import functools
+import html
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+
+from .config import Config
+from .confluence_session import ConfluenceSession
+from .multipart_encoder import StreamingMultipartEncoder
+from .page_payload_stream import PagePayloadStream
+from .page_version_cache import PageVersionCache
+from .publish_journal import PublishJob, PublishJournal
+from .published_storage import PublishedStorage
+from .storage_diff import StorageDiff
+from .sync_manifest import SyncManifest
+from changelog_renderer import ChangelogRenderer
+from utility import Utility
+
+
+class AsyncConfluenceUploader:
+    """
+    An asyncio version of `ConfluenceUploader`, for pushing many page updates and attachments in one run.
+
+    At most `max_concurrency` requests are in flight at any time, bounded by a semaphore. Requests
+    are sent through the pooled `ConfluenceSession`, on a dedicated executor of the same size, so a
+    run with hundreds of pending updates still uses only `max_concurrency` connections and threads.
+
+    Independent pages are updated concurrently, while the version read and the update of a single
+    page are always kept in order: concurrent updates of the same page_id are serialized.
+
+    Page versions are kept in a short-lived `PageVersionCache`. Batches of updates prefetch the versions
+    of all their pages with a few multi-id listing requests, and every update stores the version it
+    published, so pages are not read one by one before being updated. A stale cached version is caught
+    by Confluence as a 409 conflict, after which the page version is read again and the update retried.
+
+    The last published storage body of every page is kept in a local `PublishedStorage`. A page whose new
+    rendering differs from it is compared block by block with a `StorageDiff`: a structurally equal page,
+    that only differs in whitespace or attribute order, is not published at all, and a changed page is
+    published with a summary of the changed blocks as its version message, instead of a fixed one.
+
+    Every page update and attachment upload that is not skipped is recorded in a `PublishJournal` before it
+    is sent, and marked as completed once Confluence accepted it. Updates of a page that are still pending
+    when a newer update of it is recorded are never sent, and the unfinished jobs of an interrupted run are
+    sent again by `resume_journal`, from their journaled payloads, without rebuilding or rendering anything.
+
+    The class includes the following coroutines:
+
+    - get_page_version(page_id: str) -> int:
+    Returns the current version number of a Confluence page.
+
+    - prefetch_page_versions(page_ids: Iterable[str]) -> Dict[str, int]:
+    Reads the current versions of many pages in batches and stores them in the version cache.
+
+    - update_confluence_page(title: str, markdown_file: str, page_id: str, force: bool = False):
+    Updates a Confluence page with the given title and markdown file, skipping unchanged pages.
+
+    - update_confluence_page_content(title: str, body_content: str, page_id: str, force: bool = False):
+    Updates a Confluence page with already rendered storage format content, skipping unchanged pages.
+
+    - update_changelog_page(title: str, changelog_file: str, page_id: str, force: bool = False, sections_per_page: Optional[int] = None):
+    Updates a CHANGELOG page section by section, optionally moving older releases to paginated child pages.
+
+    - update_confluence_pages(updates: Iterable[Tuple[str, str, str]], force: bool = False) -> List[Optional[BaseException]]:
+    Updates many pages concurrently and returns the error of each update, or None if it succeeded.
+
+    - verify_manifest(page_id: str) -> bool:
+    Compares the local sync manifest entry for a page against the remote page, and drops it on drift.
+
+    - upload_file_to_confluence_page_as_attachment(zip_file: str, page_id: str, force: bool = False, progress_callback: Optional[Callable] = None):
+    Streams a file to a Confluence page as an attachment, skipping files that are unchanged since their last upload.
+
+    - resume_journal() -> List[Optional[BaseException]]:
+    Sends the page updates and attachment uploads that earlier runs left unfinished in the publish journal.
+    """
+
+    HEADERS = {
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    }
+
+    def __init__(
+        self,
+        session: Optional[ConfluenceSession] = None,
+        manifest: Optional[SyncManifest] = None,
+        max_concurrency: Optional[int] = None,
+        published_storage: Optional[PublishedStorage] = None,
+        journal: Optional[PublishJournal] = None
+    ):
+        """
+        :param session: The HTTP session to send requests with, defaults to a new session configured from `Config`.
+        :param manifest: The sync manifest used to skip unchanged pages, defaults to `Config.SYNC_MANIFEST_PATH`.
+        :param max_concurrency: The maximum number of requests in flight, defaults to `Config.CONFLUENCE_POOL_SIZE`.
+        :param published_storage: The published page bodies to diff new renderings against,
+            defaults to `Config.PUBLISHED_STORAGE_DIRECTORY`.
+        :param journal: The journal every page update and attachment upload is recorded in,
+            defaults to `Config.PUBLISH_JOURNAL_DIRECTORY`.
+        """
+        self.max_concurrency = max_concurrency or Config.CONFLUENCE_POOL_SIZE
+        self.session = session or ConfluenceSession(pool_size=self.max_concurrency)
+        self.manifest = manifest or SyncManifest(Config.SYNC_MANIFEST_PATH)
+        self.published_storage = published_storage or PublishedStorage(Config.PUBLISHED_STORAGE_DIRECTORY)
+        self.journal = journal or PublishJournal(Config.PUBLISH_JOURNAL_DIRECTORY, Config.PUBLISH_JOURNAL_MAX_ATTEMPTS)
+        self.version_cache = PageVersionCache(Config.CONFLUENCE_VERSION_CACHE_TTL_SECONDS)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix='confluence-upload'
+        )
+        # Created lazily, so they belong to the event loop the coroutines run on.
+        self._semaphore = None
+        self._page_locks = {}
+
+    @staticmethod
+    def build_page_payload(
+        page_id: str,
+        title: str,
+        body_content: str,
+        version_number: int,
+        version_message: str = StorageDiff.DEFAULT_MESSAGE
+    ) -> str:
+        """
+        Builds the JSON payload of a page update request.
+
+        :param page_id: The ID of the Confluence page to be updated.
+        :param title: The title of the Confluence page.
+        :param body_content: The storage format body of the page.
+        :param version_number: The new version number of the page.
+        :param version_message: The message of the new page version.
+        :return: The JSON encoded payload.
+        """
+        return json.dumps({
+            "id": page_id,
+            "status": "current",
+            "title": title,
+            "spaceId": Config.CONFLUENCE_SPACE_KEY,
+            "body": {
+                "representation": "storage",
+                "value": body_content
+            },
+            "version": {
+                "number": version_number,
+                "message": version_message
+            }
+        })
+
+    async def get_page_version(self, page_id: str) -> int:
+        """
+        Returns the current version number of the page.
+        This is used to increment the page version for every update, which is required by Confluence API.
+
+        :param page_id: The Confluence page id of the page to retrieve the version number for.
+        :return: The current version number of the Confluence page.
+        :raises requests.exceptions.HTTPError: If the GET request to retrieve the page data from the Confluence API fails.
+        """
+        response = await self.__request(
+            'GET',
+            f'{Config.CONFLUENCE_BASE_URL}/pages/{page_id}',
+            headers=AsyncConfluenceUploader.HEADERS
+        )
+        response.raise_for_status()
+        version = response.json()['version']['number']
+        self.version_cache.set(page_id, version)
+        return version
+
+    async def prefetch_page_versions(self, page_ids: Iterable[str]) -> Dict[str, int]:
+        """
+        Reads the current versions of many pages and stores them in the version cache.
+        Pages are requested `Config.CONFLUENCE_VERSION_BATCH_SIZE` ids at a time through the multi-id page
+        listing, following its pagination links, and pages with a cached version are not requested again.
+
+        :param page_ids: The Confluence page ids to read the versions of.
+        :return: The version number of every page found, by page id.
+        :raises requests.exceptions.HTTPError: If a listing request to the Confluence API fails.
+        """
+        page_ids = list(dict.fromkeys(str(page_id) for page_id in page_ids))
+        versions = {}
+        missing = []
+        for page_id in page_ids:
+            version = self.version_cache.get(page_id)
+            if version is None:
+                missing.append(page_id)
+            else:
+                versions[page_id] = version
+
+        batch_size = Config.CONFLUENCE_VERSION_BATCH_SIZE
+        batches = await asyncio.gather(
+            *(self.__list_page_versions(missing[start:start + batch_size])
+              for start in range(0, len(missing), batch_size))
+        )
+        for batch in batches:
+            self.version_cache.update(batch)
+            versions.update(batch)
+        return versions
+
+    async def update_confluence_page(self, title: str, markdown_file: str, page_id: str, force: bool = False):
+        """
+        Updates a Confluence page with the given title and markdown style content.
+
+        The rendered content is compared against the local sync manifest first. If neither the title
+        nor the rendered body changed since the last sync, no request is sent to Confluence at all.
+
+        :param title: The title of the Confluence page to be updated.
+        :param markdown_file: The markdown content to be added to the Confluence page.
+        :param page_id: The ID of the Confluence page to be updated.
+        :param force: Publish the page even if the sync manifest reports it as unchanged.
+        """
+        # Rendering is CPU bound, keep it off the event loop.
+        loop = asyncio.get_running_loop()
+        body_content = await loop.run_in_executor(
+            None,
+            Utility.render_markdown_file_as_HTML,
+            markdown_file
+        )
+        await self.update_confluence_page_content(title, body_content, page_id, force)
+
+    async def update_confluence_page_content(self, title: str, body_content: str, page_id: str, force: bool = False):
+        """
+        Updates a Confluence page with the given title and already rendered storage format content.
+
+        A page whose content changed since its last sync is compared block by block against its last
+        published body. If it is structurally unchanged it is not published, otherwise the summary of the
+        diff becomes the message of the new page version. The update is recorded in the publish journal
+        first, and is not sent if a newer update of the page is recorded before it gets its turn.
+
+        :param title: The title of the Confluence page to be updated.
+        :param body_content: The storage format body of the page.
+        :param page_id: The ID of the Confluence page to be updated.
+        :param force: Publish the page even if the sync manifest reports it as unchanged.
+        """
+        # Skip the version lookup and the update entirely when the page content is unchanged.
+        digest = SyncManifest.digest(title, body_content)
+        if not force and self.manifest.is_unchanged(page_id, digest):
+            print(f"Skipping unchanged Confluence page {page_id}")
+            return
+
+        # Recorded before the page lock is taken, so it supersedes the older updates of the page still waiting for it.
+        loop = asyncio.get_running_loop()
+        job_id = await loop.run_in_executor(
+            None, self.journal.enqueue_page, page_id, title, body_content, digest, force
+        )
+        await self.__publish_page(job_id, title, body_content, page_id, digest, force)
+
+    async def update_changelog_page(
+        self,
+        title: str,
+        changelog_file: str,
+        page_id: str,
+        force: bool = False,
+        sections_per_page: Optional[int] = None
+    ):
+        """
+        Updates a CHANGELOG page, rendering the CHANGELOG one release section at a time.
+        Only new or modified sections are rendered, the HTML of every other section comes from the render cache.
+
+        With `sections_per_page`, the page only keeps the newest releases. Older releases are moved to child
+        pages titled "<title> (Archive n)", holding `sections_per_page` releases each, counted from the oldest
+        release so that archive pages stay unchanged as new releases are added. Unchanged archive pages are
+        skipped like any other page.
+
+        :param title: The title of the CHANGELOG page.
+        :param changelog_file: The path of the CHANGELOG Markdown file.
+        :param page_id: The ID of the CHANGELOG page.
+        :param force: Publish the pages even if the sync manifest reports them as unchanged.
+        :param sections_per_page: The number of releases per page, or None to publish every release on one page.
+        """
+        loop = asyncio.get_running_loop()
+        changelog_renderer = ChangelogRenderer(Utility.MARKDOWN_RENDERER)
+        # Streamed a section at a time, only the rendered HTML of the pages is held.
+        body_content, *archive_bodies = await loop.run_in_executor(
+            None, changelog_renderer.render_file_pages, changelog_file, sections_per_page
+        )
+        if not archive_bodies:
+            await self.update_confluence_page_content(title, body_content, page_id, force)
+            return
+
+        archive_pages = [
+            (f'{title} (Archive {number})', archive_body) for number, archive_body in enumerate(archive_bodies, 1)
+        ]
+        archive_links = ''.join(
+            f'<li><ac:link><ri:page ri:content-title="{html.escape(archive_title)}" /></ac:link></li>'
+            for archive_title, _ in reversed(archive_pages)
+        )
+        body_content += f'\n<h2>Older releases</h2>\n<ul>{archive_links}</ul>'
+
+        async def publish_archive_page(archive_title: str, archive_body: str):
+            archive_page_id = await self.__find_or_create_child_page(page_id, archive_title)
+            await self.update_confluence_page_content(archive_title, archive_body, archive_page_id, force)
+
+        await asyncio.gather(
+            self.update_confluence_page_content(title, body_content, page_id, force),
+            *(publish_archive_page(archive_title, archive_body) for archive_title, archive_body in archive_pages)
+        )
+
+    async def update_confluence_pages(
+        self,
+        updates: Iterable[Tuple[str, str, str]],
+        force: bool = False
+    ) -> List[Optional[BaseException]]:
+        """
+        Updates many Confluence pages concurrently. A failing update does not cancel the others.
+
+        All pages are rendered first, then the versions of the pages that changed are prefetched in
+        batches, and only then are the pages updated, without a version read per page.
+
+        :param updates: (title, markdown_file, page_id) tuples, one per page update.
+        :param force: Publish the pages even if the sync manifest reports them as unchanged.
+        :return: The exception raised by each update, in order, or None for the updates that succeeded.
+        """
+        updates = list(updates)
+        loop = asyncio.get_running_loop()
+        bodies = await asyncio.gather(
+            *(loop.run_in_executor(None, Utility.render_markdown_file_as_HTML, markdown_file)
+              for _, markdown_file, _ in updates),
+            return_exceptions=True
+        )
+
+        changed_page_ids = [
+            page_id
+            for (title, _, page_id), body_content in zip(updates, bodies)
+            if not isinstance(body_content, BaseException)
+            and (force or not self.manifest.is_unchanged(page_id, SyncManifest.digest(title, body_content)))
+        ]
+        try:
+            await self.prefetch_page_versions(changed_page_ids)
+        except requests.exceptions.RequestException as e:
+            # The updates still work without the prefetch, they read their page versions one by one.
+            print(f"Warning: could not prefetch page versions: {e}")
+
+        async def update(title: str, page_id: str, body_content):
+            if isinstance(body_content, BaseException):
+                raise body_content
+            await self.update_confluence_page_content(title, body_content, page_id, force)
+
+        results = await asyncio.gather(
+            *(update(title, page_id, body_content)
+              for (title, _, page_id), body_content in zip(updates, bodies)),
+            return_exceptions=True
+        )
+        return [result if isinstance(result, BaseException) else None for result in results]
+
+    async def verify_manifest(self, page_id: str) -> bool:
+        """
+        Compares the local sync manifest entry for a page against the remote Confluence page.
+        If the page was edited outside of this script, its version no longer matches the recorded one and
+        the entry is dropped, so the next update publishes the page again.
+
+        :param page_id: The ID of the Confluence page to verify.
+        :return: True if the manifest entry is in sync with the remote page, False if it was dropped or missing.
+        """
+        entry = self.manifest.get(page_id)
+        if entry is None:
+            print(f"No sync manifest entry for Confluence page {page_id}")
+            return False
+
+        async with self.__page_lock(page_id):
+            remote_version = await self.get_page_version(page_id)
+            if remote_version == entry.get('version'):
+                print(f"Sync manifest entry for Confluence page {page_id} is up to date")
+                return True
+
+            print(
+                f"Sync manifest drift for Confluence page {page_id}: "
+                f"recorded version {entry.get('version')}, remote version {remote_version}")
+            self.manifest.remove(page_id)
+            self.manifest.save()
+            # The page was edited elsewhere, so the published body is no baseline for a diff anymore.
+            self.published_storage.remove(page_id)
+            return False
+
+    async def upload_file_to_confluence_page_as_attachment(
+        self,
+        zip_file: str,
+        page_id: str,
+        force: bool = False,
+        progress_callback: Optional[Callable[[int, int, float], None]] = None
+    ):
+        """
+        Uploads a file to a specified Confluence page as an attachment.
+
+        The file is streamed from disk in fixed-size chunks, so memory stays bounded regardless of its size,
+        and its SHA-256 is computed in the same pass. If the sync manifest already records an upload of a
+        file with the same size, the file is hashed first and the upload is skipped when the hashes match.
+        Every other upload is recorded in the publish journal first, with a hard link to the file.
+
+        :param zip_file: The file to be uploaded
+        :param page_id: The Confluence page id where the file will be uploaded as an attachment
+        :param force: Upload the file even if the sync manifest reports it as unchanged.
+        :param progress_callback: Called while uploading with (bytes_sent, total_bytes, bytes_per_second).
+        """
+        loop = asyncio.get_running_loop()
+        file_name = os.path.basename(zip_file)
+        file_size = os.path.getsize(zip_file)
+
+        # A file of a different size has certainly changed, only same-sized files need the extra hashing pass.
+        digest = None
+        entry = self.manifest.get_attachment(page_id, file_name)
+        if not force and entry is not None and entry.get('size') == file_size:
+            digest = await loop.run_in_executor(None, StreamingMultipartEncoder.file_digest, zip_file)
+            if digest == entry.get('sha256'):
+                print(f"Skipping unchanged attachment {file_name} on Confluence page {page_id}")
+                return
+
+        job_id = await loop.run_in_executor(None, self.journal.enqueue_attachment, page_id, zip_file, force, digest)
+        await self.__publish_attachment(job_id, zip_file, page_id, progress_callback)
+
+    async def resume_journal(self) -> List[Optional[BaseException]]:
+        """
+        Sends the page updates and attachment uploads that earlier runs left unfinished in the publish journal,
+        because they failed or their process was killed, from their journaled payloads. Only the newest
+        update of every page is left to send. A failing job does not cancel the others.
+
+        :return: The exception raised by each unfinished job, or None for the jobs that succeeded.
+        """
+        loop = asyncio.get_running_loop()
+        jobs = await loop.run_in_executor(None, self.journal.unfinished)
+        page_ids = [job.page_id for job in jobs if job.kind == PublishJournal.PAGE]
+        print(
+            f"Resuming {len(jobs)} unfinished publish jobs: "
+            f"{len(page_ids)} page updates, {len(jobs) - len(page_ids)} attachment uploads")
+        try:
+            await self.prefetch_page_versions(page_ids)
+        except requests.exceptions.RequestException as e:
+            print(f"Warning: could not prefetch page versions: {e}")
+
+        async def resume(job: PublishJob):
+            if job.kind == PublishJournal.PAGE:
+                body_content = await loop.run_in_executor(None, PublishJournal.read_page, job)
+                await self.__publish_page(job.id, job.title, body_content, job.page_id, job.digest, job.force)
+            else:
+                await self.__publish_attachment(job.id, job.payload, job.page_id, digest=job.digest)
+
+        results = await asyncio.gather(*(resume(job) for job in jobs), return_exceptions=True)
+        for job, result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                print(f"Publish job {job.id} ({job.kind} {job.target}) failed again: {result!r}")
+        return [result if isinstance(result, BaseException) else None for result in results]
+
+    def close(self):
+        """
+        Shuts down the request executor and closes the pooled connections.
+        """
+        self._executor.shutdown(wait=True)
+        self.session.close()
+        self.journal.close()
+
+    async def __publish_page(self, job_id: int, title: str, body_content: str, page_id: str, digest: str, force: bool):
+        # The version read and the update of one page must not interleave with another update of that page.
+        async with self.__page_lock(page_id):
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(None, self.journal.claim, job_id):
+                print(f"Skipping superseded update of Confluence page {page_id}")
+                return
+            try:
+                version_message = await self.__send_page(title, body_content, page_id, digest, force)
+            except BaseException as e:
+                await loop.run_in_executor(None, self.journal.fail, job_id, e)
+                raise
+            await loop.run_in_executor(None, self.journal.complete, job_id)
+        if version_message is not None:
+            print(f"Finished uploading content to confluence ({version_message})")
+
+    async def __send_page(self, title: str, body_content: str, page_id: str, digest: str, force: bool) -> Optional[str]:
+        # Parsing is CPU bound, keep it off the event loop.
+        loop = asyncio.get_running_loop()
+        diff = await loop.run_in_executor(None, self.__diff_published, page_id, title, body_content)
+        entry = self.manifest.get(page_id)
+        if diff is not None and diff.is_empty and not force:
+            print(f"Skipping structurally unchanged Confluence page {page_id}")
+            # The next identical rendering is skipped by its digest, without diffing it again.
+            self.manifest.record(page_id, digest, entry['version'])
+            self.manifest.save()
+            return None
+        version_message = diff.summary() if diff is not None else StorageDiff.DEFAULT_MESSAGE
+
+        current_version = self.version_cache.get(page_id)
+        if current_version is None:
+            current_version = await self.get_page_version(page_id)
+        response = await self.__put_page(page_id, title, body_content, current_version, version_message)
+
+        # The page changed since its version was read, read it again and retry once.
+        if response.status_code == 409:
+            print(f"Version conflict on Confluence page {page_id}, retrying with its current version")
+            self.version_cache.invalidate(page_id)
+            current_version = await self.get_page_version(page_id)
+            response = await self.__put_page(page_id, title, body_content, current_version, version_message)
+        if not response.ok:
+            self.version_cache.invalidate(page_id)
+        response.raise_for_status()
+
+        # Record the published content so the next run can skip this page if nothing changed.
+        published_version = response.json().get('version', {}).get('number', current_version + 1)
+        self.version_cache.set(page_id, published_version)
+        await loop.run_in_executor(None, self.published_storage.store, page_id, title, body_content)
+        self.manifest.record(page_id, digest, published_version)
+        self.manifest.save()
+        return version_message
+
+    async def __publish_attachment(
+        self,
+        job_id: int,
+        file_path: str,
+        page_id: str,
+        progress_callback: Optional[Callable[[int, int, float], None]] = None,
+        digest: Optional[str] = None
+    ):
+        loop = asyncio.get_running_loop()
+        file_name = os.path.basename(file_path)
+        if not await loop.run_in_executor(None, self.journal.claim, job_id):
+            print(f"Skipping superseded upload of attachment {file_name} to Confluence page {page_id}")
+            return
+        try:
+            # A journaled file is a hard link, so it changes when the original file is rewritten in place.
+            changed = digest is not None and digest != await loop.run_in_executor(
+                None, StreamingMultipartEncoder.file_digest, file_path
+            )
+            if not changed:
+                await self.__send_attachment(file_path, page_id, progress_callback)
+        except BaseException as e:
+            await loop.run_in_executor(None, self.journal.fail, job_id, e)
+            raise
+        if changed:
+            error = RuntimeError(f'{file_path} changed since its upload was journaled')
+            await loop.run_in_executor(None, self.journal.fail, job_id, error, False)
+            raise error
+        await loop.run_in_executor(None, self.journal.complete, job_id)
+
+    async def __send_attachment(
+        self,
+        file_path: str,
+        page_id: str,
+        progress_callback: Optional[Callable[[int, int, float], None]]
+    ):
+        params = {
+            'minorEdits': 'false'
+        }
+
+        url = f'{Config.CONFLUENCE_BASE_URL}/content/{page_id}/child/attachment'
+        print(f'Attempting to upload {file_path} to {url}')
+
+        with StreamingMultipartEncoder(file_path, progress_callback=progress_callback) as encoder:
+            headers = {
+                'X-Atlassian-Token': 'no-check',
+                'Content-Type': encoder.content_type
+            }
+            response = await self.__request(
+                'PUT',
+                url,
+                data=encoder,
+                headers=headers,
+                params=params
+            )
+            response.raise_for_status()
+
+            self.manifest.record_attachment(page_id, os.path.basename(file_path), encoder.file_size, encoder.sha256)
+            self.manifest.save()
+
+        print("Finished uploading Attachment to Confluence Page!")
+
+    async def __find_or_create_child_page(self, parent_page_id: str, title: str) -> str:
+        child_page_id = self.manifest.get_child_page(parent_page_id, title)
+        if child_page_id:
+            return child_page_id
+
+        response = await self.__request(
+            'GET',
+            f'{Config.CONFLUENCE_BASE_URL}/pages',
+            params={'space-id': Config.CONFLUENCE_SPACE_KEY, 'title': title},
+            headers=AsyncConfluenceUploader.HEADERS
+        )
+        response.raise_for_status()
+        results = response.json().get('results', [])
+
+        if results:
+            child_page_id = results[0]['id']
+        else:
+            print(f"Creating Confluence page {title}")
+            response = await self.__request(
+                'POST',
+                f'{Config.CONFLUENCE_BASE_URL}/pages',
+                data=json.dumps({
+                    "spaceId": Config.CONFLUENCE_SPACE_KEY,
+                    "status": "current",
+                    "title": title,
+                    "parentId": parent_page_id,
+                    "body": {
+                        "representation": "storage",
+                        "value": ""
+                    }
+                }),
+                headers=AsyncConfluenceUploader.HEADERS
+            )
+            response.raise_for_status()
+            child_page_id = response.json()['id']
+
+        self.manifest.record_child_page(parent_page_id, title, child_page_id)
+        self.manifest.save()
+        return child_page_id
+
+    def __diff_published(self, page_id: str, title: str, body_content: str) -> Optional[StorageDiff]:
+        # Only a page whose last publish is recorded in the manifest is known to still have the published body.
+        if self.manifest.get(page_id) is None:
+            return None
+        published = self.published_storage.load(page_id)
+        if published is None:
+            return None
+        published_title, published_body = published
+        return StorageDiff.compare(published_title, published_body, title, body_content)
+
+    async def __put_page(
+        self,
+        page_id: str,
+        title: str,
+        body_content: str,
+        current_version: int,
+        version_message: str = StorageDiff.DEFAULT_MESSAGE
+    ):
+        return await self.__request(
+            'PUT',
+            f'{Config.CONFLUENCE_BASE_URL}/pages/{page_id}',
+            # Streamed, so a large page is never copied into a full-size JSON string.
+            data=PagePayloadStream(
+                page_id,
+                title,
+                body_content,
+                current_version + 1,
+                Config.CONFLUENCE_SPACE_KEY,
+                version_message
+            ),
+            headers=AsyncConfluenceUploader.HEADERS
+        )
+
+    async def __list_page_versions(self, page_ids: List[str]) -> Dict[str, int]:
+        versions = {}
+        url = f'{Config.CONFLUENCE_BASE_URL}/pages'
+        params = [('id', page_id) for page_id in page_ids] + [('limit', len(page_ids))]
+        while url:
+            response = await self.__request('GET', url, params=params, headers=AsyncConfluenceUploader.HEADERS)
+            response.raise_for_status()
+            page_list = response.json()
+            for page in page_list.get('results', []):
+                versions[str(page['id'])] = page['version']['number']
+
+            # The next link is relative to the site and already carries the query of the listing.
+            next_link = page_list.get('_links', {}).get('next')
+            url = urljoin(Config.CONFLUENCE_BASE_URL, next_link) if next_link else None
+            params = None
+        return versions
+
+    async def __request(self, method: str, url: str, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor,
+                functools.partial(self.session.request, method, url, **kwargs)
+            )
+
+    def __page_lock(self, page_id: str) -> asyncio.Lock:
+        lock = self._page_locks.get(page_id)
+        if lock is None:
+            lock = self._page_locks[page_id] = asyncio.Lock()
+        return lock
@@ -16,3 +16,27 @@ class Config:
     # Found in URL of page. 
     # Example: your-base-url/wiki/spaces/Space_name/pages/Changelog_Page_ID/Page_Name
     CONFLUENCE_CHANGELOG_PAGE_ID = 'changelog-id'
+    # Local file recording the digest and version of every page published by this script.
+    # Unchanged pages are skipped on the next run, use --force to publish them anyway.
+    SYNC_MANIFEST_PATH = '~/.documentation_sync/sync_manifest.json'
+    # The maximum number of kept-alive connections to Confluence, shared by all upload threads.
+    CONFLUENCE_POOL_SIZE = 10
+    # Rate-limited (429) and transiently failing requests are retried with jittered exponential backoff.
+    CONFLUENCE_MAX_RETRIES = 5
+    CONFLUENCE_BACKOFF_SECONDS = 1.0
+    CONFLUENCE_MAX_BACKOFF_SECONDS = 60.0
+    # Optional cap on the number of requests sent per second, None for no limit.
+    CONFLUENCE_MAX_REQUESTS_PER_SECOND = None
+    # Local directory keeping the per-file hash index of every archive published as deltas.
+    DELTA_INDEX_DIRECTORY = '~/.documentation_sync/delta_indexes'
+    # Local directory keeping the last published body of every page. A new rendering is only published when it
+    # differs from it block by block, and the changed blocks are summarized in the version message.
+    PUBLISHED_STORAGE_DIRECTORY = '~/.documentation_sync/published_storage'
+    # Local directory keeping the journal of every page update and attachment upload, with their payloads.
+    # The unfinished ones of an interrupted run are sent again with --resume, up to this many attempts each.
+    PUBLISH_JOURNAL_DIRECTORY = '~/.documentation_sync/publish_journal'
+    PUBLISH_JOURNAL_MAX_ATTEMPTS = 5
+    # Page versions are prefetched in batches of up to this many ids (the Confluence v2 maximum is 250),
+    # and trusted for this many seconds before being read again.
+    CONFLUENCE_VERSION_BATCH_SIZE = 250
+    CONFLUENCE_VERSION_CACHE_TTL_SECONDS = 300.0
@@ -0,0 +1,189 @@
+# confluence_session.py
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+from .config import Config
+from instrumentation import Instrumentation
+
+
+class RateLimiter:
+    """
+    Spaces out calls so that no more than `requests_per_second` start in any one second.
+    Safe to share between threads.
+    """
+
+    def __init__(self, requests_per_second: float):
+        self._interval = 1.0 / requests_per_second
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until the caller is allowed to send its next request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ConfluenceSession:
+    """
+    A shared, connection-pooled HTTP session for the Confluence REST API.
+
+    Connections are kept alive and reused across requests, so a batch of uploads pays for the
+    TLS handshake once per pooled connection instead of once per request. Rate-limited (429) and
+    transiently failing (502, 503, 504) responses, as well as connection errors, are retried with
+    jittered exponential backoff, honouring the `Retry-After` header when Confluence sends one.
+    Requests can optionally be capped to a maximum rate per second.
+
+    Every request is recorded as an "http_request" span with its final status, retry count and bytes.
+
+    The defaults for every setting are read from `Config`.
+    """
+
+    RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+    def __init__(
+        self,
+        pool_size: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_seconds: Optional[float] = None,
+        max_backoff_seconds: Optional[float] = None,
+        requests_per_second: Optional[float] = None
+    ):
+        """
+        Every argument left as None falls back to its `Config` value.
+
+        :param pool_size: The maximum number of kept-alive connections to Confluence.
+        :param max_retries: How many times a failed request is retried before giving up.
+        :param backoff_seconds: The base delay of the exponential backoff between retries.
+        :param max_backoff_seconds: The upper bound of a single backoff delay.
+        :param requests_per_second: The maximum request rate.
+        """
+        pool_size = pool_size or Config.CONFLUENCE_POOL_SIZE
+        requests_per_second = requests_per_second or Config.CONFLUENCE_MAX_REQUESTS_PER_SECOND
+        self.max_retries = Config.CONFLUENCE_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_seconds = Config.CONFLUENCE_BACKOFF_SECONDS if backoff_seconds is None else backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds or Config.CONFLUENCE_MAX_BACKOFF_SECONDS
+        self._rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+
+        self._session = requests.Session()
+        self._session.auth = HTTPBasicAuth(
+            Config.CONFLUENCE_EMAIL,
+            Config.CONFLUENCE_API_KEY
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request through the pooled session, retrying rate-limited and transient failures.
+
+        :param method: The HTTP method.
+        :param url: The URL to send the request to.
+        :param kwargs: Any further arguments accepted by `requests.Session.request`.
+        :return: The final response. Its status is not checked, callers still call `raise_for_status()`.
+        :raises requests.exceptions.RequestException: If the request still fails to connect after all retries.
+        """
+        with Instrumentation.span('http_request', method=method) as span:
+            span.annotate(url=url)
+            response = self.__request_with_retries(span, method, url, **kwargs)
+            span.label(status=response.status_code)
+            span.measure(bytes_received=len(response.content))
+            data = kwargs.get('data')
+            if data is not None and hasattr(data, '__len__'):
+                span.measure(bytes_sent=len(data))
+            return response
+
+    def __request_with_retries(self, span, method: str, url: str, **kwargs) -> requests.Response:
+        attempt = 0
+        while True:
+            if self._rate_limiter:
+                self._rate_limiter.acquire()
+
+            try:
+                response = self._session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.__backoff_delay(attempt)
+                print(f'{method} {url} failed ({e}), retrying in {delay:.1f}s')
+            else:
+                if response.status_code not in self.RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                span.measure(throttled=1 if response.status_code == 429 else 0)
+                delay = self.__retry_after_delay(response)
+                if delay is None:
+                    delay = self.__backoff_delay(attempt)
+                response.close()
+                print(f'{method} {url} returned {response.status_code}, retrying in {delay:.1f}s')
+
+            span.measure(retries=1, backoff_seconds=delay)
+            time.sleep(delay)
+            ConfluenceSession.__rewind_body(kwargs)
+            attempt += 1
+
+    def close(self):
+        """
+        Closes every pooled connection.
+        """
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __backoff_delay(self, attempt: int) -> float:
+        # Full jitter: a random delay between 0 and the exponential backoff ceiling.
+        ceiling = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def __retry_after_delay(self, response: requests.Response) -> Optional[float]:
+        retry_after = response.headers.get('Retry-After')
+        if not retry_after:
+            return None
+
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+
+        # A little jitter keeps concurrent workers from retrying in lockstep.
+        return max(0.0, delay) + random.uniform(0, self.backoff_seconds)
+
+    @staticmethod
+    def __rewind_body(kwargs: dict):
+        # File bodies were consumed by the failed attempt and must be re-read from the start.
+        data = kwargs.get('data')
+        if hasattr(data, 'seek'):
+            data.seek(0)
+
+        for value in (kwargs.get('files') or {}).values():
+            file = value[1] if isinstance(value, tuple) else value
+            if hasattr(file, 'seek'):
+                file.seek(0)
@@ -1,8 +1,11 @@
-import json
-import requests
-from requests.auth import HTTPBasicAuth
-from .config import Config
-from utility import Utility
+import asyncio
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from .async_confluence_uploader import AsyncConfluenceUploader
+from .confluence_session import ConfluenceSession
+from .publish_journal import PublishJournal
+from .published_storage import PublishedStorage
+from .sync_manifest import SyncManifest
 
 
 class ConfluenceUploader:
@@ -16,136 +19,261 @@ class ConfluenceUploader:
     - `CONFLUENCE_SPACE_KEY`: The key of the Confluence space to use.
 
     These values should be set in a separate `config.py` module, which should be placed in the same directory as the script that uses the `ConfluenceUploader` class.
-    
+
+    This is a thin, blocking wrapper over `AsyncConfluenceUploader`. Every call is run on a single
+    background event loop owned by the instance, so calls made from many threads share one
+    connection pool, one concurrency limit and the per-page ordering of version reads and writes.
+    Create one uploader per run and share it between threads.
+
+    Every page update and attachment upload that is sent is recorded in a durable publish journal first. Only the
+    newest pending update of a page is sent, and `resume_journal` sends what an interrupted run left unfinished.
+
     The class includes the following methods:
 
-    - update_confluence_page(title: str, markdown_file: str, page_id: str): 
+    - prefetch_page_versions(page_ids: Iterable[str]) -> Dict[str, int]:
+    This function reads the current versions of many pages in batches, so later updates skip their version reads.
+
+    - update_confluence_page(title: str, markdown_file: str, page_id: str, force: bool = False):
     This function updates a Confluence page based on it's page_id with the given title and markdown file.
+    Pages whose rendered content matches the local sync manifest are skipped unless `force` is set, and so are
+    pages that are structurally equal to their last published body. Changed pages get a summary of the changed
+    blocks as their version message.
+
+    - update_confluence_page_content(title: str, body_content: str, page_id: str, force: bool = False):
+    This function updates a Confluence page with already rendered storage format content, skipping unchanged pages.
+
+    - update_changelog_page(title: str, changelog_file: str, page_id: str, force: bool = False, sections_per_page: Optional[int] = None):
+    This function updates a CHANGELOG page section by section, optionally moving older releases to paginated child pages.
+
+    - update_confluence_pages(updates: Iterable[Tuple[str, str, str]], force: bool = False) -> List[Optional[BaseException]]:
+    This function updates many Confluence pages concurrently.
 
-    - upload_file_to_confluence_page_as_attachment(zip_file: str, page_id: str):
-    This function uploads a zip_file to a specified Confluence page as an attachment.
+    - verify_manifest(page_id: str) -> bool:
+    This function compares the local sync manifest entry for a page against the remote page, and drops it on drift.
+
+    - upload_file_to_confluence_page_as_attachment(zip_file: str, page_id: str, force: bool = False, progress_callback: Optional[Callable] = None):
+    This function streams a zip_file to a specified Confluence page as an attachment, skipping unchanged files.
+
+    - resume_journal() -> List[Optional[BaseException]]:
+    This function sends the page updates and attachment uploads that earlier runs left unfinished in the publish journal.
     """
 
-    AUTH = HTTPBasicAuth(
-        Config.CONFLUENCE_EMAIL,
-        Config.CONFLUENCE_API_KEY
-    )
+    HEADERS = AsyncConfluenceUploader.HEADERS
+
+    def __init__(
+        self,
+        session: Optional[ConfluenceSession] = None,
+        manifest: Optional[SyncManifest] = None,
+        max_concurrency: Optional[int] = None,
+        published_storage: Optional[PublishedStorage] = None,
+        journal: Optional[PublishJournal] = None
+    ):
+        """
+        :param session: The HTTP session to send requests with, defaults to a new session configured from `Config`.
+        :type session: Optional[ConfluenceSession]
+        :param manifest: The sync manifest used to skip unchanged pages, defaults to `Config.SYNC_MANIFEST_PATH`.
+        :type manifest: Optional[SyncManifest]
+        :param max_concurrency: The maximum number of requests in flight, defaults to `Config.CONFLUENCE_POOL_SIZE`.
+        :type max_concurrency: Optional[int]
+        :param published_storage: The published page bodies to diff new renderings against, defaults to `Config.PUBLISHED_STORAGE_DIRECTORY`.
+        :type published_storage: Optional[PublishedStorage]
+        :param journal: The journal every page update and attachment upload is recorded in, defaults to `Config.PUBLISH_JOURNAL_DIRECTORY`.
+        :type journal: Optional[PublishJournal]
+        """
+        self.async_uploader = AsyncConfluenceUploader(session, manifest, max_concurrency, published_storage, journal)
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    @property
+    def session(self) -> ConfluenceSession:
+        return self.async_uploader.session
 
-    HEADERS = {
-        "Accept": "application/json",
-        "Content-Type": "application/json"
-    }
+    @property
+    def manifest(self) -> SyncManifest:
+        return self.async_uploader.manifest
 
+    def prefetch_page_versions(self, page_ids: Iterable[str]) -> Dict[str, int]:
+        """
+        This function reads the current versions of many pages with batched multi-id listing requests and
+        keeps them in a short-lived cache, so the following updates of those pages skip their version reads.
+
+        :param page_ids: The Confluence page ids to read the versions of.
+        :type page_ids: Iterable[str]
+        :return: The version number of every page found, by page id.
+        :rtype: Dict[str, int]
+        """
+        return self.__run(
+            self.async_uploader.prefetch_page_versions(list(page_ids))
+        )
 
-    @staticmethod
-    def update_confluence_page(title: str, markdown_file: str, page_id: str):
+    def update_confluence_page(self, title: str, markdown_file: str, page_id: str, force: bool = False):
         """
         This function updates a Confluence page with the given title and markdown style content.
 
+        The rendered content is compared against the local sync manifest first. If neither the title
+        nor the rendered body changed since the last sync, no request is sent to Confluence at all.
+
         :param title: The title of the Confluence page to be updated.
         :type title: str
         :param markdown_file: The markdown content to be added to the Confluence page.
         :type markdown_file: str
         :param page_id: The ID of the Confluence page to be updated.
         :type page_id: str
+        :param force: Publish the page even if the sync manifest reports it as unchanged.
+        :type force: bool
+
+        :returns: None
+        """
+        return self.__run(
+            self.async_uploader.update_confluence_page(title, markdown_file, page_id, force)
+        )
+
+    def update_confluence_page_content(self, title: str, body_content: str, page_id: str, force: bool = False):
+        """
+        This function updates a Confluence page with the given title and already rendered storage format content.
+
+        :param title: The title of the Confluence page to be updated.
+        :type title: str
+        :param body_content: The storage format body of the page.
+        :type body_content: str
+        :param page_id: The ID of the Confluence page to be updated.
+        :type page_id: str
+        :param force: Publish the page even if the sync manifest reports it as unchanged.
+        :type force: bool
 
         :returns: None
         """
-        # Get the current version number of the page, which is required by the Confluence API for updates.
-        current_version = ConfluenceUploader.__get_page_version(page_id)
-        url = f'{Config.CONFLUENCE_BASE_URL}/pages/{page_id}'
+        return self.__run(
+            self.async_uploader.update_confluence_page_content(title, body_content, page_id, force)
+        )
 
-        # Render the Markdown File as HTML.
-        body_content = Utility.render_markdown_file_as_HTML(
-            markdown_file
+    def update_changelog_page(
+        self,
+        title: str,
+        changelog_file: str,
+        page_id: str,
+        force: bool = False,
+        sections_per_page: Optional[int] = None
+    ):
+        """
+        This function updates a CHANGELOG page, rendering only new or modified release sections.
+        With `sections_per_page`, older releases are moved to child pages titled "<title> (Archive n)".
+
+        :param title: The title of the CHANGELOG page.
+        :type title: str
+        :param changelog_file: The path of the CHANGELOG Markdown file.
+        :type changelog_file: str
+        :param page_id: The ID of the CHANGELOG page.
+        :type page_id: str
+        :param force: Publish the pages even if the sync manifest reports them as unchanged.
+        :type force: bool
+        :param sections_per_page: The number of releases per page, or None to publish every release on one page.
+        :type sections_per_page: Optional[int]
+
+        :returns: None
+        """
+        return self.__run(
+            self.async_uploader.update_changelog_page(title, changelog_file, page_id, force, sections_per_page)
         )
 
-        # Create the payload for the update request with the new version number and content.
-        payload = json.dumps({
-            "id": page_id,
-            "status": "current",
-            "title": title,
-            "spaceId": Config.CONFLUENCE_SPACE_KEY,
-            "body": {
-                "representation": "storage",
-                "value": body_content
-            },
-            "version": {
-                "number": current_version + 1,
-                "message": "Automation Update"
-            }
-        })
-
-        # Send a PUT request to the Confluence API to update the page.
-        response = requests.put(
-            url=url,
-            data=payload,
-            headers=ConfluenceUploader.HEADERS,
-            auth=ConfluenceUploader.AUTH
+    def update_confluence_pages(
+        self,
+        updates: Iterable[Tuple[str, str, str]],
+        force: bool = False
+    ) -> List[Optional[BaseException]]:
+        """
+        This function updates many Confluence pages concurrently. A failing update does not stop the others.
+
+        :param updates: (title, markdown_file, page_id) tuples, one per page update.
+        :type updates: Iterable[Tuple[str, str, str]]
+        :param force: Publish the pages even if the sync manifest reports them as unchanged.
+        :type force: bool
+        :return: The exception raised by each update, in order, or None for the updates that succeeded.
+        :rtype: List[Optional[BaseException]]
+        """
+        return self.__run(
+            self.async_uploader.update_confluence_pages(list(updates), force)
         )
 
-        # Raise an exception if the request fails.
-        response.raise_for_status()
-        print("Finished uploading content to confluence")
+    def verify_manifest(self, page_id: str) -> bool:
+        """
+        This function compares the local sync manifest entry for a page against the remote Confluence page.
+        If the page was edited outside of this script, its version no longer matches the recorded one and
+        the entry is dropped, so the next update publishes the page again.
 
-    @staticmethod
-    def upload_file_to_confluence_page_as_attachment(zip_file: str, page_id: str):
+        :param page_id: The ID of the Confluence page to verify.
+        :type page_id: str
+        :return: True if the manifest entry is in sync with the remote page, False if it was dropped or missing.
+        :rtype: bool
+        """
+        return self.__run(
+            self.async_uploader.verify_manifest(page_id)
+        )
+
+    def upload_file_to_confluence_page_as_attachment(
+        self,
+        zip_file: str,
+        page_id: str,
+        force: bool = False,
+        progress_callback: Optional[Callable[[int, int, float], None]] = None
+    ):
         """
         This function uploads a file to a specified Confluence page as an attachment.
+        The file is streamed in fixed-size chunks and skipped if the sync manifest shows it is unchanged.
 
         :param zip_file: The file to be uploaded
         :type zip_file: str
         :param page_id: The Confluence page id where the file will be uploaded as an attachment
         :type page_id: str
+        :param force: Upload the file even if the sync manifest reports it as unchanged.
+        :type force: bool
+        :param progress_callback: Called while uploading with (bytes_sent, total_bytes, bytes_per_second).
+        :type progress_callback: Optional[Callable[[int, int, float], None]]
         :return: None
         :rtype: None
         """
-        files = {'file': open(zip_file, 'rb')}
-        headers = {
-            'X-Atlassian-Token': 'no-check'
-        }
-        params = {
-            'minorEdits': 'false'
-        }
-
-        url = f'{Config.CONFLUENCE_BASE_URL}/content/{page_id}/child/attachment'
-        print(f'Attempting to upload {zip_file} to {url}')
-
-        response = requests.put(
-            url,
-            auth=ConfluenceUploader.AUTH,
-            files=files,
-            headers=headers,
-            params=params
+        return self.__run(
+            self.async_uploader.upload_file_to_confluence_page_as_attachment(
+                zip_file,
+                page_id,
+                force,
+                progress_callback
+            )
         )
 
-        response.raise_for_status()
-        print("Finished uploading Attachment to Confluence Page!")
-
+    def resume_journal(self) -> List[Optional[BaseException]]:
+        """
+        This function sends the page updates and attachment uploads that earlier runs left unfinished in the
+        publish journal, because they failed or their process was killed. They are sent from their journaled
+        payloads, so nothing is built or rendered again. A failing job does not stop the others.
 
-    def __get_page_version(page_id: str) -> int:
+        :return: The exception raised by each unfinished job, or None for the jobs that succeeded.
+        :rtype: List[Optional[BaseException]]
         """
-        This function takes a page_id as input and returns the current version number of the page.
-        This is used to increment the page version for every update, which is required by Confluence API.
+        return self.__run(
+            self.async_uploader.resume_journal()
+        )
 
-        Parameters:
-        page_id (str): The Confluence page id of the page to retrieve the version number for.
+    def close(self):
+        """
+        Stops the background event loop and closes the pooled connections.
+        """
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+        self.async_uploader.close()
 
-        Returns:
-        int: The current version number of the Confluence page.
+    def __run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.__event_loop()).result()
 
-        Raises:
-        requests.exceptions.HTTPError: If the GET request to retrieve the page data from the Confluence API fails.
-        """
-        # Send a GET request to the Confluence API to get the page data.
-        response = requests.get(
-            f'{Config.CONFLUENCE_BASE_URL}/pages/{page_id}',
-            auth=ConfluenceUploader.AUTH,
-            headers=ConfluenceUploader.HEADERS
-        )
-        # Raise an exception if the request fails.
-        response.raise_for_status()
-        # Parse the JSON response.
-        page_data = response.json()
-        # Return the version number of the page.
-        return page_data['version']['number']
+    def __event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name='confluence-event-loop',
+                    daemon=True
+                ).start()
+            return self._loop
@@ -0,0 +1,188 @@
+# delta_sync.py
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional
+
+from .config import Config
+from .confluence_uploader import ConfluenceUploader
+from archive_builder import ArchiveBuilder
+
+
+class DeltaSync:
+    """
+    Publishes a .doccarchive to a Confluence page as incremental deltas instead of whole archives.
+
+    A per-file content-hash index of the last published archive is kept locally. On every sync the
+    archive is compared against that index, and only a compact delta package is uploaded: a zip of the
+    added and changed files, plus a `delta.json` listing the added, changed and removed paths and the
+    digests of the base and the new index. The updated index is uploaded next to it, so consumers can
+    verify the chain of deltas or rebuild the archive from scratch.
+
+    The first sync of an archive, or a sync with `full=True`, uploads the whole archive instead. So does
+    the sync after a failed one: the digests of the delta being published are recorded before its first
+    upload, and only cleared once its index is uploaded and stored, since a delta published without its
+    index breaks the chain.
+
+    Attachments on the page:
+    - `<name>.zip`: The full archive, uploaded on the first sync.
+    - `<name>.delta.zip`: The latest delta package, each delta is a new version of this attachment.
+    - `<name>.index.json.gz`: The gzipped index of the archive as of the latest sync.
+    """
+
+    def __init__(self, uploader: ConfluenceUploader, index_dir: Optional[str] = None):
+        """
+        :param uploader: The `ConfluenceUploader` to upload attachments with.
+        :param index_dir: The directory to keep the published archive indexes in, defaults to `Config.DELTA_INDEX_DIRECTORY`.
+        """
+        self.uploader = uploader
+        self.index_dir = os.path.expanduser(index_dir or Config.DELTA_INDEX_DIRECTORY)
+
+    @staticmethod
+    def build_index(archive_path: str) -> Dict[str, str]:
+        """
+        Computes the content-hash index of an archive.
+
+        :param archive_path: The path of the .doccarchive directory.
+        :return: A mapping of every file path, relative to the archive, to its SHA-256.
+        """
+        index = {}
+        for directory, _, file_names in os.walk(archive_path):
+            for name in file_names:
+                path = os.path.join(directory, name)
+                hasher = hashlib.sha256()
+                with open(path, 'rb') as file:
+                    for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                        hasher.update(chunk)
+                index[os.path.relpath(path, archive_path).replace(os.sep, '/')] = hasher.hexdigest()
+        return index
+
+    @staticmethod
+    def index_digest(index: Dict[str, str]) -> str:
+        """
+        Computes the digest identifying an archive index.
+        """
+        return hashlib.sha256(json.dumps(index, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def sync_archive(self, archive_path: str, page_id: str, full: bool = False) -> dict:
+        """
+        Publishes the changes of an archive since its last sync to a Confluence page.
+
+        :param archive_path: The path of the .doccarchive directory.
+        :param page_id: The Confluence page id where the attachments are uploaded.
+        :param full: Upload the whole archive instead of a delta, even if the sync manifest reports it as unchanged.
+        :return: A summary with the `mode` ("full", "delta" or "unchanged") and the `added`, `changed` and `removed` counts.
+        """
+        archive_path = str(archive_path).rstrip(os.sep)
+        archive_name = os.path.splitext(os.path.basename(archive_path))[0]
+        index_path = os.path.join(self.index_dir, f'{page_id}-{archive_name}.index.json')
+        pending_path = f'{index_path}.pending'
+
+        index = DeltaSync.build_index(archive_path)
+        base_index = None if full else DeltaSync.__read_index(index_path)
+        if base_index is not None and os.path.exists(pending_path):
+            print(f"The last sync of {archive_name} to Confluence page {page_id} did not finish, uploading it in full")
+            base_index = None
+        base_index_digest = DeltaSync.index_digest(base_index) if base_index is not None else None
+        index_digest = DeltaSync.index_digest(index)
+
+        work_dir = tempfile.mkdtemp(prefix='documentation-sync-delta-')
+        try:
+            if base_index is None:
+                summary = {'mode': 'full', 'added': len(index), 'changed': 0, 'removed': 0}
+                archive_zip = ArchiveBuilder(deterministic=True).build(
+                    archive_path,
+                    os.path.join(work_dir, f'{archive_name}.zip')
+                )
+                DeltaSync.__write_pending(pending_path, base_index_digest, index_digest)
+                self.uploader.upload_file_to_confluence_page_as_attachment(archive_zip, page_id, force=full)
+            else:
+                added = sorted(path for path in index if path not in base_index)
+                changed = sorted(path for path in index if path in base_index and index[path] != base_index[path])
+                removed = sorted(path for path in base_index if path not in index)
+                summary = {'mode': 'delta', 'added': len(added), 'changed': len(changed), 'removed': len(removed)}
+
+                if not (added or changed or removed):
+                    print(f"Skipping unchanged archive {archive_name} on Confluence page {page_id}")
+                    summary['mode'] = 'unchanged'
+                    return summary
+
+                delta_zip = DeltaSync.__build_delta_package(
+                    archive_path,
+                    archive_name,
+                    work_dir,
+                    {
+                        'base_index_digest': base_index_digest,
+                        'index_digest': index_digest,
+                        'added': added,
+                        'changed': changed,
+                        'removed': removed
+                    }
+                )
+                print(
+                    f"Uploading delta of {archive_name}: {len(added)} added, "
+                    f"{len(changed)} changed, {len(removed)} removed")
+                DeltaSync.__write_pending(pending_path, base_index_digest, index_digest)
+                self.uploader.upload_file_to_confluence_page_as_attachment(delta_zip, page_id)
+
+            # A fixed gzip mtime keeps the compressed index identical for identical archives.
+            index_json = json.dumps(index, sort_keys=True).encode('utf-8')
+            published_index_path = os.path.join(work_dir, f'{archive_name}.index.json.gz')
+            with open(published_index_path, 'wb') as file:
+                file.write(gzip.compress(index_json, mtime=0))
+            self.uploader.upload_file_to_confluence_page_as_attachment(published_index_path, page_id, force=full)
+
+            # Only remember the index once both uploads succeeded. After a failed sync, the local index is still
+            # the old one, and the pending digests left behind make the next sync upload the archive in full,
+            # as the delta may have been published without its index.
+            with open(f'{index_path}.tmp', 'wb') as file:
+                file.write(index_json)
+            os.replace(f'{index_path}.tmp', index_path)
+            os.remove(pending_path)
+            return summary
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    @staticmethod
+    def __build_delta_package(archive_path: str, archive_name: str, work_dir: str, delta: dict) -> str:
+        staging_dir = os.path.join(work_dir, 'delta')
+        files_dir = os.path.join(staging_dir, 'files')
+        os.makedirs(files_dir)
+
+        for relative_path in delta['added'] + delta['changed']:
+            source = os.path.join(archive_path, relative_path)
+            destination = os.path.join(files_dir, relative_path)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            # Hard links avoid copying the files just to zip them.
+            try:
+                os.link(source, destination)
+            except OSError:
+                shutil.copy2(source, destination)
+
+        with open(os.path.join(staging_dir, 'delta.json'), 'w', encoding='utf-8') as file:
+            json.dump(delta, file, indent=2, sort_keys=True)
+
+        return ArchiveBuilder(deterministic=True).build(
+            staging_dir,
+            os.path.join(work_dir, f'{archive_name}.delta.zip')
+        )
+
+    @staticmethod
+    def __write_pending(pending_path: str, base_index_digest: Optional[str], index_digest: str):
+        os.makedirs(os.path.dirname(pending_path), exist_ok=True)
+        with open(pending_path, 'w', encoding='utf-8') as file:
+            json.dump({'base_index_digest': base_index_digest, 'index_digest': index_digest}, file)
+
+    @staticmethod
+    def __read_index(index_path: str) -> Optional[Dict[str, str]]:
+        try:
+            with open(index_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            print(f'Warning: ignoring unreadable archive index at {index_path}')
+            return None
@@ -0,0 +1,168 @@
+# multipart_encoder.py
+import hashlib
+import os
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+
+class StreamingMultipartEncoder:
+    """
+    A file-like multipart/form-data request body that streams a file from disk in fixed-size chunks.
+
+    Unlike `requests`' `files=` argument, the whole body is never built in memory: at most one chunk
+    of the file is held at a time, whatever the size of the file. The total length is known upfront,
+    so the request is still sent with a `Content-Length` header. The SHA-256 of the file is computed
+    in the same pass that sends it, and the file handle is closed as soon as the last chunk is read,
+    or when the encoder is closed, whichever comes first.
+
+    Use it as the `data` of a request, together with its `content_type` header:
+
+        with StreamingMultipartEncoder(path) as encoder:
+            session.put(url, data=encoder, headers={'Content-Type': encoder.content_type})
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(
+        self,
+        file_path: str,
+        field_name: str = 'file',
+        file_name: Optional[str] = None,
+        file_content_type: str = 'application/octet-stream',
+        fields: Optional[Dict[str, str]] = None,
+        chunk_size: int = CHUNK_SIZE,
+        progress_callback: Optional[Callable[[int, int, float], None]] = None
+    ):
+        """
+        :param file_path: The path of the file to stream.
+        :param field_name: The form field name of the file part.
+        :param file_name: The file name sent to the server, defaults to the base name of `file_path`.
+        :param file_content_type: The content type of the file part.
+        :param fields: Additional plain form fields, sent before the file part.
+        :param chunk_size: The number of bytes read from the file at a time.
+        :param progress_callback: Called after every chunk with (bytes_sent, total_bytes, bytes_per_second).
+        """
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+
+        boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+
+        file_name = file_name or os.path.basename(file_path)
+        head = b''
+        for name, value in (fields or {}).items():
+            head += (
+                f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f'{value}\r\n'
+            ).encode('utf-8')
+        head += (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{file_name}"\r\n'
+            f'Content-Type: {file_content_type}\r\n\r\n'
+        ).encode('utf-8')
+
+        self._head = head
+        self._tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self.file_size = os.path.getsize(file_path)
+        self._length = len(self._head) + self.file_size + len(self._tail)
+
+        self._file = None
+        self.seek(0)
+
+    @staticmethod
+    def file_digest(file_path: str, chunk_size: int = CHUNK_SIZE) -> str:
+        """
+        Computes the SHA-256 of a file, reading it in fixed-size chunks.
+
+        :param file_path: The path of the file to hash.
+        :param chunk_size: The number of bytes read at a time.
+        :return: The hex encoded SHA-256 digest.
+        """
+        hasher = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    @property
+    def sha256(self) -> Optional[str]:
+        """
+        The SHA-256 of the file, or None until the whole body has been read.
+        """
+        if self._position < self._length:
+            return None
+        return self._hasher.hexdigest()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        """
+        Rewinds the body so it can be sent again, e.g. when a request is retried.
+        Only rewinding to the start is supported.
+        """
+        if offset != 0 or whence != os.SEEK_SET:
+            raise ValueError('StreamingMultipartEncoder can only be rewound to the start')
+
+        self.__close_file()
+        self._file = open(self.file_path, 'rb')
+        self._hasher = hashlib.sha256()
+        self._position = 0
+        self._started_at = None
+        return 0
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Reads the next part of the body. Never reads more than `chunk_size` bytes of the file at once.
+
+        :param size: The maximum number of bytes to return, the whole remaining body if negative.
+        """
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(self.chunk_size), b''))
+
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+
+        head_size = len(self._head)
+        file_end = head_size + self.file_size
+        position = self._position
+
+        if position < head_size:
+            data = self._head[position:position + size]
+        elif position < file_end:
+            data = self._file.read(min(size, self.chunk_size, file_end - position))
+            self._hasher.update(data)
+            if self._position + len(data) >= file_end:
+                self.__close_file()
+        else:
+            data = self._tail[position - file_end:position - file_end + size]
+
+        self._position += len(data)
+        if data and self.progress_callback:
+            elapsed = time.monotonic() - self._started_at
+            self.progress_callback(
+                self._position,
+                self._length,
+                self._position / elapsed if elapsed > 0 else 0.0
+            )
+        return data
+
+    def close(self):
+        self.__close_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,104 @@
+# page_payload_stream.py
+import json
+import os
+from json.encoder import encode_basestring_ascii
+
+
+class PagePayloadStream:
+    """
+    A file-like JSON request body for a page update that streams the storage body in fixed-size chunks.
+
+    The JSON is identical to `AsyncConfluenceUploader.build_page_payload`, but the rendered HTML is never
+    copied into a full-size JSON string: it is escaped one chunk at a time as the request is sent, so
+    at most one escaped chunk is held in memory, whatever the size of the page. The payload is ASCII
+    only, so its length in bytes is known upfront and the request is still sent with a `Content-Length`.
+
+    Use it as the `data` of a request:
+
+        session.put(url, data=PagePayloadStream(page_id, title, body_content, version_number), headers=HEADERS)
+    """
+
+    # Small, as each chunk is held three times while it is escaped, which would outweigh the body of a small page.
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        page_id: str,
+        title: str,
+        body_content: str,
+        version_number: int,
+        space_id: str,
+        version_message: str = 'Automation Update',
+        chunk_size: int = CHUNK_SIZE
+    ):
+        """
+        :param page_id: The ID of the Confluence page to be updated.
+        :param title: The title of the Confluence page.
+        :param body_content: The storage format body of the page.
+        :param version_number: The new version number of the page.
+        :param space_id: The ID of the space of the page.
+        :param version_message: The message of the new page version.
+        :param chunk_size: The number of characters of the body escaped at a time.
+        """
+        self.body_content = body_content
+        self.chunk_size = chunk_size
+
+        # Everything around the body is small, only the body itself is streamed.
+        head = json.dumps({"id": page_id, "status": "current", "title": title, "spaceId": space_id})
+        self._head = (head[:-1] + ', "body": {"representation": "storage", "value": "').encode('ascii')
+        self._tail = ('"}, "version": ' + json.dumps({"number": version_number, "message": version_message}) + '}').encode('ascii')
+
+        # Escaping is character by character, so escaping chunk by chunk yields the same JSON string.
+        body_size = sum(len(self.__escape(start)) for start in range(0, len(body_content), chunk_size))
+        self._length = len(self._head) + body_size + len(self._tail)
+        self.seek(0)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        """
+        Rewinds the body so it can be sent again, e.g. when a request is retried.
+        Only rewinding to the start is supported.
+        """
+        if offset != 0 or whence != os.SEEK_SET:
+            raise ValueError('PagePayloadStream can only be rewound to the start')
+        self._position = 0
+        self._parts = self.__parts()
+        self._buffer = b''
+        self._buffer_offset = 0
+        return 0
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Reads the next part of the body.
+
+        :param size: The maximum number of bytes to return, the whole remaining body if negative.
+        """
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(self.chunk_size), b''))
+
+        while self._buffer_offset >= len(self._buffer):
+            part = next(self._parts, None)
+            if part is None:
+                return b''
+            self._buffer = part
+            self._buffer_offset = 0
+
+        data = self._buffer[self._buffer_offset:self._buffer_offset + size]
+        self._buffer_offset += len(data)
+        self._position += len(data)
+        return data
+
+    def __parts(self):
+        yield self._head
+        for start in range(0, len(self.body_content), self.chunk_size):
+            yield self.__escape(start)
+        yield self._tail
+
+    def __escape(self, start: int) -> bytes:
+        # encode_basestring_ascii quotes the string, the quotes are part of the head and tail instead.
+        return encode_basestring_ascii(self.body_content[start:start + self.chunk_size])[1:-1].encode('ascii')
@@ -0,0 +1,73 @@
+# page_version_cache.py
+import threading
+import time
+from typing import Dict, Optional
+
+
+class PageVersionCache:
+    """
+    A short-lived, in-memory cache of Confluence page version numbers.
+
+    Versions are filled in bulk by a prefetch before a batch of updates, and every successful update
+    stores the version returned by Confluence, so a page is never read again just to update it twice.
+    Entries expire after `ttl_seconds`, bounding how stale a version can get when pages are also edited
+    outside of this script. A stale version is caught by Confluence as a 409 conflict and invalidated.
+
+    The class includes the following methods:
+
+    - get(page_id: str) -> Optional[int]:
+    Returns the cached version of a page, or None if it is unknown or expired.
+
+    - set(page_id: str, version: int):
+    Stores the current version of a page.
+
+    - update(versions: Dict[str, int]):
+    Stores the current versions of many pages.
+
+    - invalidate(page_id: str):
+    Drops the cached version of a page.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        """
+        :param ttl_seconds: The number of seconds a cached version is trusted for.
+        """
+        self.ttl_seconds = ttl_seconds
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, page_id: str) -> Optional[int]:
+        """
+        Returns the cached version of a page, or None if it is unknown or expired.
+        """
+        with self._lock:
+            entry = self._versions.get(page_id)
+            if entry is None:
+                return None
+            version, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._versions[page_id]
+                return None
+            return version
+
+    def set(self, page_id: str, version: int):
+        """
+        Stores the current version of a page.
+        """
+        self.update({page_id: version})
+
+    def update(self, versions: Dict[str, int]):
+        """
+        Stores the current versions of many pages.
+        """
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for page_id, version in versions.items():
+                self._versions[str(page_id)] = (version, expires_at)
+
+    def invalidate(self, page_id: str):
+        """
+        Drops the cached version of a page.
+        """
+        with self._lock:
+            self._versions.pop(page_id, None)
@@ -0,0 +1,352 @@
+# publish_journal.py
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, NamedTuple, Optional
+
+from .multipart_encoder import StreamingMultipartEncoder
+
+
+class PublishJob(NamedTuple):
+    """
+    A page update or attachment upload recorded in a `PublishJournal`.
+
+    `target` is the page id of a page update, and "<page_id>/<file_name>" for an attachment. `payload` is the
+    path of the journaled copy of the storage body or file, which an interrupted job is resumed from.
+    """
+    id: int
+    kind: str
+    target: str
+    page_id: str
+    title: Optional[str]
+    digest: str
+    payload: str
+    force: bool
+    state: str
+    attempts: int
+    error: Optional[str]
+
+
+class PublishJournal:
+    """
+    A durable, on-disk journal of the page updates and attachment uploads sent to Confluence.
+
+    Every write is recorded as a job before it is sent, with the content digest and a copy of its payload:
+    the storage body of a page, or a hard link to the attachment file, copied where links are not possible.
+    A job moves from pending to in flight to completed, or back to pending when it fails, until it failed
+    `max_attempts` times. The journal is a SQLite database in WAL mode, so it survives a killed process and
+    can be shared by concurrent runs.
+
+    Writes to the same target are coalesced: recording a job supersedes every pending job of its target, and
+    a job is only sent if it is still pending when it is claimed, so only the newest update of a page is
+    sent. In flight jobs of a process that no longer runs are pending again the next time the journal is
+    opened, and again before unfinished jobs are listed, so a restarted run resumes exactly the unfinished
+    jobs, from their journaled payloads.
+
+    The class includes the following methods:
+
+    - enqueue_page(page_id: str, title: str, body_content: str, digest: str, force: bool = False) -> int:
+    Records a pending page update, superseding the pending updates of the same page.
+
+    - enqueue_attachment(page_id: str, file_path: str, force: bool = False, digest: Optional[str] = None) -> int:
+    Records a pending attachment upload, superseding the pending uploads of the same file to the same page.
+
+    - claim(job_id: int) -> bool:
+    Marks a pending job as in flight, unless it was superseded.
+
+    - complete(job_id: int):
+    Marks a job as completed.
+
+    - fail(job_id: int, error: BaseException, retry: bool = True):
+    Returns a failed job to pending, or marks it as failed once it used up its attempts.
+
+    - unfinished() -> List[PublishJob]:
+    Returns the pending jobs, oldest first, after returning abandoned in flight jobs to pending.
+
+    - read_page(job: PublishJob) -> str:
+    Reads the journaled storage body of a page update.
+
+    - counts() -> dict:
+    Returns the number of jobs in every state.
+    """
+
+    PAGE = 'page'
+    ATTACHMENT = 'attachment'
+    PENDING = 'pending'
+    IN_FLIGHT = 'in_flight'
+    COMPLETED = 'completed'
+    SUPERSEDED = 'superseded'
+    FAILED = 'failed'
+
+    DEFAULT_MAX_ATTEMPTS = 5
+    # Finished jobs are kept this long, for inspecting the journal.
+    RETENTION_SECONDS = 7 * 24 * 3600
+    # In flight jobs of other hosts can not be checked for a live owner, they are abandoned after this long.
+    IN_FLIGHT_TIMEOUT_SECONDS = 3600
+    WRITE_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, directory: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        """
+        :param directory: The directory to keep the journal database and the journaled payloads in.
+        :param max_attempts: The number of times a job is sent before it is marked as failed.
+        """
+        self.directory = os.path.expanduser(directory)
+        self.max_attempts = max_attempts
+        self._owner = f'{socket.gethostname()}:{os.getpid()}'
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def enqueue_page(self, page_id: str, title: str, body_content: str, digest: str, force: bool = False) -> int:
+        """
+        Records a pending page update, superseding the pending updates of the same page.
+
+        :param page_id: The ID of the Confluence page.
+        :param title: The title of the page.
+        :param body_content: The storage format body of the page.
+        :param digest: The `SyncManifest.digest` of the title and body.
+        :param force: Whether the update is published even if the sync manifest reports it as unchanged.
+        :return: The id of the job.
+        """
+        payload = os.path.join(self.directory, 'payloads', 'pages', f'{uuid.uuid4().hex}.html')
+        os.makedirs(os.path.dirname(payload), exist_ok=True)
+        with open(payload, 'w', encoding='utf-8') as file:
+            # Written a slice at a time, so a large page is never held as a second, encoded copy.
+            for start in range(0, len(body_content), PublishJournal.WRITE_CHUNK_SIZE):
+                file.write(body_content[start:start + PublishJournal.WRITE_CHUNK_SIZE])
+        return self.__enqueue(PublishJournal.PAGE, page_id, page_id, title, digest, payload, force)
+
+    def enqueue_attachment(self, page_id: str, file_path: str, force: bool = False, digest: Optional[str] = None) -> int:
+        """
+        Records a pending attachment upload, superseding the pending uploads of the same file to the same page.
+
+        :param page_id: The ID of the Confluence page the file is attached to.
+        :param file_path: The file to upload, the attachment is named after it.
+        :param force: Whether the file is uploaded even if the sync manifest reports it as unchanged.
+        :param digest: The SHA-256 of the file, if it is already known.
+        :return: The id of the job.
+        """
+        file_name = os.path.basename(file_path)
+        digest = digest or StreamingMultipartEncoder.file_digest(file_path)
+        # Every upload gets its own directory, so the journaled file keeps the name of the attachment.
+        payload = os.path.join(self.directory, 'payloads', 'attachments', uuid.uuid4().hex, file_name)
+        os.makedirs(os.path.dirname(payload))
+        try:
+            os.link(file_path, payload)
+        except OSError:
+            shutil.copyfile(file_path, payload)
+        return self.__enqueue(
+            PublishJournal.ATTACHMENT, f'{page_id}/{file_name}', page_id, file_name, digest, payload, force
+        )
+
+    def claim(self, job_id: int) -> bool:
+        """
+        Marks a pending job as in flight.
+
+        :param job_id: The id of the job.
+        :return: False if the job is no longer pending, because a newer job of its target superseded it.
+        """
+        with self.__transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE jobs SET state = ?, owner = ?, attempts = attempts + 1, updated_at = ? '
+                'WHERE id = ? AND state = ?',
+                (PublishJournal.IN_FLIGHT, self._owner, time.time(), job_id, PublishJournal.PENDING)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int):
+        """
+        Marks a job as completed and drops its payload.
+
+        :param job_id: The id of the job.
+        """
+        with self.__transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET state = ?, error = NULL, updated_at = ? WHERE id = ?',
+                (PublishJournal.COMPLETED, time.time(), job_id)
+            )
+            self.__release(connection, [job_id])
+
+    def fail(self, job_id: int, error: BaseException, retry: bool = True):
+        """
+        Returns a failed job to pending, so it is resumed later, or marks it as failed once it was sent
+        `max_attempts` times.
+
+        :param job_id: The id of the job.
+        :param error: The error the job failed with.
+        :param retry: Whether the job may be sent again, False marks it as failed right away.
+        """
+        with self.__transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?, updated_at = ? '
+                'WHERE id = ? AND state = ?',
+                (self.max_attempts if retry else 0, PublishJournal.FAILED, PublishJournal.PENDING, repr(error),
+                 time.time(), job_id, PublishJournal.IN_FLIGHT)
+            )
+            self.__release(connection, [job_id])
+
+    def unfinished(self) -> List[PublishJob]:
+        """
+        Returns the pending jobs, oldest first. In flight jobs of processes that stopped since the journal was
+        opened are returned to pending first.
+
+        :return: The jobs to resume.
+        """
+        with self.__transaction() as connection:
+            self.__recover(connection)
+            rows = connection.execute(
+                'SELECT id, kind, target, page_id, title, digest, payload, force, state, attempts, error '
+                'FROM jobs WHERE state = ? ORDER BY id',
+                (PublishJournal.PENDING,)
+            ).fetchall()
+        return [PublishJob(*row[:7], bool(row[7]), *row[8:]) for row in rows]
+
+    @staticmethod
+    def read_page(job: PublishJob) -> str:
+        """
+        Reads the journaled storage body of a page update.
+
+        :param job: A page update job.
+        :return: The storage format body of the page.
+        """
+        with open(job.payload, 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def counts(self) -> dict:
+        """
+        Returns the number of jobs in every state.
+
+        :return: The number of jobs by state, e.g. {'pending': 2, 'completed': 10}.
+        """
+        with self.__transaction() as connection:
+            return dict(connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+    def close(self):
+        """
+        Closes the journal database.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def __enqueue(self, kind: str, target: str, page_id: str, title: str, digest: str, payload: str, force: bool) -> int:
+        now = time.time()
+        with self.__transaction() as connection:
+            superseded = [row[0] for row in connection.execute(
+                'SELECT id FROM jobs WHERE kind = ? AND target = ? AND state = ?',
+                (kind, target, PublishJournal.PENDING)
+            )]
+            connection.executemany(
+                'UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?',
+                [(PublishJournal.SUPERSEDED, now, job_id) for job_id in superseded]
+            )
+            cursor = connection.execute(
+                'INSERT INTO jobs (kind, target, page_id, title, digest, payload, force, state, attempts, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)',
+                (kind, target, page_id, title, digest, payload, int(force), PublishJournal.PENDING, now, now)
+            )
+            self.__release(connection, superseded)
+            return cursor.lastrowid
+
+    def __release(self, connection: sqlite3.Connection, job_ids: List[int]):
+        # Only pending jobs are ever resumed, every other job drops its payload.
+        for job_id in job_ids:
+            row = connection.execute(
+                'SELECT payload FROM jobs WHERE id = ? AND state IN (?, ?, ?)',
+                (job_id, PublishJournal.COMPLETED, PublishJournal.SUPERSEDED, PublishJournal.FAILED)
+            ).fetchone()
+            if row is not None:
+                self.__remove_payload(row[0])
+
+    def __remove_payload(self, payload: str):
+        try:
+            os.remove(payload)
+        except FileNotFoundError:
+            pass
+        attachments_dir = os.path.join(self.directory, 'payloads', 'attachments')
+        if os.path.dirname(os.path.dirname(payload)) == attachments_dir:
+            shutil.rmtree(os.path.dirname(payload), ignore_errors=True)
+
+    def __recover(self, connection: sqlite3.Connection):
+        hostname = socket.gethostname()
+        now = time.time()
+        for job_id, owner, updated_at in connection.execute(
+            'SELECT id, owner, updated_at FROM jobs WHERE state = ?', (PublishJournal.IN_FLIGHT,)
+        ).fetchall():
+            host, _, pid = (owner or '').rpartition(':')
+            if host == hostname:
+                abandoned = not PublishJournal.__is_running(int(pid or 0))
+            else:
+                abandoned = now - updated_at > PublishJournal.IN_FLIGHT_TIMEOUT_SECONDS
+            if abandoned:
+                print(f'Resuming publish job {job_id}, interrupted in process {owner}')
+                connection.execute(
+                    'UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?', (PublishJournal.PENDING, now, job_id)
+                )
+
+    @staticmethod
+    def __is_running(pid: int) -> bool:
+        if pid <= 0:
+            return False
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    @contextmanager
+    def __transaction(self):
+        with self._lock:
+            connection = self.__connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def __connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(self.directory, exist_ok=True)
+            connection = sqlite3.connect(
+                os.path.join(self.directory, 'journal.sqlite3'),
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False
+            )
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, target TEXT NOT NULL, '
+                'page_id TEXT NOT NULL, title TEXT, digest TEXT NOT NULL, payload TEXT NOT NULL, '
+                'force INTEGER NOT NULL, state TEXT NOT NULL, attempts INTEGER NOT NULL, owner TEXT, error TEXT, '
+                'created_at REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS jobs_state_target ON jobs (state, kind, target)')
+            connection.execute(
+                'DELETE FROM jobs WHERE state IN (?, ?, ?) AND updated_at < ?',
+                (PublishJournal.COMPLETED, PublishJournal.SUPERSEDED, PublishJournal.FAILED,
+                 time.time() - PublishJournal.RETENTION_SECONDS)
+            )
+            # In flight jobs of processes that no longer run are pending again as soon as the journal is opened,
+            # so a newer update of their target supersedes them like any other pending job.
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                self.__recover(connection)
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+            self._connection = connection
+        return self._connection
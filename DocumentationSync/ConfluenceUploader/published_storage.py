@@ -0,0 +1,69 @@
+# published_storage.py
+import gzip
+import json
+import os
+import tempfile
+from typing import Optional, Tuple
+
+
+class PublishedStorage:
+    """
+    A local store of the last published title and storage format body of every page.
+
+    Each page is kept in its own gzipped JSON file, named after the page id, and replaced atomically, so
+    concurrent updates of different pages never contend for a file. It is the baseline `StorageDiff`
+    compares a new rendering of a page against.
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: The directory to keep the published pages in.
+        """
+        self.directory = os.path.expanduser(directory)
+
+    def load(self, page_id: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns the last published title and storage body of a page.
+
+        :param page_id: The ID of the Confluence page.
+        :return: The title and the body, or None if the page has not been published from here.
+        """
+        try:
+            with gzip.open(self.__path(page_id), 'rt', encoding='utf-8') as file:
+                page = json.load(file)
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        return page['title'], page['body']
+
+    def store(self, page_id: str, title: str, body_content: str):
+        """
+        Records the title and storage body of a page that was just published.
+
+        :param page_id: The ID of the Confluence page.
+        :param title: The published title.
+        :param body_content: The published storage format body.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as raw_file, \
+                    gzip.open(raw_file, 'wt', encoding='utf-8', compresslevel=6) as file:
+                json.dump({'title': title, 'body': body_content}, file)
+            os.replace(temp_path, self.__path(page_id))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def remove(self, page_id: str):
+        """
+        Drops the published page, so the next update of the page has no baseline to diff against.
+
+        :param page_id: The ID of the Confluence page.
+        """
+        try:
+            os.remove(self.__path(page_id))
+        except FileNotFoundError:
+            pass
+
+    def __path(self, page_id: str) -> str:
+        return os.path.join(self.directory, f'{page_id}.json.gz')
@@ -0,0 +1,245 @@
+# storage_diff.py
+import difflib
+import hashlib
+import html
+import re
+from html.parser import HTMLParser
+from typing import List, NamedTuple, Optional
+
+
+class StorageBlock(NamedTuple):
+    """
+    A top-level block of a storage format body, such as a paragraph, a list, a table or a macro.
+
+    `digest` identifies its normalized markup, `section` is the text of the nearest heading before it.
+    """
+    digest: str
+    section: Optional[str]
+
+
+class StorageDiff:
+    """
+    A block-level diff of two storage format bodies of a Confluence page.
+
+    Both bodies are split into their top-level blocks, and every block is normalized before it is
+    compared: attributes are sorted, tag names lowercased, entities decoded, and runs of whitespace
+    collapsed, except inside `<pre>` and CDATA sections where whitespace is content. Whitespace between
+    block-level tags is dropped. Two renderings that only differ in formatting therefore compare equal,
+    and publishing them again would not change the page.
+
+    The class includes the following methods:
+
+    - compare(old_title: str, old_body: str, new_title: str, new_body: str) -> StorageDiff:
+    Compares two versions of a page.
+
+    - blocks(body_content: str) -> List[StorageBlock]:
+    Splits a storage format body into its normalized top-level blocks.
+
+    - summary() -> str:
+    Describes the diff in one line, for the version message of the page update.
+    """
+
+    # The version message of an update without a previously published body to compare against.
+    DEFAULT_MESSAGE = 'Automation Update'
+    MAX_MESSAGE_LENGTH = 255
+    MAX_SUMMARY_SECTIONS = 3
+
+    def __init__(self, title_changed: bool, added: int, removed: int, changed: int, sections: List[str]):
+        self.title_changed = title_changed
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.sections = sections
+
+    @property
+    def is_empty(self) -> bool:
+        """
+        Whether the page is structurally unchanged, so publishing it would not change the page.
+        """
+        return not self.title_changed and not (self.added or self.removed or self.changed)
+
+    @staticmethod
+    def compare(old_title: str, old_body: str, new_title: str, new_body: str) -> 'StorageDiff':
+        """
+        Compares two versions of a page block by block.
+
+        :param old_title: The title of the published page.
+        :param old_body: The storage format body of the published page.
+        :param new_title: The new title of the page.
+        :param new_body: The newly rendered storage format body of the page.
+        :return: The diff of the two versions.
+        """
+        old_blocks = StorageDiff.blocks(old_body)
+        new_blocks = StorageDiff.blocks(new_body)
+        matcher = difflib.SequenceMatcher(
+            None,
+            [block.digest for block in old_blocks],
+            [block.digest for block in new_blocks],
+            autojunk=False
+        )
+
+        added = removed = changed = 0
+        sections = []
+        for operation, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            if operation == 'equal':
+                continue
+            old_count = old_end - old_start
+            new_count = new_end - new_start
+            changed += min(old_count, new_count)
+            added += max(0, new_count - old_count)
+            removed += max(0, old_count - new_count)
+            touched = new_blocks[new_start:new_end] or old_blocks[old_start:old_end]
+            for block in touched:
+                if block.section and block.section not in sections:
+                    sections.append(block.section)
+
+        return StorageDiff(old_title != new_title, added, removed, changed, sections)
+
+    @staticmethod
+    def blocks(body_content: str) -> List[StorageBlock]:
+        """
+        Splits a storage format body into its normalized top-level blocks.
+
+        :param body_content: The storage format body.
+        :return: The blocks, in document order.
+        """
+        parser = _BlockParser()
+        parser.feed(body_content)
+        parser.close()
+        return parser.finish()
+
+    def summary(self) -> str:
+        """
+        Describes the diff in one line, e.g. "Automation Update: 2 changed, 1 added blocks in Installation, Usage".
+
+        :return: The version message, at most `MAX_MESSAGE_LENGTH` characters long.
+        """
+        counts = [
+            f'{count} {kind}'
+            for count, kind in ((self.changed, 'changed'), (self.added, 'added'), (self.removed, 'removed'))
+            if count
+        ]
+        parts = []
+        if counts:
+            description = f'{", ".join(counts)} block{"s" if self.added + self.removed + self.changed > 1 else ""}'
+            if self.sections:
+                shown = self.sections[:StorageDiff.MAX_SUMMARY_SECTIONS]
+                description += f' in {", ".join(shown)}'
+                if len(self.sections) > len(shown):
+                    description += f' and {len(self.sections) - len(shown)} more sections'
+            parts.append(description)
+        if self.title_changed:
+            parts.append('title changed')
+
+        message = f'{StorageDiff.DEFAULT_MESSAGE}: {"; ".join(parts) or "no structural changes"}'
+        if len(message) > StorageDiff.MAX_MESSAGE_LENGTH:
+            message = message[:StorageDiff.MAX_MESSAGE_LENGTH - 3] + '...'
+        return message
+
+
+class _BlockParser(HTMLParser):
+    # Whitespace next to these tags is formatting, not content.
+    BLOCK_TAGS = frozenset({
+        'p', 'div', 'ul', 'ol', 'li', 'table', 'thead', 'tbody', 'tr', 'td', 'th', 'blockquote', 'pre', 'hr',
+        'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'br',
+        'ac:structured-macro', 'ac:parameter', 'ac:rich-text-body', 'ac:plain-text-body', 'ac:layout',
+        'ac:layout-section', 'ac:layout-cell', 'ac:task-list', 'ac:task'
+    })
+    HEADING_TAGS = frozenset({'h1', 'h2', 'h3', 'h4', 'h5', 'h6'})
+    VOID_TAGS = frozenset({'br', 'hr', 'img', 'col', 'input', 'meta', 'link', 'wbr'})
+    WHITESPACE = re.compile(r'\s+')
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self._tokens = []
+        self._depth = 0
+        self._preformatted = 0
+        self._section = None
+        self._heading_text = None
+        self._parameters = 0
+
+    def finish(self) -> List[StorageBlock]:
+        self.__end_block()
+        return self.blocks
+
+    def handle_starttag(self, tag, attrs):
+        self.__start_tag(tag, attrs, self_closing=False)
+
+    def handle_startendtag(self, tag, attrs):
+        self.__start_tag(tag, attrs, self_closing=True)
+
+    def handle_endtag(self, tag):
+        if tag in _BlockParser.VOID_TAGS:
+            return
+        self._tokens.append(('block' if tag in _BlockParser.BLOCK_TAGS else 'tag', f'</{tag}>'))
+        if tag == 'pre':
+            self._preformatted = max(0, self._preformatted - 1)
+        if tag == 'ac:parameter':
+            self._parameters = max(0, self._parameters - 1)
+        if tag in _BlockParser.HEADING_TAGS and self._heading_text is not None:
+            self._section = ' '.join(''.join(self._heading_text).split()) or self._section
+            self._heading_text = None
+        self._depth = max(0, self._depth - 1)
+        if self._depth == 0:
+            self.__end_block()
+
+    def handle_data(self, data):
+        # Macro parameters, such as the name of a heading anchor, are not part of the heading text.
+        if self._heading_text is not None and not self._parameters:
+            self._heading_text.append(data)
+        if self._preformatted:
+            self._tokens.append(('pre', html.escape(data, quote=False)))
+            return
+        data = _BlockParser.WHITESPACE.sub(' ', data)
+        if self._depth == 0 and not data.strip():
+            return
+        self._tokens.append(('text', html.escape(data, quote=False)))
+        if self._depth == 0:
+            # Text outside of any element is a block of its own.
+            self.__end_block()
+
+    def unknown_decl(self, data):
+        # CDATA sections, e.g. the body of a code macro, are kept verbatim.
+        self._tokens.append(('tag', f'<![{data}]]>'))
+
+    def handle_comment(self, data):
+        pass
+
+    def __start_tag(self, tag, attrs, self_closing: bool):
+        attributes = ''.join(
+            f' {name}="{html.escape(value or "")}"' for name, value in sorted(attrs, key=lambda attr: attr[0])
+        )
+        kind = 'block' if tag in _BlockParser.BLOCK_TAGS else 'tag'
+        void = self_closing or tag in _BlockParser.VOID_TAGS
+        self._tokens.append((kind, f'<{tag}{attributes}{" /" if void else ""}>'))
+        if void:
+            if self._depth == 0:
+                self.__end_block()
+            return
+        if tag == 'pre':
+            self._preformatted += 1
+        if tag == 'ac:parameter':
+            self._parameters += 1
+        if tag in _BlockParser.HEADING_TAGS:
+            self._heading_text = []
+        self._depth += 1
+
+    def __end_block(self):
+        if not self._tokens:
+            return
+        # Whitespace next to a block-level tag is indentation or line breaks between blocks.
+        markup = []
+        for index, (kind, value) in enumerate(self._tokens):
+            if kind == 'text':
+                if index == 0 or self._tokens[index - 1][0] == 'block':
+                    value = value.lstrip(' ')
+                if index + 1 == len(self._tokens) or self._tokens[index + 1][0] == 'block':
+                    value = value.rstrip(' ')
+                if not value:
+                    continue
+            markup.append(value)
+        self._tokens = []
+
+        digest = hashlib.sha1(''.join(markup).encode('utf-8')).hexdigest()
+        self.blocks.append(StorageBlock(digest, self._section))
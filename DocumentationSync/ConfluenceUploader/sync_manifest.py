@@ -0,0 +1,189 @@
+# sync_manifest.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Optional
+
+
+class SyncManifest:
+    """
+    A persistent, local record of what was last published to each Confluence page.
+
+    For every page_id the manifest stores the digest of the published title and storage body,
+    together with the page version number Confluence returned for that update. When a rendered
+    page matches the recorded digest, the uploader can skip both the version GET and the update PUT.
+    Uploaded attachments are recorded by size and SHA-256, so an unchanged file is not uploaded again.
+
+    The manifest is a JSON file, loaded lazily on first use and written atomically on `save()`.
+    It may be shared between upload threads, all access is serialized by an internal lock.
+    """
+
+    # Small, as a slice and its encoded copy are held at once, which would outweigh the body of a small page.
+    DIGEST_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = os.path.expanduser(manifest_path)
+        self._pages = None
+        self._attachments = None
+        self._child_pages = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def digest(title: str, body_content: str) -> str:
+        """
+        Computes the content digest of a page's title and rendered storage body.
+
+        :param title: The title of the Confluence page.
+        :param body_content: The rendered storage format body of the page.
+        :return: The hex encoded SHA-256 digest.
+        """
+        hasher = hashlib.sha256()
+        hasher.update(title.encode('utf-8'))
+        hasher.update(b'\0')
+        # Encoded a slice at a time, so hashing a large page never holds a full encoded copy of it.
+        for start in range(0, len(body_content), SyncManifest.DIGEST_CHUNK_SIZE):
+            hasher.update(body_content[start:start + SyncManifest.DIGEST_CHUNK_SIZE].encode('utf-8'))
+        return hasher.hexdigest()
+
+    def get(self, page_id: str) -> Optional[dict]:
+        """
+        Returns the recorded entry for a page, or None if the page has never been synced.
+
+        :param page_id: The ID of the Confluence page.
+        :return: A dict with the `digest` and `version` keys, or None.
+        """
+        with self._lock:
+            return self.__load().get(page_id)
+
+    def is_unchanged(self, page_id: str, digest: str) -> bool:
+        """
+        Checks whether the given digest matches the last published content for a page.
+
+        :param page_id: The ID of the Confluence page.
+        :param digest: The digest of the newly rendered page.
+        :return: True if the page content has not changed since the last sync.
+        """
+        entry = self.get(page_id)
+        return entry is not None and entry.get('digest') == digest
+
+    def record(self, page_id: str, digest: str, version: int):
+        """
+        Records a successful publish of a page.
+
+        :param page_id: The ID of the Confluence page.
+        :param digest: The digest of the published content.
+        :param version: The page version number Confluence assigned to the update.
+        """
+        with self._lock:
+            self.__load()[page_id] = {
+                'digest': digest,
+                'version': version
+            }
+
+    def remove(self, page_id: str):
+        """
+        Drops the entry for a page, forcing it to be published on the next sync.
+
+        :param page_id: The ID of the Confluence page.
+        """
+        with self._lock:
+            self.__load().pop(page_id, None)
+
+    def get_attachment(self, page_id: str, file_name: str) -> Optional[dict]:
+        """
+        Returns the recorded entry for an attachment, or None if it has never been uploaded.
+
+        :param page_id: The ID of the Confluence page the file is attached to.
+        :param file_name: The file name of the attachment.
+        :return: A dict with the `size` and `sha256` keys, or None.
+        """
+        with self._lock:
+            self.__load()
+            return self._attachments.get(f'{page_id}/{file_name}')
+
+    def record_attachment(self, page_id: str, file_name: str, size: int, sha256: str):
+        """
+        Records a successful attachment upload.
+
+        :param page_id: The ID of the Confluence page the file is attached to.
+        :param file_name: The file name of the attachment.
+        :param size: The size of the uploaded file in bytes.
+        :param sha256: The hex encoded SHA-256 of the uploaded file.
+        """
+        with self._lock:
+            self.__load()
+            self._attachments[f'{page_id}/{file_name}'] = {
+                'size': size,
+                'sha256': sha256
+            }
+
+    def get_child_page(self, parent_page_id: str, title: str) -> Optional[str]:
+        """
+        Returns the ID of a child page created by this script, or None if it is not known.
+
+        :param parent_page_id: The ID of the parent Confluence page.
+        :param title: The title of the child page.
+        :return: The ID of the child page, or None.
+        """
+        with self._lock:
+            self.__load()
+            return self._child_pages.get(f'{parent_page_id}/{title}')
+
+    def record_child_page(self, parent_page_id: str, title: str, page_id: str):
+        """
+        Records the ID of a child page, so it does not need to be looked up again.
+
+        :param parent_page_id: The ID of the parent Confluence page.
+        :param title: The title of the child page.
+        :param page_id: The ID of the child page.
+        """
+        with self._lock:
+            self.__load()
+            self._child_pages[f'{parent_page_id}/{title}'] = page_id
+
+    def save(self):
+        """
+        Writes the manifest to disk. The file is replaced atomically so an interrupted run
+        never leaves a truncated manifest behind.
+        """
+        with self._lock:
+            if self._pages is None:
+                return
+
+            directory = os.path.dirname(self.manifest_path) or '.'
+            os.makedirs(directory, exist_ok=True)
+
+            file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+                    json.dump(
+                        {
+                            'pages': self._pages,
+                            'attachments': self._attachments,
+                            'child_pages': self._child_pages
+                        },
+                        file,
+                        indent=2,
+                        sort_keys=True
+                    )
+                os.replace(temp_path, self.manifest_path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+    def __load(self) -> dict:
+        if self._pages is None:
+            contents = {}
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                    contents = json.load(file)
+            except FileNotFoundError:
+                pass
+            except ValueError:
+                print(f'Warning: ignoring unreadable sync manifest at {self.manifest_path}')
+            self._pages = contents.get('pages', {})
+            self._attachments = contents.get('attachments', {})
+            self._child_pages = contents.get('child_pages', {})
+        return self._pages
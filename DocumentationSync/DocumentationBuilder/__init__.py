@@ -8,7 +8,7 @@ A Python package for building DocC Documentation archive files for Swift Package
 ## Installation
 
 ```python
-from DocumentationBuilder.documentation_builder import DocumentationBuilder
+from DocumentationBuilder.documentation_builder import BuildTarget, DocumentationBuilder
 ```
 
 ## Example usage:
@@ -28,6 +28,52 @@ archive_path = DocumentationBuilder.build_documentation("/path/to/package", "Pac
 archive_path = DocumentationBuilder.build_documentation("/path/to/xcodeproj", "xcodeproj", "MyProjectTarget", "MyScheme")
 ```
 
+### Several targets and platforms, built concurrently:
+
+```python
+archive_paths = DocumentationBuilder.build_documentation_archives(
+    "/path/to/package", "Package", ["MyCoreTarget", "MyUITarget"], platforms=["iOS", "macOS"], max_parallel_builds=4
+)
+# {BuildTarget("MyCoreTarget", "iOS"): "/path/to/MyCoreTarget.doccarchive", ...}
+```
+
+### Dependencies and build state shared by every library, across runs:
+
+```python
+from DocumentationBuilder.dependency_cache import DependencyCache
+
+dependency_cache = DependencyCache("~/.documentation_sync/dependency_cache")
+archive_path = DocumentationBuilder.build_documentation_archive(
+    "/path/to/package", "Package", "MyPackageTarget", dependency_cache=dependency_cache
+)
+dependency_cache.print_stats()
+```
+
+### Archives stored once per distinct file, with the 5 latest versions of every target:
+
+```python
+from DocumentationBuilder.archive_store import ArchiveStore
+
+archive_store = ArchiveStore("~/.documentation_sync/archive_store", keep_versions=5)
+archive_path = DocumentationBuilder.build_documentation_archive(
+    "/path/to/package", "Package", "MyPackageTarget", archive_store=archive_store
+)
+archive_store.collect_garbage()
+previous_archive_path = archive_store.materialize("MyPackageTarget", "/tmp/archives", archive_store.versions("MyPackageTarget")[1])
+```
+
+### Build subprocesses, with a timeout and their output tail:
+
+```python
+from DocumentationBuilder.build_process import BuildProcess
+
+build_process = BuildProcess(["swift", "package", "generate-documentation"], cwd="/path/to/package", timeout_seconds=600)
+try:
+    build_process.run()
+except subprocess.CalledProcessError:
+    print(build_process.output_tail, build_process.progress.phase)
+```
+
 ### XCFramework:
 
 ```python
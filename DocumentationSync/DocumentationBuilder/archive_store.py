@@ -0,0 +1,407 @@
+# archive_store.py
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+
+class ArchiveManifest(NamedTuple):
+    """
+    A version of a .doccarchive in an `ArchiveStore`: its directory tree, with the content digest of every file.
+
+    `version` is derived from the tree itself, so identical archives share one version.
+    `files` holds a (relative path, SHA-256, size) tuple per file.
+    """
+    version: str
+    archive_name: str
+    files: List[Tuple[str, str, int]]
+    directories: List[str]
+    symlinks: List[Tuple[str, str]]
+
+    @property
+    def size(self) -> int:
+        return sum(size for _, _, size in self.files)
+
+
+class ArchiveStore:
+    """
+    A local, content-addressed store of .doccarchive versions, shared by every library.
+
+    Every file of an archive is stored once per content, as a read-only blob named after its SHA-256, so
+    the theme CSS and JavaScript, fonts and images that most archives have in common take the space of a
+    single copy, however many libraries and versions use them. A version of an archive is described by a
+    compact, gzipped manifest of its tree, and is materialized on demand as a tree of hard links to the
+    blobs, which takes no space and no copying. Where hard links are not possible, files are cloned on
+    file systems with reflinks, and copied otherwise.
+
+    Garbage collection keeps the `keep_versions` most recently stored versions of every library, and drops
+    the other versions and every blob none of the kept versions uses. Versions and blob counts are kept
+    in an index file, guarded by a file lock, and garbage collection never runs while an archive is being
+    stored or materialized, in any process.
+
+    The class includes the following methods:
+
+    - put(library: str, archive_path: str, source_key: Optional[str] = None) -> ArchiveManifest:
+    Stores an archive as the latest version of a library.
+
+    - materialize(library: str, destination_dir: str, version: Optional[str] = None) -> Path:
+    Recreates a stored version of an archive in a directory, as hard links to the blobs.
+
+    - versions(library: str) -> List[str]:
+    Returns the stored versions of a library, the most recent first.
+
+    - manifest(version: str) -> ArchiveManifest:
+    Reads the manifest of a stored version.
+
+    - collect_garbage(keep_versions: Optional[int] = None) -> dict:
+    Drops all but the most recent versions of every library, and the blobs no kept version uses.
+
+    - stats() -> dict:
+    Returns the number of libraries, versions and blobs, and the size of the archives and of the blobs.
+
+    - print_stats():
+    Prints a one line report of the store statistics.
+    """
+
+    DEFAULT_STORE_DIRECTORY = '~/.documentation_sync/archive_store'
+    DEFAULT_KEEP_VERSIONS = 5
+    # The ioctl cloning a file on Linux file systems with reflinks, like Btrfs and XFS.
+    FICLONE = 0x40049409
+
+    def __init__(self, store_dir: Optional[str] = None, keep_versions: int = DEFAULT_KEEP_VERSIONS):
+        """
+        :param store_dir: The directory to keep the blobs, manifests and index in.
+        :param keep_versions: The number of versions of every library kept by garbage collection, at least 1.
+        :raises ValueError: If `keep_versions` is less than 1.
+        """
+        if keep_versions < 1:
+            raise ValueError(f'keep_versions must be at least 1, got {keep_versions}')
+        self.store_dir = Path(os.path.expanduser(store_dir or ArchiveStore.DEFAULT_STORE_DIRECTORY))
+        self.keep_versions = keep_versions
+        self._blobs_dir = self.store_dir / 'blobs'
+        self._manifests_dir = self.store_dir / 'manifests'
+        self._index_path = self.store_dir / 'index.json'
+        os.makedirs(self._blobs_dir, exist_ok=True)
+        os.makedirs(self._manifests_dir, exist_ok=True)
+
+    def put(self, library: str, archive_path: str, source_key: Optional[str] = None) -> ArchiveManifest:
+        """
+        Stores an archive as the latest version of a library. Only files whose content is not in the store
+        yet are copied into it, every file is hashed.
+
+        :param library: The name of the library, e.g. the build target and platform.
+        :param archive_path: The path of the .doccarchive directory.
+        :param source_key: The build cache key of the archive. If the library already has a version built
+            from the same key, that version becomes the latest without hashing the archive again.
+        :return: The manifest of the stored version.
+        """
+        with self.__collection_lock(exclusive=False):
+            if source_key is not None:
+                with self.__locked_index() as index:
+                    entry = next(
+                        (entry for entry in index['libraries'].get(library, []) if entry.get('source_key') == source_key),
+                        None
+                    )
+                    if entry is not None and self.__manifest_path(entry['version']).exists():
+                        entry['stored_at'] = time.time()
+                        return self.manifest(entry['version'])
+
+            archive_name = os.path.basename(str(archive_path).rstrip(os.sep))
+            directories, symlinks, files = ArchiveStore.__scan(str(archive_path))
+            with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+                stored = list(pool.map(self.__store_blob, [path for _, path, _ in files]))
+
+            manifest = ArchiveManifest(
+                version='',
+                archive_name=archive_name,
+                files=[(relative_path, digest, size) for (relative_path, _, size), (digest, _) in zip(files, stored)],
+                directories=directories,
+                symlinks=symlinks
+            )
+            contents = {
+                'archive_name': manifest.archive_name,
+                'files': manifest.files,
+                'directories': manifest.directories,
+                'symlinks': manifest.symlinks
+            }
+            encoded = json.dumps(contents, separators=(',', ':')).encode('utf-8')
+            manifest = manifest._replace(version=hashlib.sha256(encoded).hexdigest()[:32])
+            manifest_path = self.__manifest_path(manifest.version)
+            if not manifest_path.exists():
+                ArchiveStore.__write_atomically(manifest_path, gzip.compress(encoded, compresslevel=6, mtime=0))
+
+            new_blobs = sum(1 for _, created in stored if created)
+            new_bytes = sum(size for (_, _, size), (_, created) in zip(files, stored) if created)
+            with self.__locked_index() as index:
+                entries = [entry for entry in index['libraries'].get(library, []) if entry['version'] != manifest.version]
+                entries.append({
+                    'version': manifest.version,
+                    'source_key': source_key,
+                    'stored_at': time.time(),
+                    'size': manifest.size
+                })
+                index['libraries'][library] = entries
+                index['blobs']['count'] += new_blobs
+                index['blobs']['size'] += new_bytes
+
+        print(
+            f"Stored {archive_name} as version {manifest.version[:12]} of {library}: "
+            f"{new_blobs} of {len(files)} files new, {new_bytes / 1024 ** 2:.1f} of {manifest.size / 1024 ** 2:.1f} MB")
+        return manifest
+
+    def materialize(self, library: str, destination_dir: str, version: Optional[str] = None) -> Path:
+        """
+        Recreates a stored version of an archive in a directory, as hard links to the read-only blobs.
+        An existing archive of the same name in the directory is replaced.
+
+        :param library: The name of the library.
+        :param destination_dir: The directory to create the archive in.
+        :param version: The version to materialize, defaults to the most recently stored version of the library.
+        :return: The path of the materialized .doccarchive.
+        :raises KeyError: If the library has no such version.
+        """
+        os.makedirs(destination_dir, exist_ok=True)
+        with self.__collection_lock(exclusive=False):
+            versions = self.versions(library)
+            version = version or (versions[0] if versions else None)
+            if version is None or version not in versions:
+                raise KeyError(f'No version {version} of {library} in the archive store')
+            manifest = self.manifest(version)
+            staging_dir = Path(tempfile.mkdtemp(dir=destination_dir, prefix='.materialize-'))
+            try:
+                root = staging_dir / manifest.archive_name
+                os.makedirs(root)
+                for relative_path in manifest.directories:
+                    os.makedirs(root / relative_path, exist_ok=True)
+                for relative_path, digest, _ in manifest.files:
+                    ArchiveStore.__link(self.__blob_path(digest), root / relative_path)
+                for relative_path, target in manifest.symlinks:
+                    os.symlink(target, root / relative_path)
+
+                destination = Path(destination_dir) / manifest.archive_name
+                if destination.exists() or destination.is_symlink():
+                    os.replace(destination, staging_dir / '.replaced')
+                os.replace(root, destination)
+            finally:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+        return destination
+
+    def versions(self, library: str) -> List[str]:
+        """
+        Returns the stored versions of a library.
+
+        :param library: The name of the library.
+        :return: The versions, the most recently stored first.
+        """
+        with self.__locked_index() as index:
+            entries = index['libraries'].get(library, [])
+            return [entry['version'] for entry in sorted(entries, key=lambda entry: entry['stored_at'], reverse=True)]
+
+    def manifest(self, version: str) -> ArchiveManifest:
+        """
+        Reads the manifest of a stored version.
+
+        :param version: The version of the archive.
+        :return: The manifest.
+        """
+        with gzip.open(self.__manifest_path(version), 'rt', encoding='utf-8') as file:
+            contents = json.load(file)
+        return ArchiveManifest(
+            version=version,
+            archive_name=contents['archive_name'],
+            files=[tuple(file) for file in contents['files']],
+            directories=contents['directories'],
+            symlinks=[tuple(symlink) for symlink in contents['symlinks']]
+        )
+
+    def collect_garbage(self, keep_versions: Optional[int] = None) -> dict:
+        """
+        Drops all but the most recently stored versions of every library, and every blob that none of the
+        kept versions uses. Waits for archives being stored or materialized to finish first.
+
+        :param keep_versions: The number of versions of every library to keep, at least 1, defaults to `keep_versions`.
+        :return: A dict with the `versions`, `blobs` and `bytes` that were dropped.
+        :raises ValueError: If `keep_versions` is less than 1.
+        """
+        if keep_versions is None:
+            keep_versions = self.keep_versions
+        elif keep_versions < 1:
+            raise ValueError(f'keep_versions must be at least 1, got {keep_versions}')
+        with self.__collection_lock(exclusive=True):
+            with self.__locked_index() as index:
+                dropped_versions = 0
+                for library, entries in list(index['libraries'].items()):
+                    entries.sort(key=lambda entry: entry['stored_at'], reverse=True)
+                    dropped_versions += len(entries[keep_versions:])
+                    index['libraries'][library] = entries[:keep_versions]
+                kept_versions = {entry['version'] for entries in index['libraries'].values() for entry in entries}
+
+                referenced = set()
+                for manifest_path in self._manifests_dir.glob('*.json.gz'):
+                    version = manifest_path.name[:-len('.json.gz')]
+                    if version not in kept_versions:
+                        os.remove(manifest_path)
+                        continue
+                    referenced.update(digest for _, digest, _ in self.manifest(version).files)
+
+                dropped_blobs = dropped_bytes = 0
+                blob_count = blob_size = 0
+                for directory, _, names in os.walk(self._blobs_dir):
+                    for name in names:
+                        path = os.path.join(directory, name)
+                        size = os.lstat(path).st_size
+                        if os.path.basename(directory) + name in referenced:
+                            blob_count += 1
+                            blob_size += size
+                            continue
+                        # Also drops the temporary files of stores that were interrupted.
+                        os.remove(path)
+                        dropped_blobs += 1
+                        dropped_bytes += size
+                index['blobs'] = {'count': blob_count, 'size': blob_size}
+
+        print(
+            f"Archive store garbage collection: dropped {dropped_versions} versions, "
+            f"{dropped_blobs} blobs, {dropped_bytes / 1024 ** 2:.1f} MB")
+        return {'versions': dropped_versions, 'blobs': dropped_blobs, 'bytes': dropped_bytes}
+
+    def stats(self) -> dict:
+        """
+        Returns the number of libraries, versions and blobs, and the size of the archives and of the blobs.
+
+        :return: A dict with the `libraries`, `versions`, `archive_bytes`, `blobs` and `blob_bytes` keys.
+        """
+        with self.__locked_index() as index:
+            entries = [entry for entries in index['libraries'].values() for entry in entries]
+            return {
+                'libraries': sum(1 for entries in index['libraries'].values() if entries),
+                'versions': len(entries),
+                'archive_bytes': sum(entry['size'] for entry in entries),
+                'blobs': index['blobs']['count'],
+                'blob_bytes': index['blobs']['size']
+            }
+
+    def print_stats(self):
+        """
+        Prints a one line report of the store statistics.
+        """
+        stats = self.stats()
+        share = 100.0 * stats['blob_bytes'] / stats['archive_bytes'] if stats['archive_bytes'] else 0.0
+        print(
+            f"Archive store: {stats['versions']} versions of {stats['libraries']} libraries, "
+            f"{stats['archive_bytes'] / 1024 ** 2:.1f} MB of archives in {stats['blobs']} blobs of "
+            f"{stats['blob_bytes'] / 1024 ** 2:.1f} MB ({share:.0f}%)")
+
+    def __store_blob(self, path: str) -> Tuple[str, bool]:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+
+        blob_path = self.__blob_path(digest)
+        if blob_path.exists():
+            return digest, False
+        os.makedirs(blob_path.parent, exist_ok=True)
+        temp_path = blob_path.parent / f'.{digest}.{os.getpid()}.tmp'
+        ArchiveStore.__clone(path, temp_path)
+        # Read-only, so a materialized archive written to in place can not change the blob it links to.
+        os.chmod(temp_path, 0o444)
+        try:
+            # Unlike a rename, a link fails if a concurrent store created the blob first.
+            os.link(temp_path, blob_path)
+            created = True
+        except FileExistsError:
+            created = False
+        finally:
+            os.remove(temp_path)
+        return digest, created
+
+    def __blob_path(self, digest: str) -> Path:
+        return self._blobs_dir / digest[:2] / digest[2:]
+
+    def __manifest_path(self, version: str) -> Path:
+        return self._manifests_dir / f'{version}.json.gz'
+
+    @contextmanager
+    def __collection_lock(self, exclusive: bool):
+        # Shared by every store and materialization, exclusive for garbage collection.
+        with open(self.store_dir / 'collection.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def __locked_index(self):
+        with open(self.store_dir / 'index.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self._index_path, 'r', encoding='utf-8') as file:
+                        index = json.load(file)
+                except (FileNotFoundError, ValueError):
+                    index = {}
+                index.setdefault('libraries', {})
+                index.setdefault('blobs', {'count': 0, 'size': 0})
+
+                yield index
+
+                ArchiveStore.__write_atomically(self._index_path, json.dumps(index).encode('utf-8'))
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def __scan(archive_path: str) -> Tuple[List[str], List[Tuple[str, str]], List[Tuple[str, str, int]]]:
+        directories, symlinks, files = [], [], []
+        for directory, directory_names, file_names in os.walk(archive_path):
+            relative_directory = os.path.relpath(directory, archive_path)
+            # Walked in a fixed order, so the same tree always has the same manifest, and version.
+            directory_names.sort()
+            for name in sorted(directory_names + file_names):
+                path = os.path.join(directory, name)
+                relative_path = os.path.normpath(os.path.join(relative_directory, name))
+                if os.path.islink(path):
+                    symlinks.append((relative_path, os.readlink(path)))
+                elif name in directory_names:
+                    directories.append(relative_path)
+                else:
+                    files.append((relative_path, path, os.lstat(path).st_size))
+        return directories, symlinks, files
+
+    @staticmethod
+    def __link(source: Path, destination: Path):
+        try:
+            os.link(source, destination)
+        except OSError:
+            # Another file system, or too many links to the blob.
+            ArchiveStore.__clone(source, destination)
+            os.chmod(destination, 0o644)
+
+    @staticmethod
+    def __clone(source, destination):
+        if sys.platform.startswith('linux'):
+            with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+                try:
+                    fcntl.ioctl(destination_file.fileno(), ArchiveStore.FICLONE, source_file.fileno())
+                    return
+                except OSError:
+                    pass
+        shutil.copyfile(source, destination)
+
+    @staticmethod
+    def __write_atomically(path: Path, contents: bytes):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(file_descriptor, 'wb') as file:
+            file.write(contents)
+        os.replace(temp_path, path)
@@ -0,0 +1,279 @@
+# build_cache.py
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+
+class BuildCache:
+    """
+    A local cache of built .doccarchive files, keyed on a fingerprint of the build inputs.
+
+    The fingerprint covers the Swift sources, headers, project files, `Package.swift`/`Package.resolved`
+    and every file inside a `.docc` catalog. Files are compared by mtime and size first, and only
+    re-hashed when those changed, so fingerprinting an unchanged repository does not read its sources.
+    When the fingerprint of a target matches a cached archive, the build is skipped entirely.
+
+    The cache is capped in size, the least recently used archives are evicted first. Cache entries and
+    cumulative hit/miss/eviction counters are kept in an index file, guarded by a file lock so builds
+    running in separate processes can share one cache.
+
+    The class includes the following methods:
+
+    - fingerprint(file_path: str, doc_type: str, target_name: str, scheme_name: Optional[str], platform: Optional[str]) -> str:
+    Computes the cache key of a build from its inputs.
+
+    - lookup(key: str) -> Optional[Path]:
+    Returns the cached .doccarchive path for a key, or None on a miss.
+
+    - store(key: str, archive_path: str) -> Path:
+    Copies a freshly built .doccarchive into the cache and returns its cached path.
+
+    - stats() -> dict:
+    Returns the cumulative hit, miss and eviction counts and the current size of the cache.
+    """
+
+    DEFAULT_CACHE_DIRECTORY = '~/.documentation_sync/build_cache'
+    DEFAULT_MAX_SIZE_BYTES = 5 * 1024 ** 3
+
+    INPUT_SUFFIXES = (
+        '.swift', '.h', '.m', '.mm', '.c', '.cpp',
+        '.pbxproj', '.xcscheme', '.xcconfig', '.swiftinterface', '.resolved'
+    )
+    PRUNED_DIRECTORIES = frozenset({'.build', '.git', '.swiftpm', 'docs', 'DerivedData'})
+
+    def __init__(self, cache_dir: Optional[str] = None, max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES):
+        """
+        :param cache_dir: The directory to keep cached archives in.
+        :param max_size_bytes: The maximum total size of the cached archives.
+        """
+        self.cache_dir = Path(os.path.expanduser(cache_dir or BuildCache.DEFAULT_CACHE_DIRECTORY))
+        self.max_size_bytes = max_size_bytes
+        self._archives_dir = self.cache_dir / 'archives'
+        self._fingerprints_dir = self.cache_dir / 'fingerprints'
+        self._index_path = self.cache_dir / 'index.json'
+        os.makedirs(self._archives_dir, exist_ok=True)
+        os.makedirs(self._fingerprints_dir, exist_ok=True)
+
+    def fingerprint(
+        self,
+        file_path: str,
+        doc_type: str,
+        target_name: str,
+        scheme_name: Optional[str] = None,
+        platform: Optional[str] = None
+    ) -> str:
+        """
+        Computes the cache key of a build from its inputs.
+
+        :param file_path: The file path passed to `DocumentationBuilder.build_documentation_archive`.
+        :param doc_type: The type of documentation to build, either "Package", "xcodeproj", or "xcframework".
+        :param target_name: The name of the target to build documentation for.
+        :param scheme_name: The name of the scheme to build, if any.
+        :param platform: The platform to build for, if any.
+        :return: The hex encoded cache key.
+        """
+        root = BuildCache.__source_root(file_path, doc_type)
+        include_all = doc_type == 'xcframework'
+
+        # The content hashes of the previous run, reused for every file whose mtime and size are unchanged.
+        known_path = self._fingerprints_dir / f'{BuildCache.__hash_text(f"{root}|{target_name}")}.json'
+        try:
+            with open(known_path, 'r', encoding='utf-8') as file:
+                known = json.load(file)
+        except (FileNotFoundError, ValueError):
+            known = {}
+
+        hasher = hashlib.sha256()
+        hasher.update(f'{doc_type}|{target_name}|{scheme_name or ""}'.encode('utf-8'))
+        # Builds for the default platform keep the keys they had before platforms could be chosen.
+        if platform:
+            hasher.update(f'|{platform}'.encode('utf-8'))
+        current = {}
+        for relative_path, stat in sorted(BuildCache.__input_files(root, include_all)):
+            previous = known.get(relative_path)
+            if previous and previous[0] == stat.st_mtime_ns and previous[1] == stat.st_size:
+                content_hash = previous[2]
+            else:
+                content_hash = BuildCache.__hash_file(os.path.join(root, relative_path))
+            current[relative_path] = [stat.st_mtime_ns, stat.st_size, content_hash]
+            hasher.update(f'\0{relative_path}\0{content_hash}'.encode('utf-8'))
+
+        if current != known:
+            BuildCache.__write_json(known_path, current)
+        return hasher.hexdigest()
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """
+        Returns the cached .doccarchive path for a key, or None on a miss.
+
+        :param key: A key returned by `fingerprint`.
+        :return: The path of the cached archive, or None.
+        """
+        with self.__locked_index() as index:
+            entry = index['entries'].get(key)
+            archive_path = self._archives_dir / key / entry['archive_name'] if entry else None
+            if archive_path is None or not archive_path.exists():
+                index['entries'].pop(key, None)
+                index['stats']['misses'] += 1
+                return None
+
+            entry['last_used'] = time.time()
+            index['stats']['hits'] += 1
+        print(f"Using cached DocC Archive at: {archive_path}")
+        return archive_path
+
+    def store(self, key: str, archive_path: str) -> Path:
+        """
+        Copies a freshly built .doccarchive into the cache, evicting the least recently used archives
+        when the cache grows past its size cap. Read-only files, like the files of an archive materialized
+        from an `ArchiveStore`, are hard linked instead of copied.
+
+        :param key: A key returned by `fingerprint`.
+        :param archive_path: The path of the built .doccarchive.
+        :return: The path of the cached archive.
+        """
+        archive_name = os.path.basename(str(archive_path).rstrip(os.sep))
+        staging_dir = Path(tempfile.mkdtemp(dir=self._archives_dir, prefix='.staging-'))
+        try:
+            shutil.copytree(archive_path, staging_dir / archive_name, symlinks=True, copy_function=BuildCache.__copy_file)
+            size = BuildCache.__directory_size(staging_dir)
+
+            with self.__locked_index() as index:
+                entry_dir = self._archives_dir / key
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(staging_dir, entry_dir)
+                index['entries'][key] = {
+                    'archive_name': archive_name,
+                    'size': size,
+                    'last_used': time.time()
+                }
+                self.__evict(index, keep=key)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        return self._archives_dir / key / archive_name
+
+    def stats(self) -> dict:
+        """
+        Returns the cumulative hit, miss and eviction counts and the current size of the cache.
+
+        :return: A dict with the `hits`, `misses`, `evictions`, `entries`, `size_bytes` and `max_size_bytes` keys.
+        """
+        with self.__locked_index() as index:
+            return dict(
+                index['stats'],
+                entries=len(index['entries']),
+                size_bytes=sum(entry['size'] for entry in index['entries'].values()),
+                max_size_bytes=self.max_size_bytes
+            )
+
+    def print_stats(self):
+        """
+        Prints a one line report of the cache statistics.
+        """
+        stats = self.stats()
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = 100.0 * stats['hits'] / lookups if lookups else 0.0
+        print(
+            f"Build cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.0f}% hit rate), "
+            f"{stats['evictions']} evictions, {stats['entries']} archives, "
+            f"{stats['size_bytes'] / 1024 ** 2:.1f} of {stats['max_size_bytes'] / 1024 ** 2:.0f} MB")
+
+    def __evict(self, index: dict, keep: str):
+        entries = index['entries']
+        total_size = sum(entry['size'] for entry in entries.values())
+        for key in sorted(entries, key=lambda key: entries[key]['last_used']):
+            if total_size <= self.max_size_bytes:
+                break
+            if key == keep:
+                continue
+            total_size -= entries.pop(key)['size']
+            shutil.rmtree(self._archives_dir / key, ignore_errors=True)
+            index['stats']['evictions'] += 1
+            print(f"Evicted cached DocC Archive {key}")
+
+    @contextmanager
+    def __locked_index(self):
+        with open(self.cache_dir / 'index.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self._index_path, 'r', encoding='utf-8') as file:
+                        index = json.load(file)
+                except (FileNotFoundError, ValueError):
+                    index = {}
+                index.setdefault('entries', {})
+                index.setdefault('stats', {'hits': 0, 'misses': 0, 'evictions': 0})
+
+                yield index
+
+                BuildCache.__write_json(self._index_path, index)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def __copy_file(source: str, destination: str) -> str:
+        # A read-only file is never written to in place, so a link to it is as good as a copy.
+        if not os.stat(source).st_mode & 0o222:
+            try:
+                os.link(source, destination)
+                return destination
+            except OSError:
+                pass
+        return shutil.copy2(source, destination)
+
+    @staticmethod
+    def __source_root(file_path: str, doc_type: str) -> str:
+        # An .xcodeproj only describes the project, its sources live next to it.
+        if doc_type == 'xcodeproj':
+            return os.path.dirname(os.path.abspath(file_path))
+        return os.path.abspath(file_path)
+
+    @staticmethod
+    def __input_files(root: str, include_all: bool):
+        pending = [(root, '', False)]
+        while pending:
+            directory, relative_directory, in_catalog = pending.pop()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    relative_path = os.path.join(relative_directory, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in BuildCache.PRUNED_DIRECTORIES:
+                            pending.append((entry.path, relative_path, in_catalog or entry.name.endswith('.docc')))
+                    elif entry.is_file(follow_symlinks=False):
+                        if include_all or in_catalog or entry.name.endswith(BuildCache.INPUT_SUFFIXES):
+                            yield relative_path, entry.stat(follow_symlinks=False)
+
+    @staticmethod
+    def __hash_file(path: str) -> str:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def __hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def __directory_size(path: Path) -> int:
+        total = 0
+        for directory, _, files in os.walk(path):
+            for name in files:
+                total += os.lstat(os.path.join(directory, name)).st_size
+        return total
+
+    @staticmethod
+    def __write_json(path: Path, contents: dict):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+            json.dump(contents, file)
+        os.replace(temp_path, path)
@@ -0,0 +1,341 @@
+# build_process.py
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+from instrumentation import Instrumentation
+
+
+class BuildProgress:
+    """
+    Follows the phases of a build, e.g. resolving packages, compiling or generating documentation, from its output.
+
+    Every phase is recorded as a "build_phase" span, labeled with the phase, once the next phase starts or the
+    build ends, with the number of output lines and of SwiftPM's `[12/40]` compile steps it took. The latest
+    step counter is kept as the progress of the compile phase.
+    """
+
+    # Matched in order against lines that are not indented, xcodebuild indents the commands of its build steps.
+    PHASES = (
+        ('resolve', re.compile(r'^(Fetching|Cloning|Computing version|Resolving|Resolve Package Graph|Resolved source packages)')),
+        ('symbols', re.compile(r'^(Extracting symbol information|ExtractAPI )')),
+        ('documentation', re.compile(
+            r'^(Generating documentation|Converting documentation|CompileDocumentation|ConvertDocumentation|Compile documentation)')),
+        ('compile', re.compile(
+            r'^(\[\d+/\d+\] |Building for |(CompileSwiftSources|SwiftCompile|SwiftEmitModule|CompileSwift|CompileC|SwiftDriver|'
+            r'Ld|Libtool|CompileAssetCatalog|ProcessInfoPlistFile|CopySwiftLibs) )')),
+    )
+    STEP_PATTERN = re.compile(r'^\[(\d+)/(\d+)\] ')
+
+    def __init__(self, label: Optional[str] = None, announce: bool = False):
+        """
+        :param label: The name of the build, e.g. its target, added to the recorded spans.
+        :param announce: Print every phase change, for builds whose output is not printed.
+        """
+        self.label = label
+        self.announce = announce
+        self.phase = None
+        self.completed_steps = 0
+        self.total_steps = 0
+        self._phase_started_at = None
+        self._phase_lines = 0
+        self._phase_steps = 0
+
+    def update(self, line: str):
+        """
+        Updates the progress from a line of build output.
+        """
+        if line and not line[0].isspace():
+            for phase, pattern in BuildProgress.PHASES:
+                if pattern.match(line):
+                    if phase != self.phase:
+                        self.__start_phase(phase)
+                    break
+
+            step = BuildProgress.STEP_PATTERN.match(line)
+            if step:
+                self.completed_steps, self.total_steps = int(step.group(1)), int(step.group(2))
+                self._phase_steps += 1
+        self._phase_lines += 1
+
+    def finish(self):
+        """
+        Records the current phase, once the build ended.
+        """
+        self.__start_phase(None)
+
+    def __start_phase(self, phase: Optional[str]):
+        now = time.time()
+        if self.phase is not None:
+            Instrumentation.record(
+                'build_phase',
+                now - self._phase_started_at,
+                started_at=self._phase_started_at,
+                measurements={'lines': self._phase_lines, 'steps': self._phase_steps},
+                details={'build': self.label} if self.label else None,
+                phase=self.phase
+            )
+        self.phase = phase
+        self._phase_started_at = now
+        self._phase_lines = 0
+        self._phase_steps = 0
+        if phase and self.announce:
+            print(f'[{self.label}] Build phase: {phase}' if self.label else f'Build phase: {phase}')
+
+
+class BuildCancellation:
+    """
+    A cancellation scope of build processes, e.g. the builds started by one call. Cancelling it kills the
+    process groups of its running build processes, and fails its build processes started afterwards, without
+    touching any other build.
+
+    The class includes the following methods:
+
+    - cancel():
+    Kills the running build processes of the scope, and fails every one started afterwards.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """
+        Kills the process groups of the running build processes of the scope, from any thread.
+        Build processes of the scope started afterwards fail right away, as if they had been killed.
+        """
+        with self._lock:
+            self.cancelled = True
+            running = list(self._running)
+        for build_process in running:
+            build_process.cancel()
+
+    def _add(self, build_process: 'BuildProcess') -> bool:
+        # Returns whether the scope was cancelled, in which case the caller kills the process itself.
+        with self._lock:
+            self._running.add(build_process)
+            return self.cancelled
+
+    def _discard(self, build_process: 'BuildProcess'):
+        with self._lock:
+            self._running.discard(build_process)
+
+
+class BuildProcess:
+    """
+    A build subprocess, such as `swift package` or `xcodebuild`, supervised on an asyncio event loop.
+
+    The process runs in its own process group, so a timeout or a cancellation kills it together with every
+    process it started, e.g. the compilers and `docc` run by xcodebuild. Its stdout and stderr are read line by
+    line into a bounded ring buffer, so memory stays flat however chatty the build is, and the last lines are
+    still at hand when it fails. Every line is optionally echoed, and feeds a `BuildProgress`.
+
+    All running build processes can be killed at once with `cancel_all`, e.g. when the sync is interrupted,
+    which also keeps queued builds from starting any new process. The processes of a `BuildCancellation`
+    passed as `cancellation` can be killed on their own the same way.
+
+    The class includes the following methods:
+
+    - run() -> int:
+    Runs the process to completion on a private event loop.
+
+    - run_async() -> int:
+    Runs the process to completion on the running event loop.
+
+    - cancel():
+    Kills the process group, from any thread.
+
+    - cancel_all():
+    Kills the process groups of every running build process, and fails every process started afterwards.
+    """
+
+    DEFAULT_OUTPUT_LINES = 200
+    # Longer lines are split, so a single line never grows the buffer without bound.
+    MAX_LINE_BYTES = 16 * 1024
+    # How long a killed process group may take to exit after SIGTERM, before it gets SIGKILL.
+    KILL_GRACE_SECONDS = 10.0
+
+    # Every build process of this process belongs to it, see `cancel_all`.
+    _all = BuildCancellation()
+
+    def __init__(
+        self,
+        command: List[str],
+        cwd: Optional[str] = None,
+        timeout_seconds: Optional[float] = None,
+        label: Optional[str] = None,
+        echo: bool = True,
+        output_lines: int = DEFAULT_OUTPUT_LINES,
+        cancellation: Optional[BuildCancellation] = None
+    ):
+        """
+        :param command: The command to run.
+        :param cwd: The working directory of the command.
+        :param timeout_seconds: The wall-clock time after which the process group is killed, or None to never time out.
+        :param label: The name of the build, prefixed to its echoed output and recorded with its progress.
+        :param echo: Print every line of output. Otherwise only the phase changes, and the last lines on failure, are printed.
+        :param output_lines: The number of last lines of output kept.
+        :param cancellation: A scope that can kill the process together with the other processes of the scope.
+        """
+        self.command = list(command)
+        self.cwd = cwd
+        self.timeout_seconds = timeout_seconds
+        self.label = label
+        self.echo = echo
+        self.output = deque(maxlen=output_lines)
+        self.progress = BuildProgress(label, announce=not echo)
+        self.returncode = None
+        self._process = None
+        self._cancel_timer = None
+        self._scopes = (BuildProcess._all,) if cancellation is None else (BuildProcess._all, cancellation)
+
+    @property
+    def output_tail(self) -> str:
+        """
+        The last lines of output, at most `output_lines` of them.
+        """
+        return '\n'.join(self.output)
+
+    def run(self) -> int:
+        """
+        Runs the process to completion on a private event loop, so it can be called from any thread.
+
+        :return: The exit status, always 0.
+        :raises subprocess.CalledProcessError: If the process failed or was cancelled, with the last lines as `output`.
+        :raises subprocess.TimeoutExpired: If the process timed out, with the last lines as `output`.
+        """
+        import asyncio
+
+        return asyncio.run(self.run_async())
+
+    async def run_async(self) -> int:
+        """
+        Runs the process to completion on the running event loop. Cancelling the awaiting task kills the process group.
+
+        :return: The exit status, always 0.
+        :raises subprocess.CalledProcessError: If the process failed or was cancelled, with the last lines as `output`.
+        :raises subprocess.TimeoutExpired: If the process timed out, with the last lines as `output`.
+        """
+        import asyncio
+
+        if any(scope.cancelled for scope in self._scopes):
+            raise subprocess.CalledProcessError(-signal.SIGTERM, self.command, output='')
+        # The scopes are only locked to register the process, a threading lock held across an await would
+        # deadlock concurrent builds on the same event loop.
+        self._process = await asyncio.create_subprocess_exec(
+            *self.command,
+            cwd=self.cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+        # Every scope is registered with, even a cancelled one, which would not see the process otherwise.
+        cancelled = [scope._add(self) for scope in self._scopes]
+        if any(cancelled):
+            # A scope was cancelled while the process was being spawned, and did not see it.
+            self.cancel()
+
+        try:
+            self.returncode = await asyncio.wait_for(self.__supervise(), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            await self.__kill()
+            self.__print_tail(f'timed out after {self.timeout_seconds:.0f}s')
+            raise subprocess.TimeoutExpired(self.command, self.timeout_seconds, output=self.output_tail)
+        except asyncio.CancelledError:
+            await self.__kill()
+            raise
+        finally:
+            for scope in self._scopes:
+                scope._discard(self)
+            if self._cancel_timer is not None:
+                self._cancel_timer.cancel()
+            self.progress.finish()
+
+        if self.returncode != 0:
+            self.__print_tail(f'exited with status {self.returncode}')
+            raise subprocess.CalledProcessError(self.returncode, self.command, output=self.output_tail)
+        return self.returncode
+
+    def cancel(self):
+        """
+        Kills the process group, from any thread. The process gets SIGTERM first, and SIGKILL if it is still
+        running after `KILL_GRACE_SECONDS`.
+        """
+        # A process of several cancelled scopes is only killed once.
+        if self._process is None or self._process.returncode is not None or self._cancel_timer is not None:
+            return
+        BuildProcess.__signal_group(self._process.pid, signal.SIGTERM)
+        self._cancel_timer = threading.Timer(
+            BuildProcess.KILL_GRACE_SECONDS,
+            BuildProcess.__signal_group,
+            (self._process.pid, signal.SIGKILL)
+        )
+        self._cancel_timer.daemon = True
+        self._cancel_timer.start()
+
+    @staticmethod
+    def cancel_all():
+        """
+        Kills the process groups of every running build process, e.g. when the sync is interrupted.
+        Build processes started afterwards fail right away, as if they had been killed.
+        """
+        BuildProcess._all.cancel()
+
+    async def __supervise(self) -> int:
+        stream = self._process.stdout
+        pending = b''
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            while len(pending) > BuildProcess.MAX_LINE_BYTES:
+                lines.append(pending[:BuildProcess.MAX_LINE_BYTES])
+                pending = pending[BuildProcess.MAX_LINE_BYTES:]
+            for line in lines:
+                self.__handle_line(line)
+        if pending:
+            self.__handle_line(pending)
+        # The output ends when the process and every child holding it open exited.
+        return await self._process.wait()
+
+    def __handle_line(self, raw_line: bytes):
+        line = raw_line.decode('utf-8', 'replace').rstrip('\r')
+        self.output.append(line)
+        if self.echo:
+            print(f'[{self.label}] {line}' if self.label else line)
+        self.progress.update(line)
+
+    async def __kill(self):
+        import asyncio
+
+        BuildProcess.__signal_group(self._process.pid, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(self._process.wait(), BuildProcess.KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            BuildProcess.__signal_group(self._process.pid, signal.SIGKILL)
+            await self._process.wait()
+
+    def __print_tail(self, reason: str):
+        # Echoed output was printed as it came, the tail is only needed when it was not.
+        if self.echo:
+            return
+        name = self.label or os.path.basename(self.command[0])
+        print(f'[{name}] {" ".join(self.command[:2])} {reason}, last {len(self.output)} lines of output:')
+        for line in self.output:
+            print(f'[{name}] {line}')
+
+    @staticmethod
+    def __signal_group(process_group: int, signal_number: int):
+        try:
+            os.killpg(process_group, signal_number)
+        except (ProcessLookupError, PermissionError):
+            # The whole group already exited.
+            pass
@@ -0,0 +1,250 @@
+# dependency_cache.py
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+
+class DependencyCacheLease:
+    """
+    The build directory of a single build in a `DependencyCache`, locked for that build until the lease ends.
+
+    `warm` tells whether an earlier build already succeeded in the directory. Set `succeeded` once the build
+    succeeded, so the next build of the same inputs counts as warm.
+    """
+
+    def __init__(self, key: str, build_dir: str, package_cache_dir: str, warm: bool):
+        self.key = key
+        self.build_dir = build_dir
+        self.package_cache_dir = package_cache_dir
+        self.warm = warm
+        self.succeeded = False
+
+
+class DependencyCache:
+    """
+    A shared cache of package dependencies and build state, reused by the DocC builds of every library, across runs.
+
+    Every library shares one package cache, passed to SwiftPM as `--cache-path` and to xcodebuild as
+    `-packageCachePath`, so a dependency used by several libraries is only cloned once. SwiftPM and Xcode
+    lock that cache themselves.
+
+    Every build gets a build directory, used as the SwiftPM scratch path or the xcodebuild derived data
+    directory. It is keyed on the library, target, scheme and platform, and on the contents of the
+    `Package.resolved` pinning its dependencies, so the resolved checkouts and compiled dependencies of an
+    earlier build are reused as long as the pins are unchanged, and a build with new pins starts from a
+    fresh directory. A build directory is locked while a build uses it, so concurrent builds, in threads or
+    processes, never share one.
+
+    The build directories are capped in size, the least recently used ones are evicted first, unless a
+    build is using them. Entries and the cumulative cold and warm build times are kept in an index file,
+    guarded by a file lock.
+
+    The class includes the following methods:
+
+    - lease(file_path: str, doc_type: str, target_name: str, scheme_name: Optional[str], platform: Optional[str]) -> ContextManager[DependencyCacheLease]:
+    Locks the build directory of a build for the duration of the context, and records its build time.
+
+    - stats() -> dict:
+    Returns the cumulative cold and warm build counts and times, and the current size of the cache.
+
+    - print_stats():
+    Prints a one line report of the cache statistics.
+    """
+
+    DEFAULT_CACHE_DIRECTORY = '~/.documentation_sync/dependency_cache'
+    DEFAULT_MAX_SIZE_BYTES = 20 * 1024 ** 3
+
+    def __init__(self, cache_dir: Optional[str] = None, max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES):
+        """
+        :param cache_dir: The directory to keep the package cache and build directories in.
+        :param max_size_bytes: The maximum total size of the build directories.
+        """
+        self.cache_dir = Path(os.path.expanduser(cache_dir or DependencyCache.DEFAULT_CACHE_DIRECTORY))
+        self.max_size_bytes = max_size_bytes
+        self.package_cache_dir = self.cache_dir / 'packages'
+        self._builds_dir = self.cache_dir / 'builds'
+        self._index_path = self.cache_dir / 'index.json'
+        os.makedirs(self.package_cache_dir, exist_ok=True)
+        os.makedirs(self._builds_dir, exist_ok=True)
+
+    @contextmanager
+    def lease(
+        self,
+        file_path: str,
+        doc_type: str,
+        target_name: str,
+        scheme_name: Optional[str] = None,
+        platform: Optional[str] = None
+    ):
+        """
+        Locks the build directory of a build for the duration of the context, waiting for a concurrent
+        build of the same inputs to finish first. When the context exits, the build time is recorded as
+        cold or warm, the size of the directory is updated, and the cache is evicted down to its cap.
+
+        :param file_path: The file path passed to `DocumentationBuilder.build_documentation_archive`.
+        :param doc_type: The type of documentation to build, either "Package" or "xcodeproj".
+        :param target_name: The name of the target to build documentation for.
+        :param scheme_name: The name of the scheme to build, if any.
+        :param platform: The platform to build for, if any.
+        :return: The lease of the build directory.
+        """
+        key = DependencyCache.__key(file_path, doc_type, target_name, scheme_name, platform)
+        build_dir = self._builds_dir / key
+
+        with open(self._builds_dir / f'{key}.lock', 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print(f"Waiting for another build of {target_name} to release its dependency cache directory")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            try:
+                # The directory may have been evicted while this build waited for it.
+                os.makedirs(build_dir, exist_ok=True)
+                with self.__locked_index() as index:
+                    entry = index['entries'].setdefault(key, {
+                        'name': f'{target_name}-{platform}' if platform else target_name,
+                        'size': 0,
+                        'builds': 0
+                    })
+                    entry['last_used'] = time.time()
+                    lease = DependencyCacheLease(key, str(build_dir), str(self.package_cache_dir), entry['builds'] > 0)
+                print(f"Using {'warm' if lease.warm else 'cold'} dependency cache directory {build_dir}")
+
+                started = time.perf_counter()
+                try:
+                    yield lease
+                finally:
+                    seconds = time.perf_counter() - started
+                    size = DependencyCache.__directory_size(build_dir)
+                    with self.__locked_index() as index:
+                        entry = index['entries'].setdefault(key, {'name': target_name, 'builds': 0})
+                        entry['size'] = size
+                        entry['last_used'] = time.time()
+                        if lease.succeeded:
+                            entry['builds'] += 1
+                            temperature = 'warm' if lease.warm else 'cold'
+                            index['stats'][f'{temperature}_builds'] += 1
+                            index['stats'][f'{temperature}_seconds'] += seconds
+                        self.__evict(index, keep=key)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        """
+        Returns the cumulative cold and warm build counts and times, and the current size of the cache.
+
+        :return: A dict with the `cold_builds`, `cold_seconds`, `warm_builds`, `warm_seconds`, `evictions`,
+            `entries`, `size_bytes` and `max_size_bytes` keys.
+        """
+        with self.__locked_index() as index:
+            return dict(
+                index['stats'],
+                entries=len(index['entries']),
+                size_bytes=sum(entry['size'] for entry in index['entries'].values()),
+                max_size_bytes=self.max_size_bytes
+            )
+
+    def print_stats(self):
+        """
+        Prints a one line report of the cache statistics.
+        """
+        stats = self.stats()
+
+        def average(temperature: str) -> str:
+            builds = stats[f'{temperature}_builds']
+            return f"{builds} {temperature} builds ({stats[f'{temperature}_seconds'] / builds:.1f}s average)" \
+                if builds else f"0 {temperature} builds"
+
+        print(
+            f"Dependency cache: {average('cold')}, {average('warm')}, {stats['evictions']} evictions, "
+            f"{stats['entries']} build directories, "
+            f"{stats['size_bytes'] / 1024 ** 2:.1f} of {stats['max_size_bytes'] / 1024 ** 2:.0f} MB")
+
+    def __evict(self, index: dict, keep: str):
+        entries = index['entries']
+        total_size = sum(entry['size'] for entry in entries.values())
+        for key in sorted(entries, key=lambda key: entries[key]['last_used']):
+            if total_size <= self.max_size_bytes:
+                break
+            if key == keep:
+                continue
+            # The lock files are never removed, so a build waiting on one always locks the same file.
+            with open(self._builds_dir / f'{key}.lock', 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # A build is using the directory.
+                    continue
+                try:
+                    shutil.rmtree(self._builds_dir / key, ignore_errors=True)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            entry = entries.pop(key)
+            total_size -= entry['size']
+            index['stats']['evictions'] += 1
+            print(f"Evicted dependency cache directory of {entry['name']}")
+
+    @contextmanager
+    def __locked_index(self):
+        with open(self.cache_dir / 'index.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self._index_path, 'r', encoding='utf-8') as file:
+                        index = json.load(file)
+                except (FileNotFoundError, ValueError):
+                    index = {}
+                index.setdefault('entries', {})
+                index.setdefault('stats', {
+                    'cold_builds': 0, 'cold_seconds': 0.0, 'warm_builds': 0, 'warm_seconds': 0.0, 'evictions': 0
+                })
+
+                yield index
+
+                DependencyCache.__write_json(self._index_path, index)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def __key(file_path: str, doc_type: str, target_name: str, scheme_name: Optional[str], platform: Optional[str]) -> str:
+        file_path = os.path.abspath(file_path)
+        hasher = hashlib.sha256()
+        hasher.update(f'{file_path}|{doc_type}|{target_name}|{scheme_name or ""}|{platform or ""}'.encode('utf-8'))
+
+        # Xcode keeps the pins of a project inside its workspace, SwiftPM next to Package.swift.
+        if doc_type == 'xcodeproj':
+            resolved_path = os.path.join(file_path, 'project.xcworkspace', 'xcshareddata', 'swiftpm', 'Package.resolved')
+        else:
+            resolved_path = os.path.join(file_path, 'Package.resolved')
+        try:
+            with open(resolved_path, 'rb') as file:
+                hasher.update(b'\0' + file.read())
+        except FileNotFoundError:
+            pass
+        return hasher.hexdigest()
+
+    @staticmethod
+    def __directory_size(path: Path) -> int:
+        total = 0
+        for directory, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(directory, name)).st_size
+                except FileNotFoundError:
+                    pass
+        return total
+
+    @staticmethod
+    def __write_json(path: Path, contents: dict):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+            json.dump(contents, file)
+        os.replace(temp_path, path)
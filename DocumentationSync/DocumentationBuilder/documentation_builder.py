@@ -1,8 +1,44 @@
 # documentation_builder.py
 import os
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from .archive_store import ArchiveStore
+from .build_cache import BuildCache
+from .build_process import BuildCancellation, BuildProcess
+from .dependency_cache import DependencyCache
+from instrumentation import Instrumentation
+
+
+class BuildTarget(NamedTuple):
+    """
+    A single build of `DocumentationBuilder.build_documentation_archives`: a target, for a platform.
+    """
+    target_name: str
+    platform: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return f'{self.target_name}-{self.platform}' if self.platform else self.target_name
+
+
+class _BuildOptions(NamedTuple):
+    # Where a build writes its output, how it finds its already resolved package dependencies,
+    # and how its subprocesses are supervised. A build without an output directory uses the docs directory,
+    # xcodebuild keeps its derived data in the output directory unless given another one.
+    output_dir: Optional[str] = None
+    scratch_path: Optional[str] = None
+    packages_dir: Optional[str] = None
+    dependencies_resolved: bool = False
+    timeout_seconds: Optional[float] = None
+    output_label: Optional[str] = None
+    derived_data_dir: Optional[str] = None
+    package_cache_dir: Optional[str] = None
+    dependency_cache: Optional[DependencyCache] = None
+    archive_store: Optional[ArchiveStore] = None
+    cancellation: Optional[BuildCancellation] = None
 
 
 class DocumentationBuilder:
@@ -11,17 +47,43 @@ class DocumentationBuilder:
 
     The class includes the following method:
 
-    - build_documentation_archive(repo_path: str, doc_type: str, target_name: str, scheme_name: Optional[str]) -> Optional[str]: 
+    - build_documentation_archive(repo_path: str, doc_type: str, target_name: str, scheme_name: Optional[str], build_cache: Optional[BuildCache]) -> Optional[str]: 
     Determines the build route to use based on the documentation type and builds the documentation archive.
     Supports Package.swift, .xcodeproj, or .xcframework.
+    When a build cache is given, unchanged targets return their cached archive without building.
+    Builds are recorded as "build" spans, with the CPU time of the build subprocess and the archive size,
+    and their phases, parsed from the build output, as "build_phase" spans.
+    Build subprocesses run as a `BuildProcess`, killed with everything they started when they time out.
+    When a dependency cache is given, packages and xcodeproj builds keep their SwiftPM scratch path or derived
+    data in it, so dependencies are resolved and compiled once, and reused by later builds.
+    When an archive store is given, every archive is stored in it as the latest version of its target, and
+    the built archive is replaced by hard links to the deduplicated files of the store, in the docs directory.
+
+    - build_documentation_archives(file_path: str, doc_type: str, target_names: List[str], platforms: Optional[List[str]], scheme_name: Optional[str], build_cache: Optional[BuildCache], max_parallel_builds: Optional[int]) -> Dict[BuildTarget, Optional[str]]:
+    Builds several targets for several platforms concurrently, each build isolated in its own directories,
+    after resolving the package dependencies once for all of them.
+
+    - build_documentation_archives_as_completed(file_path: str, doc_type: str, target_names: List[str], platforms: Optional[List[str]], scheme_name: Optional[str], build_cache: Optional[BuildCache], max_parallel_builds: Optional[int]) -> Iterator[Tuple[BuildTarget, Optional[str]]]:
+    Builds like `build_documentation_archives`, but yields every build as soon as it finished, so its archive
+    can be zipped and uploaded while the other builds are still running.
     """
 
+    # The platforms of the `generic/platform=` build destinations of xcodebuild, e.g. "iOS", "macOS" or "watchOS".
+    PLATFORMS = ("iOS", "iOS Simulator", "macOS", "tvOS", "watchOS", "visionOS")
+    # The wall-clock time a single build subprocess may take, so a hung build can not block a sync forever.
+    DEFAULT_BUILD_TIMEOUT_SECONDS = 60 * 60
+
     @staticmethod
     def build_documentation_archive(
         file_path: str,
         doc_type: str,
         target_name: str,
-        scheme_name: Optional[str] = None
+        scheme_name: Optional[str] = None,
+        build_cache: Optional[BuildCache] = None,
+        platform: Optional[str] = None,
+        timeout_seconds: Optional[float] = DEFAULT_BUILD_TIMEOUT_SECONDS,
+        dependency_cache: Optional[DependencyCache] = None,
+        archive_store: Optional[ArchiveStore] = None
     ) -> Optional[str]:
         """
         Builds the documentation archive based on the documentation type.
@@ -34,20 +96,312 @@ class DocumentationBuilder:
             doc_type (str): The type of documentation to build, either "Package", "xcodeproj", or "xcframework".
             target_name (str): The name of the target to build documentation for.
             scheme_name (Optional[str]): The name of the scheme to build during documentation creation. Required for .xcodeproj type.
+            build_cache (Optional[BuildCache]): A cache of previously built archives. If none of the build inputs changed,
+                the cached archive is returned without building. Freshly built archives are added to the cache.
+            platform (Optional[str]): The platform to build for, one of `PLATFORMS`. Packages are built for the host
+                by default, Xcode projects and XCFrameworks for the default destination of their scheme.
+            timeout_seconds (Optional[float]): The wall-clock time after which a build subprocess is killed, together
+                with every process it started, and the build fails. None never times out.
+            dependency_cache (Optional[DependencyCache]): A cache of package dependencies and build state shared by
+                every library. Packages and Xcode projects are built in its warm build directories, and the built
+                archive is moved to the docs directory.
+            archive_store (Optional[ArchiveStore]): A content-addressed store of archive versions. The built archive
+                is stored as the latest version of the target, and materialized in the docs directory as hard links
+                to the files of the store.
 
         Returns:
             Optional[str]: The .doccarchive file path, or None if an error occurred.
         """
+        return DocumentationBuilder.__build_cached(
+            file_path,
+            doc_type,
+            target_name,
+            scheme_name,
+            build_cache,
+            platform,
+            _BuildOptions(timeout_seconds=timeout_seconds, dependency_cache=dependency_cache, archive_store=archive_store)
+        )
+
+    @staticmethod
+    def build_documentation_archives(
+        file_path: str,
+        doc_type: str,
+        target_names: List[str],
+        platforms: Optional[List[str]] = None,
+        scheme_name: Optional[str] = None,
+        build_cache: Optional[BuildCache] = None,
+        max_parallel_builds: Optional[int] = None,
+        timeout_seconds: Optional[float] = DEFAULT_BUILD_TIMEOUT_SECONDS,
+        dependency_cache: Optional[DependencyCache] = None,
+        archive_store: Optional[ArchiveStore] = None
+    ) -> Dict[BuildTarget, Optional[str]]:
+        """
+        Builds the documentation archives of several targets, for several platforms, concurrently.
+
+        Every target is built once per platform, each build in its own subprocess and with its own output,
+        derived data and SwiftPM scratch directories under `docs/<target>-<platform>`, so concurrent builds
+        never contend for a build directory. The package dependencies are resolved once up front, and every
+        build uses the resolved versions instead of resolving them again.
+
+        The output of concurrent builds is not printed line by line, only the phase each build is in, e.g.
+        "[MyLibrary-iOS] Build phase: compile", and the last lines of output of a build that failed.
+        Interrupting the builds kills all of their subprocesses.
+
+        Args:
+            file_path (str): The specific file path of the Swift package, Xcode project, or XCFramework.
+            doc_type (str): The type of documentation to build, either "Package", "xcodeproj", or "xcframework".
+            target_names (List[str]): The names of the targets to build documentation for.
+            platforms (Optional[List[str]]): The platforms to build every target for, from `PLATFORMS`.
+                Defaults to a single build per target, for the default platform.
+            scheme_name (Optional[str]): The scheme to build every target with. Xcode projects default to a scheme
+                named like each target.
+            build_cache (Optional[BuildCache]): A cache of previously built archives, shared by all builds.
+            max_parallel_builds (Optional[int]): The maximum number of builds running at the same time. Defaults to
+                half the available cores, as every build is multi-threaded itself.
+            timeout_seconds (Optional[float]): The wall-clock time after which a build subprocess is killed, and
+                its build fails. None never times out.
+            dependency_cache (Optional[DependencyCache]): A cache of package dependencies and build state, shared by
+                all builds. Every build gets its own build directory in it.
+            archive_store (Optional[ArchiveStore]): A content-addressed store of archive versions, shared by all
+                builds. Every archive is stored as a version of its target and platform.
+
+        Returns:
+            Dict[BuildTarget, Optional[str]]: The .doccarchive file path of every build, or None for failed builds.
+        """
+        builds = [BuildTarget(target_name, platform) for target_name in target_names for platform in platforms or [None]]
+        archive_paths = dict(DocumentationBuilder.build_documentation_archives_as_completed(
+            file_path,
+            doc_type,
+            target_names,
+            platforms,
+            scheme_name,
+            build_cache,
+            max_parallel_builds,
+            timeout_seconds,
+            dependency_cache,
+            archive_store
+        ))
+        return {build_target: archive_paths[build_target] for build_target in builds}
+
+    @staticmethod
+    def build_documentation_archives_as_completed(
+        file_path: str,
+        doc_type: str,
+        target_names: List[str],
+        platforms: Optional[List[str]] = None,
+        scheme_name: Optional[str] = None,
+        build_cache: Optional[BuildCache] = None,
+        max_parallel_builds: Optional[int] = None,
+        timeout_seconds: Optional[float] = DEFAULT_BUILD_TIMEOUT_SECONDS,
+        dependency_cache: Optional[DependencyCache] = None,
+        archive_store: Optional[ArchiveStore] = None
+    ) -> Iterator[Tuple[BuildTarget, Optional[str]]]:
+        """
+        Builds the documentation archives of several targets, for several platforms, concurrently, and yields
+        every build as soon as it finished, in the order the builds finish.
+
+        The builds run like the ones of `build_documentation_archives`, which takes the same arguments. Closing
+        the generator before it is exhausted kills its running builds, and only those.
+
+        Returns:
+            Iterator[Tuple[BuildTarget, Optional[str]]]: Every build with its .doccarchive file path, or None if
+                the build failed.
+        """
+        builds = [BuildTarget(target_name, platform) for target_name in target_names for platform in platforms or [None]]
+        docs_dir = DocumentationBuilder.__create_docs_directory(file_path)
+        packages_dir, dependencies_resolved = DocumentationBuilder.__resolve_dependencies(
+            file_path,
+            doc_type,
+            bool(platforms),
+            scheme_name or target_names[0],
+            docs_dir,
+            timeout_seconds,
+            str(dependency_cache.package_cache_dir) if dependency_cache else None
+        )
+
+        # Only the builds of this call are killed when it is left early, other builds in the process keep running.
+        cancellation = BuildCancellation()
+
+        def build(build_target: BuildTarget) -> Optional[str]:
+            options = _BuildOptions(
+                output_dir=os.path.join(docs_dir, build_target.name),
+                scratch_path=os.path.join(docs_dir, '.scratch', build_target.name),
+                packages_dir=packages_dir,
+                dependencies_resolved=dependencies_resolved,
+                timeout_seconds=timeout_seconds,
+                output_label=build_target.name,
+                dependency_cache=dependency_cache,
+                archive_store=archive_store,
+                cancellation=cancellation
+            )
+            os.makedirs(options.output_dir, exist_ok=True)
+            try:
+                return DocumentationBuilder.__build_cached(
+                    file_path,
+                    doc_type,
+                    build_target.target_name,
+                    scheme_name or (build_target.target_name if doc_type == "xcodeproj" else None),
+                    build_cache,
+                    build_target.platform,
+                    options
+                )
+            except Exception as e:
+                # One failing build never stops the others.
+                print(f"Error building documentation for {build_target.name}: {e}")
+                return None
+
+        max_workers = max_parallel_builds or max(1, min(len(builds), (os.cpu_count() or 2) // 2))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='docc-build') as pool:
+            try:
+                futures = {pool.submit(build, build_target): build_target for build_target in builds}
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            except BaseException:
+                # Leaving the pool waits for the running builds, which an interrupt, or a consumer that
+                # stopped early, must not.
+                cancellation.cancel()
+                raise
+
+    @staticmethod
+    def __build_cached(
+        file_path: str,
+        doc_type: str,
+        target_name: str,
+        scheme_name: Optional[str],
+        build_cache: Optional[BuildCache],
+        platform: Optional[str],
+        options: _BuildOptions
+    ) -> Optional[str]:
+        library = BuildTarget(target_name, platform).name
+        if build_cache is None:
+            docc_archive_path = DocumentationBuilder.__build_documentation_archive(
+                file_path,
+                doc_type,
+                target_name,
+                scheme_name,
+                platform,
+                options
+            )
+            return DocumentationBuilder.__store_archive(file_path, docc_archive_path, library, None, options)
+
+        with Instrumentation.span('build_cache_lookup', doc_type=doc_type) as span:
+            cache_key = build_cache.fingerprint(file_path, doc_type, target_name, scheme_name, platform)
+            cached_archive_path = build_cache.lookup(cache_key)
+            span.label(result='hit' if cached_archive_path else 'miss')
+            span.annotate(target=target_name)
+        if cached_archive_path:
+            if options.archive_store is not None:
+                # Known by its cache key, so it becomes the latest version without being hashed again.
+                options.archive_store.put(library, str(cached_archive_path), source_key=cache_key)
+            return cached_archive_path
+
+        docc_archive_path = DocumentationBuilder.__build_documentation_archive(
+            file_path,
+            doc_type,
+            target_name,
+            scheme_name,
+            platform,
+            options
+        )
+        if docc_archive_path is None:
+            return None
+        docc_archive_path = DocumentationBuilder.__store_archive(file_path, docc_archive_path, library, cache_key, options)
+        with Instrumentation.span('build_cache_store', doc_type=doc_type):
+            return build_cache.store(cache_key, docc_archive_path)
+
+    @staticmethod
+    def __store_archive(
+        file_path: str,
+        docc_archive_path: Optional[str],
+        library: str,
+        cache_key: Optional[str],
+        options: _BuildOptions
+    ) -> Optional[str]:
+        if docc_archive_path is None or options.archive_store is None:
+            return docc_archive_path
+
+        with Instrumentation.span('archive_store') as span:
+            span.annotate(library=library)
+            manifest = options.archive_store.put(library, str(docc_archive_path), source_key=cache_key)
+            # The build tree is replaced by links to the store, so its files take no space of their own. The
+            # build tools never write into the docs directory copy, only ever replace their own output.
+            output_dir = options.output_dir or DocumentationBuilder.__create_docs_directory(file_path)
+            materialized_path = options.archive_store.materialize(library, output_dir, manifest.version)
+            if Path(docc_archive_path).resolve() != materialized_path.resolve():
+                shutil.rmtree(docc_archive_path, ignore_errors=True)
+            span.measure(archive_bytes=manifest.size, files=len(manifest.files))
+        return materialized_path
+
+    @staticmethod
+    def __build_documentation_archive(
+        file_path: str,
+        doc_type: str,
+        target_name: str,
+        scheme_name: Optional[str],
+        platform: Optional[str],
+        options: _BuildOptions
+    ) -> Optional[str]:
+        # Create output directory, a single build shares the docs directory of the repository
+        if options.output_dir is None:
+            options = options._replace(output_dir=DocumentationBuilder.__create_docs_directory(file_path))
+
+        with Instrumentation.span('build', doc_type=doc_type) as span:
+            span.annotate(target=target_name, platform=platform)
+            children_cpu_seconds = Instrumentation.children_cpu_seconds()
+            if options.dependency_cache is not None and doc_type in ("Package", "xcodeproj"):
+                with options.dependency_cache.lease(file_path, doc_type, target_name, scheme_name, platform) as lease:
+                    span.label(dependency_cache='warm' if lease.warm else 'cold')
+                    docc_archive_path = DocumentationBuilder.__dispatch_build(
+                        file_path,
+                        doc_type,
+                        target_name,
+                        scheme_name,
+                        platform,
+                        options._replace(
+                            scratch_path=lease.build_dir,
+                            derived_data_dir=lease.build_dir,
+                            package_cache_dir=lease.package_cache_dir
+                        )
+                    )
+                    if docc_archive_path:
+                        lease.succeeded = True
+                        # The build directory may be evicted once the lease ends, the archive must outlive it.
+                        docc_archive_path = DocumentationBuilder.__move_archive(docc_archive_path, options.output_dir)
+            else:
+                docc_archive_path = DocumentationBuilder.__dispatch_build(
+                    file_path,
+                    doc_type,
+                    target_name,
+                    scheme_name,
+                    platform,
+                    options
+                )
+            span.measure(subprocess_cpu_seconds=Instrumentation.children_cpu_seconds() - children_cpu_seconds)
+            span.label(outcome='ok' if docc_archive_path else 'failed')
+            if docc_archive_path:
+                span.measure(archive_bytes=DocumentationBuilder.__directory_size(docc_archive_path))
+        return docc_archive_path
 
-        # Create output directory
-        output_dir = DocumentationBuilder.__create_docs_directory(file_path)
+    @staticmethod
+    def __dispatch_build(
+        file_path: str,
+        doc_type: str,
+        target_name: str,
+        scheme_name: Optional[str],
+        platform: Optional[str],
+        options: _BuildOptions
+    ) -> Optional[str]:
+        if platform is not None and platform not in DocumentationBuilder.PLATFORMS:
+            print(f"Error: Invalid platform {platform}. Supported platforms are: {', '.join(DocumentationBuilder.PLATFORMS)}")
+            return None
 
         # Build documentation based on doc_type
         if doc_type == "Package":
             return DocumentationBuilder.__build_package_documentation_archive(
                 file_path,
                 target_name,
-                output_dir
+                options,
+                platform
             )
         elif doc_type == "xcodeproj":
             if scheme_name:
@@ -55,7 +409,8 @@ class DocumentationBuilder:
                     file_path,
                     target_name,
                     scheme_name,
-                    output_dir
+                    options,
+                    platform
                 )
             else:
                 print("Error: scheme_name is required for xcodeproj documentation type.")
@@ -64,7 +419,8 @@ class DocumentationBuilder:
             return DocumentationBuilder.__build_xcframework_documentation_archive(
                 file_path,
                 target_name,
-                output_dir
+                options,
+                platform
             )
         else:
             supported_doc_types = ["Package", "xcodeproj", "xcframework"]
@@ -72,34 +428,148 @@ class DocumentationBuilder:
                 f"Error: Invalid documentation type specified. Supported types are: {', '.join(supported_doc_types)}")
             return None
 
+    @staticmethod
+    def __directory_size(path) -> int:
+        total = 0
+        for directory, _, files in os.walk(path):
+            for name in files:
+                total += os.lstat(os.path.join(directory, name)).st_size
+        return total
+
+    @staticmethod
+    def __move_archive(docc_archive_path, output_dir: str) -> Path:
+        destination = Path(output_dir) / Path(docc_archive_path).name
+        shutil.rmtree(destination, ignore_errors=True)
+        shutil.move(str(docc_archive_path), str(destination))
+        return destination
+
     @staticmethod
     def __create_docs_directory(base_path: str) -> str:
         output_dir = f'{base_path}/docs'
         os.makedirs(output_dir, exist_ok=True)
         return output_dir
 
+    @staticmethod
+    def __resolve_dependencies(
+        file_path: str,
+        doc_type: str,
+        uses_xcodebuild: bool,
+        scheme_name: str,
+        docs_dir: str,
+        timeout_seconds: Optional[float],
+        package_cache_dir: Optional[str]
+    ) -> tuple:
+        """
+        Resolves the package dependencies once, before the builds of `build_documentation_archives` start.
+
+        Returns:
+            tuple: The shared directory of the cloned packages for xcodebuild, if any, and whether the
+                dependencies were resolved. If resolving fails, every build resolves its dependencies itself.
+        """
+        if doc_type == "xcframework":
+            return None, False
+
+        if doc_type == "Package" and not uses_xcodebuild:
+            # Package.resolved pins the versions, the checkouts come from SwiftPM's shared local cache.
+            packages_dir = None
+            command = ["swift", "package", "resolve"]
+            if package_cache_dir:
+                command[2:2] = ["--cache-path", package_cache_dir]
+            cwd = file_path
+        else:
+            packages_dir = os.path.join(docs_dir, 'SourcePackages')
+            command = ["xcodebuild", "-resolvePackageDependencies", "-scheme", scheme_name,
+                       "-clonedSourcePackagesDirPath", packages_dir]
+            if doc_type == "xcodeproj":
+                command[1:1] = ["-project", file_path]
+            if package_cache_dir:
+                command += ["-packageCachePath", package_cache_dir]
+            cwd = file_path if doc_type == "Package" else None
+
+        with Instrumentation.span('resolve_dependencies', doc_type=doc_type) as span:
+            try:
+                BuildProcess(command, cwd=cwd, timeout_seconds=timeout_seconds, label='resolve', echo=False).run()
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+                print(f"Warning: could not resolve the package dependencies up front, every build resolves them: {e}")
+                span.label(outcome='failed')
+                return None, False
+            span.label(outcome='ok')
+        return packages_dir, True
+
+    @staticmethod
+    def __run(command: List[str], options: _BuildOptions, cwd: Optional[str] = None):
+        # Concurrent builds only print their progress, a single build prints all of its output as before.
+        BuildProcess(
+            command,
+            cwd=cwd,
+            timeout_seconds=options.timeout_seconds,
+            label=options.output_label,
+            echo=options.output_label is None,
+            cancellation=options.cancellation
+        ).run()
+
+    @staticmethod
+    def __xcodebuild_options(options: _BuildOptions, platform: Optional[str]) -> List[str]:
+        arguments = ["-derivedDataPath", options.derived_data_dir or options.output_dir]
+        if platform:
+            arguments += ["-destination", f"generic/platform={platform}"]
+        if options.packages_dir:
+            arguments += ["-clonedSourcePackagesDirPath", options.packages_dir]
+        if options.package_cache_dir:
+            arguments += ["-packageCachePath", options.package_cache_dir]
+        if options.dependencies_resolved:
+            arguments += ["-disableAutomaticPackageResolution"]
+        return arguments
+
+    @staticmethod
+    def __find_products_archive(output_dir: str, archive_name: str) -> Optional[Path]:
+        # The products directory depends on the configuration and platform, e.g. Debug-iphoneos or Debug
+        # for macOS, so the archive is looked up in all of them, the most recently built first.
+        candidates = (Path(output_dir) / "Build" / "Products").glob(f"*/{archive_name}.doccarchive")
+        return max(candidates, key=lambda path: path.stat().st_mtime, default=None)
+
     def __build_package_documentation_archive(
         package_file_path: str,
         package_name: str,
-        output_dir: str
+        options: _BuildOptions,
+        platform: Optional[str] = None
     ) -> Optional[str]:
         """
 
         Args:
             package_file_path (str): The file path of the Swift package.
             package_name (str): The name of the package to build documentation for.
-            output_dir (str): The output directory to store the archive.
+            options (_BuildOptions): The output directory to store the archive, the scratch path and the timeout of the build.
+            platform (Optional[str]): The platform to build for, or None to build for the host.
 
         Returns:
             Optional[str]: The .doccarchive file path, or None if an error occurred.
         """
 
+        if platform:
+            # The DocC plugin of SwiftPM only builds for the host, other platforms are built by xcodebuild.
+            return DocumentationBuilder.__build_scheme_documentation_archive(
+                ["-scheme", package_name],
+                package_name,
+                options,
+                platform,
+                cwd=package_file_path
+            )
+
+        output_dir = options.output_dir
+        scratch_options = ["--scratch-path", options.scratch_path] if options.scratch_path else []
+        if options.package_cache_dir:
+            scratch_options += ["--cache-path", options.package_cache_dir]
+        if options.dependencies_resolved:
+            scratch_options.append("--disable-automatic-resolution")
+
         try:
             # Execute the swift package command with the given arguments
-            subprocess.run(
+            DocumentationBuilder.__run(
                 [
                     "swift",
                     "package",
+                    *scratch_options,
                     "--allow-writing-to-directory",
                     output_dir,
                     "generate-documentation",
@@ -112,17 +582,16 @@ class DocumentationBuilder:
                     "--hosting-base-path",
                     package_name
                 ],
-                check=True,
+                options,
                 cwd=package_file_path
             )
 
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
             print(f"Error building documentation: {e}")
             return None
 
         docc_archive_path = (
-            Path(package_file_path)
-            / ".build"
+            Path(options.scratch_path or Path(package_file_path) / ".build")
             / "plugins"
             / "Swift-DocC"
             / "outputs"
@@ -140,7 +609,8 @@ class DocumentationBuilder:
         xcodeproj_file_path: str,
         project_name: str,
         scheme_name: str,
-        output_dir: str
+        options: _BuildOptions,
+        platform: Optional[str] = None
     ) -> Optional[str]:
         """
         Builds an Xcode project documentation archive using the xcodebuild command.
@@ -149,7 +619,35 @@ class DocumentationBuilder:
             xcodeproj_file_path (str): The file path of the Xcode project.
             project_name (str): The name of the project. Will be used to find the project_name.doccarchive
             scheme_name: (str): The name of the scheme to build documentation for.
-            output_dir (str): The output directory to store the archive.
+            options (_BuildOptions): The derived data directory to store the archive in, and how to run xcodebuild.
+            platform (Optional[str]): The platform to build for, or None for the default destination of the scheme.
+
+        Returns:
+            Optional[str]: The .doccarchive file path, or None if an error occurred.
+        """
+        return DocumentationBuilder.__build_scheme_documentation_archive(
+            ["-project", xcodeproj_file_path, "-scheme", scheme_name],
+            project_name,
+            options,
+            platform
+        )
+
+    def __build_scheme_documentation_archive(
+        scheme_options: List[str],
+        archive_name: str,
+        options: _BuildOptions,
+        platform: Optional[str],
+        cwd: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Builds the documentation of a scheme using the xcodebuild docbuild action.
+
+        Args:
+            scheme_options (List[str]): The xcodebuild options selecting the project and scheme to build.
+            archive_name (str): The name of the .doccarchive to find once the build finished.
+            options (_BuildOptions): The derived data directory to store the archive in, and how to run xcodebuild.
+            platform (Optional[str]): The platform to build for, or None for the default destination of the scheme.
+            cwd (Optional[str]): The directory to run xcodebuild in, the package directory for Swift packages.
 
         Returns:
             Optional[str]: The .doccarchive file path, or None if an error occurred.
@@ -157,35 +655,27 @@ class DocumentationBuilder:
 
         # Execute the xcodebuild command with the docbuild action and output path
         try:
-            subprocess.run(
+            DocumentationBuilder.__run(
                 [
                     "xcodebuild",
-                    "-project",
-                    xcodeproj_file_path,
-                    "-scheme",
-                    scheme_name,
+                    *scheme_options,
                     "docbuild",
-                    "-derivedDataPath",
-                    output_dir
+                    *DocumentationBuilder.__xcodebuild_options(options, platform)
                 ],
-                check=True,
+                options,
+                cwd=cwd
             )
 
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
             print(f"Error building documentation: {e}")
             return None
 
-        # Define the path to the .doccarchive file
-        docc_archive_path = (
-            Path(output_dir)
-            / "Build"
-            / "Products"
-            / f'{scheme_name}-iphoneos'
-            / f"{project_name}.doccarchive"
-        )
-
         # Check if the .doccarchive file exists
-        if docc_archive_path.exists():
+        docc_archive_path = DocumentationBuilder.__find_products_archive(
+            options.derived_data_dir or options.output_dir,
+            archive_name
+        )
+        if docc_archive_path:
             print(f"Documentation archive found at: {docc_archive_path}")
         else:
             print("Error: .doccarchive file not found")
@@ -198,7 +688,8 @@ class DocumentationBuilder:
     def __build_xcframework_documentation_archive(
         xcframework_file_path: str,
         framework_name: str,
-        output_dir: str
+        options: _BuildOptions,
+        platform: Optional[str] = None
     ) -> Optional[str]:
         """
         Builds an .xcframework documentation archive using the Apple-DocC plugin.
@@ -206,27 +697,31 @@ class DocumentationBuilder:
         Args:
             xcframework_file_path (str): The file path of the .xcframework.
             framework_name (str): The name of the framework to build documentation for.
-            output_dir (str): The output directory to store the archive.
+            options (_BuildOptions): The output directory to store the archive, and how to run xcodebuild.
+            platform (Optional[str]): The platform to build for, or None for the default destination.
 
         Returns:
             Optional[str]: The .doccarchive file path, or None if an error occurred.
         """
 
+        output_dir = options.output_dir
+        destination = ["-destination", f"generic/platform={platform}"] if platform else []
         try:
             # Execute the xcodebuild command with the docbuild action and output path
-            subprocess.run(
+            DocumentationBuilder.__run(
                 [
                     "xcodebuild",
                     "docbuild",
                     "-xcframework",
                     xcframework_file_path,
                     "-derivedDataPath",
-                    output_dir
+                    output_dir,
+                    *destination
                 ],
-                check=True,
+                options
             )
 
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
             print(f"Error building documentation: {e}")
             return None
 
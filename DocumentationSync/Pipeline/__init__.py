@@ -0,0 +1,22 @@
+# __init__.py
+"""
+Pipeline
+-----------------
+
+A Python package for running a sync as a small dependency graph of stages connected by bounded queues.
+
+## Installation
+
+```python
+from Pipeline.pipeline import Pipeline, Stage
+```
+
+## Example usage:
+pipeline = Pipeline([
+    Stage("build", build),
+    Stage("package", package, upstream="build"),
+    Stage("upload", upload, upstream="package"),
+])
+results = pipeline.run()
+Pipeline.print_report(results)
+"""
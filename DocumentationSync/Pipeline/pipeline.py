@@ -0,0 +1,204 @@
+# pipeline.py
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from instrumentation import Instrumentation
+
+
+class Stage:
+    """
+    A single stage of a `Pipeline`.
+
+    A stage without an upstream is a source: its function is called once, without arguments.
+    Every other stage calls its function once per item produced by its upstream stage. Functions are
+    generators, every item they yield is passed on to all the stages downstream of this one.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        function: Callable[..., Iterable],
+        upstream: Optional[str] = None,
+        workers: int = 1,
+        queue_size: int = 4
+    ):
+        """
+        :param name: The unique name of the stage.
+        :param function: A generator function, called without arguments for a source and with an upstream item otherwise.
+        :param upstream: The name of the stage this stage consumes items from, or None for a source.
+        :param workers: The number of threads processing items of this stage concurrently.
+        :param queue_size: The maximum number of upstream items waiting for this stage.
+        """
+        self.name = name
+        self.function = function
+        self.upstream = upstream
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class StageResult:
+    """
+    The item counts, errors and timings of a single stage in a pipeline run.
+    """
+
+    def __init__(self, stage: Stage):
+        self.stage = stage
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = []
+        self.busy_seconds = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def succeeded(self) -> bool:
+        return not self.errors
+
+
+class Pipeline:
+    """
+    A class for running dependent steps as overlapping stages instead of one after another.
+
+    Stages form a tree: every stage has at most one upstream stage and any number of downstream stages.
+    Each stage runs on its own threads, and items flow from a stage to its downstream stages through
+    bounded queues, so a stage starts working on an item as soon as it is produced, while a slow stage
+    applies backpressure instead of letting items pile up in memory. Independent branches, such as
+    publishing pages while an archive is being built, run concurrently, and the duration of the run is
+    that of its slowest branch.
+
+    A failing item is recorded in the result of its stage and produces no downstream items, every
+    other item and branch keeps going.
+
+    The class includes the following methods:
+
+    - run() -> Dict[str, StageResult]:
+    Runs every stage to completion and returns a result per stage.
+
+    - print_report(results: Dict[str, StageResult]):
+    Prints a per-stage timing and status report.
+    """
+
+    # Marks the end of the items of a queue.
+    _END = object()
+
+    def __init__(self, stages: List[Stage]):
+        """
+        :param stages: The stages of the pipeline. Upstream stages must be listed before their downstream stages.
+        :raises ValueError: If stage names are not unique, or a stage refers to an unknown or later upstream stage.
+        """
+        self.stages = stages
+        self._downstream = {}
+        for stage in stages:
+            if stage.name in self._downstream:
+                raise ValueError(f'Duplicate pipeline stage: {stage.name}')
+            if stage.upstream is not None and stage.upstream not in self._downstream:
+                raise ValueError(f'Pipeline stage {stage.name} depends on unknown stage {stage.upstream}')
+            self._downstream[stage.name] = []
+            if stage.upstream is not None:
+                self._downstream[stage.upstream].append(stage)
+
+    def run(self) -> Dict[str, StageResult]:
+        """
+        Runs every stage to completion.
+
+        :return: The result of every stage, by stage name.
+        """
+        results = {stage.name: StageResult(stage) for stage in self.stages}
+        queues = {
+            stage.name: queue.Queue(maxsize=stage.queue_size)
+            for stage in self.stages
+            if stage.upstream is not None
+        }
+
+        threads = []
+        for stage in self.stages:
+            workers = 1 if stage.upstream is None else max(1, stage.workers)
+            remaining = [workers]
+            for index in range(workers):
+                threads.append(threading.Thread(
+                    target=self.__work,
+                    args=(stage, results[stage.name], queues, remaining),
+                    name=f'pipeline-{stage.name}-{index}',
+                    daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    @staticmethod
+    def print_report(results: Dict[str, StageResult]):
+        """
+        Prints a per-stage timing and status report.
+
+        :param results: The results returned by `run`.
+        """
+        run_started_at = min((result.started_at for result in results.values() if result.started_at), default=0.0)
+        print(f'{"Stage":<20} {"Status":<8} {"In":>5} {"Out":>5} {"Start":>9} {"End":>9} {"Busy":>9}')
+        for name, result in results.items():
+            status = 'ok' if result.succeeded else 'FAILED'
+            started = (result.started_at or run_started_at) - run_started_at
+            finished = (result.finished_at or run_started_at) - run_started_at
+            print(
+                f'{name:<20} {status:<8} {result.items_in:>5} {result.items_out:>5} '
+                f'{started:>8.1f}s {finished:>8.1f}s {result.busy_seconds:>8.1f}s')
+            for error in result.errors:
+                print(f'    {error}')
+
+    def __work(self, stage: Stage, result: StageResult, queues: dict, remaining: List[int]):
+        downstream_queues = [queues[downstream.name] for downstream in self._downstream[stage.name]]
+        try:
+            if stage.upstream is None:
+                self.__process(stage, result, downstream_queues, ())
+            else:
+                input_queue = queues[stage.name]
+                while True:
+                    item = input_queue.get()
+                    if item is Pipeline._END:
+                        # Pass the marker on, so every other worker of this stage stops too.
+                        input_queue.put(item)
+                        break
+                    with result._lock:
+                        result.items_in += 1
+                    self.__process(stage, result, downstream_queues, (item,))
+        finally:
+            with result._lock:
+                remaining[0] -= 1
+                last_worker = remaining[0] == 0
+                if last_worker:
+                    result.finished_at = time.monotonic()
+            # Downstream stages end once the last worker of this stage is done.
+            if last_worker:
+                for downstream_queue in downstream_queues:
+                    downstream_queue.put(Pipeline._END)
+
+    @staticmethod
+    def __process(stage: Stage, result: StageResult, downstream_queues: list, arguments: tuple):
+        start = time.monotonic()
+        blocked_seconds = 0.0
+        with result._lock:
+            if result.started_at is None:
+                result.started_at = start
+        try:
+            with Instrumentation.span('pipeline_stage', stage=stage.name) as span:
+                for output in stage.function(*arguments):
+                    with result._lock:
+                        result.items_out += 1
+                    # Time spent blocked on a full downstream queue is not work of this stage.
+                    blocked_since = time.monotonic()
+                    for downstream_queue in downstream_queues:
+                        downstream_queue.put(output)
+                    blocked_seconds += time.monotonic() - blocked_since
+                span.measure(blocked_seconds=blocked_seconds)
+        except Exception as e:
+            print(f'Pipeline stage {stage.name} failed: {e!r}')
+            with result._lock:
+                result.errors.append(f'{stage.name}: {e!r}')
+        finally:
+            with result._lock:
+                result.busy_seconds += time.monotonic() - start - blocked_seconds
@@ -0,0 +1,23 @@
+# __init__.py
+"""
+RepositoryIndex
+-----------------
+
+A Python package for discovering the libraries checked out under a root directory, with their
+README, CHANGELOG and build definition.
+
+## Installation
+
+```python
+from RepositoryIndex.repository_index import LibraryRecord, RepositoryIndex
+```
+
+## Example usage:
+index = RepositoryIndex("/path/to/checkouts", cache_path="/path/to/index.json")
+libraries = index.scan()
+index.print_report()
+
+library = RepositoryIndex.inspect("/path/to/repo")
+if library.missing:
+    print(f"Not found: {', '.join(library.missing)}")
+"""
@@ -0,0 +1,271 @@
+# repository_index.py
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from instrumentation import Instrumentation
+
+
+class LibraryRecord(NamedTuple):
+    """
+    A library found by `RepositoryIndex`, with the files needed to build and publish its documentation.
+
+    Files that were not found are None, and listed by `missing`.
+    """
+    path: str
+    doc_type: Optional[str]
+    build_path: Optional[str]
+    target_name: str
+    scheme_name: Optional[str]
+    readme_file: Optional[str]
+    changelog_file: Optional[str]
+
+    @property
+    def missing_pages(self) -> List[str]:
+        """
+        The README and CHANGELOG files that were not found.
+        """
+        missing = []
+        if self.readme_file is None:
+            missing.append('README.md')
+        if self.changelog_file is None:
+            missing.append('CHANGELOG.md')
+        return missing
+
+    @property
+    def missing(self) -> List[str]:
+        """
+        Everything that was not found, including the build definition.
+        """
+        if self.doc_type is None:
+            return ['Package.swift, .xcodeproj or .xcframework'] + self.missing_pages
+        return self.missing_pages
+
+
+class RepositoryIndex:
+    """
+    An index of the libraries checked out under a root directory.
+
+    The root is walked once with `os.scandir`, skipping build output and VCS directories. Every directory
+    holding a `Package.swift`, an `.xcodeproj` or an `.xcframework` is a library, its `doc_type` is inferred
+    from that build definition, and its README and CHANGELOG are looked up next to it. The walk does not
+    descend into libraries, so their sources are never listed.
+
+    The listing of every visited directory is kept in a JSON cache, keyed by the directory's mtime. Adding,
+    removing or renaming an entry changes the mtime of its directory, so later scans only list the directories
+    that changed, and only stat the rest.
+
+    Libraries without a README or CHANGELOG are still returned, with the files they lack in `missing`, so
+    one incomplete checkout does not stop the others from being synced.
+
+    The class includes the following methods:
+
+    - scan() -> List[LibraryRecord]:
+    Walks the root, reusing the cached listings of unchanged directories, and returns every library found.
+
+    - inspect(repo_path: str) -> LibraryRecord:
+    Describes a single library directory, without walking or caching anything.
+
+    - print_report():
+    Prints the libraries found by the last scan, and what each of them is missing.
+    """
+
+    PRUNED_DIRECTORIES = frozenset({'.build', '.git', '.swiftpm', 'docs', 'DerivedData', 'Pods', 'Carthage'})
+    # Bundles are directories, but are never libraries themselves.
+    BUNDLE_SUFFIXES = ('.xcodeproj', '.xcworkspace', '.xcframework', '.doccarchive', '.docc')
+    # Directories changed less than this long before a scan may change again without a new mtime
+    # on filesystems with a coarse timestamp resolution, so their listing is not trusted next time.
+    RACY_WINDOW_NS = 2 * 1000 ** 3
+
+    def __init__(self, root: str, cache_path: Optional[str] = None):
+        """
+        :param root: The directory the libraries are checked out under.
+        :param cache_path: The JSON file to keep directory listings in between scans, or None to always list every directory.
+        """
+        self.root = os.path.abspath(root)
+        self.cache_path = os.path.expanduser(cache_path) if cache_path else None
+        self.libraries: List[LibraryRecord] = []
+        self.directories_listed = 0
+        self.directories_reused = 0
+        self._listings = self.__load_cache()
+
+    def scan(self) -> List[LibraryRecord]:
+        """
+        Walks the root and returns every library found, sorted by path.
+        Unreadable directories are skipped with a warning.
+
+        :return: The libraries under the root.
+        """
+        scan_started_ns = time.time_ns()
+        listings = {}
+        libraries = []
+        self.directories_listed = 0
+        self.directories_reused = 0
+
+        with Instrumentation.span('discovery') as span:
+            pending = ['']
+            while pending:
+                relative_directory = pending.pop()
+                directory = os.path.join(self.root, relative_directory) if relative_directory else self.root
+                try:
+                    listing = self.__listing(directory, relative_directory, scan_started_ns)
+                except OSError as e:
+                    print(f'Warning: could not list {directory}: {e}')
+                    continue
+                listings[relative_directory] = listing
+
+                library = RepositoryIndex.__describe(directory, listing['files'], listing['directories'])
+                if library.doc_type is not None:
+                    libraries.append(library)
+                    continue
+
+                pending.extend(
+                    os.path.join(relative_directory, name)
+                    for name in listing['directories']
+                    if name not in RepositoryIndex.PRUNED_DIRECTORIES and not name.endswith(RepositoryIndex.BUNDLE_SUFFIXES)
+                )
+
+            span.measure(
+                directories_listed=self.directories_listed,
+                directories_reused=self.directories_reused,
+                libraries=len(libraries)
+            )
+
+        # Directories that were removed, or are no longer reached, drop out of the cache.
+        self._listings = listings
+        self.libraries = sorted(libraries, key=lambda library: library.path)
+        self.__store_cache()
+        return self.libraries
+
+    @staticmethod
+    def inspect(repo_path: str) -> LibraryRecord:
+        """
+        Describes a single library directory, without walking or caching anything.
+
+        If `repo_path` is an .xcodeproj or .xcframework, it is the build path of the library, and the README
+        and CHANGELOG are looked up in the directory containing it. A path that does not exist is returned
+        as a library missing everything.
+
+        :param repo_path: The path to the library directory, or to its .xcodeproj or .xcframework.
+        :return: The library at that path.
+        """
+        path = os.path.abspath(repo_path)
+        bundle_name = None
+        if path.endswith(('.xcodeproj', '.xcframework')):
+            path, bundle_name = os.path.split(path.rstrip(os.sep))
+
+        try:
+            files, directories = RepositoryIndex.__list(path)
+        except (FileNotFoundError, NotADirectoryError):
+            files, directories = [], []
+
+        library = RepositoryIndex.__describe(path, files, directories)
+        if bundle_name:
+            target_name = os.path.splitext(bundle_name)[0]
+            library = library._replace(
+                doc_type=os.path.splitext(bundle_name)[1][1:],
+                build_path=os.path.join(path, bundle_name),
+                target_name=target_name,
+                scheme_name=target_name if bundle_name.endswith('.xcodeproj') else None
+            )
+        return library
+
+    def print_report(self):
+        """
+        Prints the libraries found by the last scan, and what each of them is missing.
+        """
+        print(f'{"Library":<32} {"Type":<12} Missing')
+        for library in self.libraries:
+            print(f'{library.target_name:<32} {library.doc_type:<12} {", ".join(library.missing) or "-"}')
+
+        incomplete = sum(1 for library in self.libraries if library.missing)
+        print(
+            f'Found {len(self.libraries)} libraries under {self.root}, {incomplete} incomplete. '
+            f'Listed {self.directories_listed} directories, reused {self.directories_reused} from the cache.')
+
+    def __listing(self, directory: str, relative_directory: str, scan_started_ns: int) -> dict:
+        mtime_ns = os.stat(directory).st_mtime_ns
+        cached = self._listings.get(relative_directory)
+        if cached and cached['mtime_ns'] == mtime_ns:
+            self.directories_reused += 1
+            return cached
+
+        files, directories = RepositoryIndex.__list(directory)
+        self.directories_listed += 1
+        return {
+            'mtime_ns': mtime_ns if mtime_ns < scan_started_ns - RepositoryIndex.RACY_WINDOW_NS else None,
+            'files': files,
+            'directories': directories
+        }
+
+    @staticmethod
+    def __list(directory: str) -> Tuple[List[str], List[str]]:
+        files = []
+        directories = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # Symlinked directories are not followed, so links can not make the walk loop.
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.name)
+                else:
+                    files.append(entry.name)
+        return sorted(files), sorted(directories)
+
+    @staticmethod
+    def __describe(directory: str, files: List[str], directories: List[str]) -> LibraryRecord:
+        pages = {name.lower(): os.path.join(directory, name) for name in files}
+        name = os.path.basename(directory.rstrip(os.sep))
+        doc_type = None
+        build_path = None
+        target_name = name
+        scheme_name = None
+
+        # A Package.swift takes precedence, an .xcodeproj next to it is usually just an example app.
+        if 'Package.swift' in files:
+            doc_type = 'Package'
+            build_path = directory
+        else:
+            for suffix in ('.xcodeproj', '.xcframework'):
+                bundles = [bundle for bundle in directories if bundle.endswith(suffix)]
+                if bundles:
+                    # With several bundles, prefer the one named like its directory.
+                    bundle = name + suffix if name + suffix in bundles else bundles[0]
+                    doc_type = suffix[1:]
+                    build_path = os.path.join(directory, bundle)
+                    target_name = bundle[:-len(suffix)]
+                    scheme_name = target_name if suffix == '.xcodeproj' else None
+                    break
+
+        return LibraryRecord(
+            path=directory,
+            doc_type=doc_type,
+            build_path=build_path,
+            target_name=target_name,
+            scheme_name=scheme_name,
+            readme_file=pages.get('readme.md'),
+            changelog_file=pages.get('changelog.md')
+        )
+
+    def __load_cache(self) -> Dict[str, dict]:
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as file:
+                cache = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+        # A cache of another root is of no use, it is replaced by the next scan.
+        if cache.get('root') != self.root:
+            return {}
+        return cache.get('directories', {})
+
+    def __store_cache(self):
+        if not self.cache_path:
+            return
+        cache_dir = os.path.dirname(os.path.abspath(self.cache_path))
+        os.makedirs(cache_dir, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+            json.dump({'root': self.root, 'directories': self._listings}, file)
+        os.replace(temp_path, self.cache_path)
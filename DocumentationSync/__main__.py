@@ -1,70 +1,461 @@
 # main.py
+import contextlib
+import os
+import signal
 import sys
-from utility import Utility
+from instrumentation import Instrumentation
 from ConfluenceUploader.config import Config
-from ConfluenceUploader.confluence_uploader import ConfluenceUploader
-from DocumentationBuilder.documentation_builder import DocumentationBuilder
+from DocumentationBuilder.archive_store import ArchiveStore
+from DocumentationBuilder.build_cache import BuildCache
+from DocumentationBuilder.build_process import BuildProcess
+from DocumentationBuilder.dependency_cache import DependencyCache
+from DocumentationBuilder.documentation_builder import BuildTarget, DocumentationBuilder
+from Pipeline.pipeline import Pipeline, Stage
+from RepositoryIndex.repository_index import RepositoryIndex
 import argparse
-from typing import Optional
+from typing import List, Optional
 
+# Modules that import requests or markdown are imported where they are first used, so a build-only run
+# never loads them. The daemon imports them all up front instead, see `--serve`.
+HEAVY_MODULES = (
+    'BatchSync.batch_sync',
+    'ConfluenceUploader.confluence_uploader',
+    'ConfluenceUploader.delta_sync',
+    'changelog_renderer',
+    'markdown',
+    'utility',
+)
 
-def main(doc_type: str, repo_file_path: str, project_name: str, scheme_name: Optional[str]):
-    print(f'Step 1: Building DocC Archive')
-    docc_archive = DocumentationBuilder.build_documentation_archive(
-        repo_file_path,
-        doc_type,
-        project_name,
-        scheme_name
-    )
 
-    # The following code is commented out and may be implemented in the future:
-    # - Searching for CHANGELOG and README files in the repository
-    # - Uploading README to the Library Parent Page
-    # - (Potentially removed) Zipping the DocC Archive and uploading it to the Library Parent Page
-    # - Uploading CHANGELOG to the Library CHANGELOG Page
+def main(
+    doc_type: str,
+    repo_file_path: str,
+    project_name: str,
+    scheme_name: Optional[str],
+    force: bool = False,
+    verify_manifest: bool = False,
+    build_cache_dir: Optional[str] = None,
+    build: bool = True,
+    upload: bool = True,
+    targets: Optional[List[str]] = None,
+    platforms: Optional[List[str]] = None,
+    max_parallel_builds: Optional[int] = None,
+    build_timeout_seconds: Optional[float] = DocumentationBuilder.DEFAULT_BUILD_TIMEOUT_SECONDS,
+    dependency_cache_dir: Optional[str] = None,
+    archive_store_dir: Optional[str] = None,
+    keep_archive_versions: int = ArchiveStore.DEFAULT_KEEP_VERSIONS
+) -> bool:
+    """
+    Builds and syncs the documentation of a single project.
+
+    The sync runs as a pipeline with two independent branches: the DocC build, zip and attachment upload on
+    one side, and the README/CHANGELOG discovery, rendering and page uploads on the other. Pages are published
+    while the build is still running, and the archive is zipped and uploaded as soon as it exists.
+
+    Without `upload`, only the archive is built and Confluence is never contacted. Without `build`, only
+    the README and CHANGELOG pages are published.
+
+    With `targets` or `platforms`, every target is built for every platform, concurrently, and every
+    archive is zipped and uploaded as soon as its own build finished, while the other builds still run.
+
+    A build subprocess running longer than `build_timeout_seconds` is killed and its build fails. With a
+    `dependency_cache_dir`, dependencies and build state are kept in a cache shared with other libraries and runs.
+    With an `archive_store_dir`, every archive is stored as a version of its target in a deduplicating store, of
+    which only the `keep_archive_versions` most recent versions of every target are kept.
+
+    :return: True if every stage succeeded.
+    """
+    uploader = None
+    if upload:
+        from ConfluenceUploader.confluence_uploader import ConfluenceUploader
+        uploader = ConfluenceUploader()
 
-    # print(
-    #     f"Step 2: Searching for CHANGELOG and README file's in repo file path: {repo_file_path}")
-    # changelog_file, readme_file = Utility.find_changelog_and_readme_files(
-    #     repo_file_path
-    # )
+    if verify_manifest and uploader:
+        print(f'Verifying sync manifest against Confluence')
+        uploader.verify_manifest(Config.CONFLUENCE_PARENT_PAGE_ID)
+        uploader.verify_manifest(Config.CONFLUENCE_CHANGELOG_PAGE_ID)
 
-    # print(f"Step 3: Uploading README to Library Parent Page")
-    # ConfluenceUploader.update_confluence_page(
-    #     project_name,
-    #     readme_file,
-    #     Config.CONFLUENCE_PARENT_PAGE_ID
-    # )
+    build_cache = BuildCache(build_cache_dir) if build_cache_dir else None
+    dependency_cache = DependencyCache(dependency_cache_dir) if dependency_cache_dir else None
+    archive_store = ArchiveStore(archive_store_dir, keep_archive_versions) if archive_store_dir else None
+
+    def build_archive():
+        print(f'Step 1: Building DocC Archive')
+        if targets or platforms:
+            # Every archive moves on to be zipped and uploaded as soon as its build finished.
+            docc_archives = DocumentationBuilder.build_documentation_archives_as_completed(
+                repo_file_path,
+                doc_type,
+                targets or [project_name],
+                platforms,
+                scheme_name,
+                build_cache,
+                max_parallel_builds,
+                build_timeout_seconds,
+                dependency_cache,
+                archive_store
+            )
+        else:
+            docc_archives = [(BuildTarget(project_name), DocumentationBuilder.build_documentation_archive(
+                repo_file_path,
+                doc_type,
+                project_name,
+                scheme_name,
+                build_cache,
+                timeout_seconds=build_timeout_seconds,
+                dependency_cache=dependency_cache,
+                archive_store=archive_store
+            ))]
+        failed_builds = []
+        for build_target, docc_archive in docc_archives:
+            if docc_archive is None:
+                failed_builds.append(build_target.name)
+            else:
+                yield build_target, docc_archive
+        if build_cache:
+            build_cache.print_stats()
+        if dependency_cache:
+            dependency_cache.print_stats()
+        if archive_store:
+            archive_store.collect_garbage()
+            archive_store.print_stats()
+        if failed_builds:
+            raise RuntimeError(f'no .doccarchive was produced for {", ".join(failed_builds)}')
 
     # TODO: This will probably be removed, and updated to AWS page somehow
-    # print(f"Step 4: Zip DocC Archive and upload to Library Parent Page")
-    # docc_archive_zip = Utility.create_zip(docc_archive)
-    # ConfluenceUploader.upload_file_to_confluence_page_as_attachment(
-    #     docc_archive_zip,
-    #     Config.CONFLUENCE_PARENT_PAGE_ID
-    # )
+    def zip_archive(built_archive):
+        from utility import Utility
 
-    # print(f"Step 4: Uploading CHANGELOG to Library CHANGELOG Page")
-    # ConfluenceUploader.update_confluence_page(
-    #     f'{project_name} CHANGELOG',
-    #     changelog_file,
-    #     Config.CONFLUENCE_CHANGELOG_PAGE_ID
-    # )
+        build_target, docc_archive = built_archive
+        print(f"Step 4: Zip DocC Archive and upload to Library Parent Page")
+        # A deterministic zip of an unchanged archive is byte-identical, so its upload is skipped by hash.
+        docc_archive_zip = Utility.create_zip(str(docc_archive), deterministic=True)
+        if build_target.platform:
+            # The archives of all platforms have the same name, their attachments are told apart by the platform.
+            platform_zip = os.path.join(os.path.dirname(docc_archive_zip), f'{build_target.name}.zip')
+            os.replace(docc_archive_zip, platform_zip)
+            docc_archive_zip = platform_zip
+        yield docc_archive_zip
 
+    def upload_archive(docc_archive_zip):
+        uploader.upload_file_to_confluence_page_as_attachment(
+            docc_archive_zip,
+            Config.CONFLUENCE_PARENT_PAGE_ID,
+            force
+        )
+        yield from ()
 
-if __name__ == "__main__":
+    def find_pages():
+        print(
+            f"Step 2: Searching for CHANGELOG and README file's in repo file path: {repo_file_path}")
+        library = RepositoryIndex.inspect(repo_file_path)
+        # A missing page fails this stage, but the page that was found is still published.
+        if library.readme_file:
+            yield project_name, library.readme_file, Config.CONFLUENCE_PARENT_PAGE_ID, False
+        if library.changelog_file:
+            yield f'{project_name} CHANGELOG', library.changelog_file, Config.CONFLUENCE_CHANGELOG_PAGE_ID, True
+        if library.missing_pages:
+            raise FileNotFoundError(f'{", ".join(library.missing_pages)} not found in {library.path}')
+
+    def render_page(page):
+        from changelog_renderer import ChangelogRenderer
+        from utility import Utility
+
+        title, markdown_file, page_id, is_changelog = page
+        if is_changelog:
+            body_content = ChangelogRenderer(Utility.MARKDOWN_RENDERER).render_file(markdown_file)
+        else:
+            body_content = Utility.render_markdown_file_as_HTML(markdown_file)
+        yield title, body_content, page_id
+
+    def upload_page(page):
+        title, body_content, page_id = page
+        print(f"Step 3: Uploading {title} to Confluence page {page_id}")
+        uploader.update_confluence_page_content(title, body_content, page_id, force)
+        yield from ()
+
+    stages = []
+    if build:
+        stages.append(Stage('build', build_archive))
+    if build and upload:
+        stages += [
+            Stage('zip', zip_archive, upstream='build'),
+            Stage('upload_archive', upload_archive, upstream='zip'),
+        ]
+    if upload:
+        stages += [
+            Stage('find_pages', find_pages),
+            Stage('render_pages', render_page, upstream='find_pages', workers=2),
+            Stage('upload_pages', upload_page, upstream='render_pages', workers=2),
+        ]
+
+    try:
+        results = Pipeline(stages).run()
+    finally:
+        if uploader:
+            uploader.close()
+
+    Pipeline.print_report(results)
+    return all(result.succeeded for result in results.values())
+
+
+def cli(argv: Optional[List[str]] = None, in_daemon: bool = False) -> int:
+    """
+    Runs a DocumentationSync command line.
+
+    :param argv: The command line arguments, defaults to `sys.argv[1:]`.
+    :param in_daemon: Whether the command runs inside a `--serve` daemon, which never forwards it again.
+    :return: The exit status of the command.
+    """
     parser = argparse.ArgumentParser(
         description="Build and sync documentation for the specified project."
     )
-    parser.add_argument("repo_file_path", help="The path to the repository.")
-    parser.add_argument("project_name", help="The name of the project.")
-    parser.add_argument("doc_type", choices=["Package", "xcodeproj", "xcframework"], help="The type of documentation to build: Package, xcodeproj, or xcframework.")
+    parser.add_argument("repo_file_path", nargs="?", help="The path to the repository.")
+    parser.add_argument("project_name", nargs="?", help="The name of the project.")
+    parser.add_argument("doc_type", nargs="?", choices=["Package", "xcodeproj", "xcframework"], help="The type of documentation to build: Package, xcodeproj, or xcframework.")
     parser.add_argument(
         "--scheme_name",
         default=None,
         help="The name of the scheme (optional, required for xcodeproj type).",
     )
+    stages_group = parser.add_mutually_exclusive_group()
+    stages_group.add_argument(
+        "--build-only",
+        action="store_true",
+        help="Only build the DocC archive, without contacting Confluence.",
+    )
+    stages_group.add_argument(
+        "--upload-only",
+        action="store_true",
+        help="Only publish the README and CHANGELOG pages, without building the DocC archive.",
+    )
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        metavar="TARGET",
+        default=None,
+        help="Build the documentation of several targets concurrently (defaults to project_name).",
+    )
+    parser.add_argument(
+        "--platforms",
+        nargs="+",
+        choices=DocumentationBuilder.PLATFORMS,
+        metavar="PLATFORM",
+        default=None,
+        help=f"Build every target for each of these platforms: {', '.join(DocumentationBuilder.PLATFORMS)}.",
+    )
+    parser.add_argument(
+        "--parallel-builds",
+        type=int,
+        default=None,
+        help="The maximum number of concurrent builds with --targets or --platforms (defaults to half the cores).",
+    )
+    parser.add_argument(
+        "--build-timeout",
+        type=float,
+        metavar="SECONDS",
+        default=DocumentationBuilder.DEFAULT_BUILD_TIMEOUT_SECONDS,
+        help="Kill a build subprocess, and everything it started, after this many seconds, 0 to never time out "
+             f"(defaults to {DocumentationBuilder.DEFAULT_BUILD_TIMEOUT_SECONDS}).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Publish every page, even if the sync manifest reports it as unchanged.",
+    )
+    parser.add_argument(
+        "--verify-manifest",
+        action="store_true",
+        help="Compare the sync manifest against the remote pages and drop drifted entries before syncing.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Only send the page updates and attachment uploads that earlier runs left unfinished in the publish journal, "
+             "without building or rendering anything.",
+    )
+
+    parser.add_argument(
+        "--build-cache-dir",
+        default=None,
+        help="Reuse previously built DocC archives from this directory when none of the build inputs changed.",
+    )
+    parser.add_argument(
+        "--dependency-cache-dir",
+        default=None,
+        help="Keep package dependencies and build state in this directory, shared by every library and reused by later builds.",
+    )
+    parser.add_argument(
+        "--archive-store-dir",
+        default=None,
+        help="Store every built archive as a version of its target in this directory, keeping each distinct file once, "
+             "and leave hard links to the stored files in the docs directory.",
+    )
+    parser.add_argument(
+        "--keep-archive-versions",
+        type=int,
+        default=ArchiveStore.DEFAULT_KEEP_VERSIONS,
+        help=f"The number of versions of every target kept in --archive-store-dir (defaults to {ArchiveStore.DEFAULT_KEEP_VERSIONS}).",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="MANIFEST",
+        default=None,
+        help="Sync every library listed in a JSON manifest instead of a single project.",
+    )
+    parser.add_argument(
+        "--discover",
+        metavar="ROOT",
+        default=None,
+        help="List every library under ROOT, with its inferred doc_type and any missing README or CHANGELOG, instead of syncing.",
+    )
+    parser.add_argument(
+        "--discovery-cache",
+        metavar="PATH",
+        default=None,
+        help="Keep the directory listings of --discover in this file, so later runs only list the directories that changed.",
+    )
+    parser.add_argument(
+        "--build-workers",
+        type=int,
+        default=None,
+        help="The number of concurrent DocC builds in batch mode (defaults to the number of cores).",
+    )
+    parser.add_argument(
+        "--upload-workers",
+        type=int,
+        default=4,
+        help="The number of concurrent Confluence uploads in batch mode.",
+    )
+    parser.add_argument(
+        "--metrics-jsonl",
+        metavar="PATH",
+        default=None,
+        help="Append a JSON line with the wall time, CPU time and bytes of every build, zip, render and HTTP request.",
+    )
+    parser.add_argument(
+        "--metrics-prometheus",
+        metavar="PATH",
+        default=None,
+        help="Write the aggregated metrics of the run to a Prometheus textfile (.prom).",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        default=None,
+        help="Run under cProfile, print the slowest functions and dump the stats to this file.",
+    )
+
+    parser.add_argument(
+        "--serve",
+        metavar="SOCKET",
+        default=None,
+        help="Run as a daemon that executes the commands sent to this Unix socket, with every module already imported.",
+    )
+    parser.add_argument(
+        "--daemon",
+        metavar="SOCKET",
+        default=os.environ.get("DOCUMENTATION_SYNC_DAEMON"),
+        help="Send this command to the daemon serving this Unix socket (defaults to $DOCUMENTATION_SYNC_DAEMON). "
+             "The command runs locally if no daemon is listening.",
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        if in_daemon:
+            parser.error("--serve can not be sent to a daemon.")
+        from sync_daemon import SyncDaemon
+
+        SyncDaemon.serve(args.serve, lambda command: cli(command, in_daemon=True), HEAVY_MODULES)
+        return 0
+
+    if not args.batch and not args.discover and not args.resume and not (args.repo_file_path and args.project_name and args.doc_type):
+        parser.error("repo_file_path, project_name and doc_type are required unless --batch, --discover or --resume is used.")
 
-    args = parser.parse_args()
+    if args.keep_archive_versions < 1:
+        parser.error("--keep-archive-versions must be at least 1.")
 
-    main(args.repo_file_path, args.project_name, args.doc_type, args.scheme_name)
+    if args.daemon and not in_daemon:
+        from sync_daemon import SyncDaemon
+
+        status = SyncDaemon.submit(args.daemon, sys.argv[1:] if argv is None else argv)
+        if status is not None:
+            return status
+        print(f'Warning: no daemon is listening on {args.daemon}, running the command locally.', file=sys.stderr)
+
+    # Build subprocesses run in their own process groups, so neither Ctrl-C nor a SIGTERM sent to this
+    # process reaches them. Both stop the sync with an exception instead, which kills them.
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit(128 + signal_number))
+    Instrumentation.configure(args.metrics_jsonl)
+    try:
+        succeeded = run_command(args)
+    except BaseException:
+        BuildProcess.cancel_all()
+        raise
+
+    if args.metrics_prometheus:
+        Instrumentation.write_prometheus(args.metrics_prometheus)
+    return 0 if succeeded else 1
+
+
+def run_command(args: argparse.Namespace) -> bool:
+    """
+    Runs the discovery, journal resume, batch sync or single project sync selected by the parsed command line.
+
+    :return: True if the command succeeded.
+    """
+    with Instrumentation.profile(args.profile) if args.profile else contextlib.nullcontext():
+        if args.discover:
+            index = RepositoryIndex(args.discover, args.discovery_cache)
+            index.scan()
+            index.print_report()
+            succeeded = not any(library.missing for library in index.libraries)
+        elif args.resume:
+            from ConfluenceUploader.confluence_uploader import ConfluenceUploader
+
+            uploader = ConfluenceUploader()
+            try:
+                errors = uploader.resume_journal()
+            finally:
+                uploader.close()
+            succeeded = not any(errors)
+        elif args.batch:
+            from BatchSync.batch_sync import BatchSync
+
+            results = BatchSync.run(
+                BatchSync.load_manifest(args.batch),
+                args.build_workers,
+                args.upload_workers,
+                args.force,
+                args.build_cache_dir,
+                args.dependency_cache_dir,
+                args.archive_store_dir,
+                args.keep_archive_versions
+            )
+            BatchSync.print_report(results)
+            succeeded = all(result.succeeded for result in results)
+        else:
+            succeeded = main(
+                args.doc_type,
+                args.repo_file_path,
+                args.project_name,
+                args.scheme_name,
+                args.force,
+                args.verify_manifest,
+                args.build_cache_dir,
+                build=not args.upload_only,
+                upload=not args.build_only,
+                targets=args.targets,
+                platforms=args.platforms,
+                max_parallel_builds=args.parallel_builds,
+                build_timeout_seconds=args.build_timeout or None,
+                dependency_cache_dir=args.dependency_cache_dir,
+                archive_store_dir=args.archive_store_dir,
+                keep_archive_versions=args.keep_archive_versions
+            )
+    return succeeded
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,324 @@
+# archive_builder.py
+
+import os
+import stat
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import BinaryIO, List, NamedTuple, Optional, Tuple
+
+
+class _Entry(NamedTuple):
+    name: str
+    path: Optional[str]
+    mode: int
+    mtime: float
+    size: int
+
+
+class _CompressedEntry(NamedTuple):
+    entry: _Entry
+    method: int
+    crc: int
+    compressed_size: int
+    chunks: List[bytes]
+
+
+class ArchiveBuilder:
+    """
+    A parallel, streaming zip archive builder for .doccarchive directories.
+
+    Entries are compressed on a pool of worker threads (zlib releases the GIL, so this scales across
+    cores) and written to the output file as soon as they are ready, with a bounded number of entries
+    in flight. Files that are already compressed, like images, fonts and archives, are stored without
+    recompression. Files larger than `LARGE_FILE_BYTES` are streamed straight into the output instead
+    of being buffered by a worker.
+
+    In deterministic mode entries are written in sorted order with fixed timestamps and permissions,
+    so identical inputs always produce byte-identical archives.
+
+    The class includes the following method:
+
+    - build(source_dir: str, output_path: str) -> str:
+    Zips the contents of a directory into `output_path` and returns the output path.
+    """
+
+    STORED_SUFFIXES = (
+        '.png', '.jpg', '.jpeg', '.gif', '.webp', '.heic', '.avif',
+        '.woff', '.woff2', '.mp4', '.mov', '.m4v',
+        '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.br', '.7z', '.jar'
+    )
+    LARGE_FILE_BYTES = 32 * 1024 * 1024
+    CHUNK_SIZE = 1024 * 1024
+
+    # Fixed metadata of deterministic archives: the DOS epoch, and the usual file and directory modes.
+    DETERMINISTIC_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+    DETERMINISTIC_FILE_MODE = 0o100644
+    DETERMINISTIC_DIRECTORY_MODE = 0o040755
+
+    _STORED = 0
+    _DEFLATED = 8
+    _ZIP64_LIMIT = 0xFFFFFFFF
+    _ZIP64_COUNT_LIMIT = 0xFFFF
+    _UTF8_FLAG = 0x0800
+
+    def __init__(
+        self,
+        compression_level: int = 6,
+        workers: Optional[int] = None,
+        deterministic: bool = False
+    ):
+        """
+        :param compression_level: The zlib compression level of compressed entries, from 1 (fastest) to 9 (smallest).
+        :param workers: The number of compression threads, defaults to the number of available cores.
+        :param deterministic: Write sorted entries with fixed timestamps, so identical inputs produce identical archives.
+        """
+        self.compression_level = compression_level
+        self.workers = workers or os.cpu_count() or 1
+        self.deterministic = deterministic
+
+    def build(self, source_dir: str, output_path: str) -> str:
+        """
+        Zips the contents of a directory. Entry names are relative to `source_dir`.
+
+        :param source_dir: The directory to zip.
+        :param output_path: The path of the zip file to write.
+        :return: The output path.
+        """
+        entries = self.__collect_entries(source_dir)
+        central_directory = []
+        # Written next to the output and renamed over it when complete, so a file linked to an earlier
+        # archive, like a journaled upload, keeps its contents, and a failed build leaves no partial zip.
+        temp_path = f'{output_path}.{os.getpid()}.tmp'
+
+        try:
+            self.__write_archive(entries, temp_path, central_directory)
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return output_path
+
+    def __write_archive(self, entries: List[_Entry], output_path: str, central_directory: List[Tuple]):
+        with open(output_path, 'wb') as output, ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            in_flight = set()
+            max_in_flight = self.workers * 2
+
+            def drain(block: bool):
+                if self.deterministic:
+                    # Keep the sorted order: only the oldest pending entry may be written.
+                    while pending and (block or pending[0].done()):
+                        future = pending.popleft()
+                        in_flight.discard(future)
+                        central_directory.append(self.__write_entry(output, future.result()))
+                        block = False
+                else:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED) if block else (
+                        [future for future in in_flight if future.done()], None)
+                    for future in done:
+                        in_flight.discard(future)
+                        central_directory.append(self.__write_entry(output, future.result()))
+
+            for entry in entries:
+                if entry.path is not None and entry.size > ArchiveBuilder.LARGE_FILE_BYTES:
+                    # Flush everything queued first, so deterministic archives keep their order.
+                    while in_flight:
+                        drain(block=True)
+                    central_directory.append(self.__stream_large_entry(output, entry))
+                    continue
+
+                future = pool.submit(self.__compress_entry, entry)
+                in_flight.add(future)
+                if self.deterministic:
+                    pending.append(future)
+                drain(block=len(in_flight) >= max_in_flight)
+
+            while in_flight:
+                drain(block=True)
+
+            self.__write_central_directory(output, central_directory)
+
+    def __collect_entries(self, source_dir: str) -> List[_Entry]:
+        entries = []
+        for directory, directory_names, file_names in os.walk(source_dir):
+            directory_names.sort()
+            relative_directory = os.path.relpath(directory, source_dir)
+            for name in directory_names + sorted(file_names):
+                path = os.path.join(directory, name)
+                file_stat = os.stat(path)
+                entry_name = name if relative_directory == os.curdir else os.path.join(relative_directory, name)
+                entry_name = entry_name.replace(os.sep, '/')
+                if stat.S_ISDIR(file_stat.st_mode):
+                    entries.append(_Entry(entry_name + '/', None, file_stat.st_mode, file_stat.st_mtime, 0))
+                else:
+                    entries.append(_Entry(entry_name, path, file_stat.st_mode, file_stat.st_mtime, file_stat.st_size))
+
+        if self.deterministic:
+            entries.sort(key=lambda entry: entry.name)
+        return entries
+
+    def __compress_entry(self, entry: _Entry) -> _CompressedEntry:
+        if entry.path is None:
+            return _CompressedEntry(entry, ArchiveBuilder._STORED, 0, 0, [])
+
+        store = entry.name.lower().endswith(ArchiveBuilder.STORED_SUFFIXES)
+        compressor = None if store else zlib.compressobj(self.compression_level, zlib.DEFLATED, -15)
+        crc = 0
+        chunks = []
+        with open(entry.path, 'rb') as file:
+            for chunk in iter(lambda: file.read(ArchiveBuilder.CHUNK_SIZE), b''):
+                crc = zlib.crc32(chunk, crc)
+                chunks.append(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            chunks.append(compressor.flush())
+
+        method = ArchiveBuilder._STORED if store else ArchiveBuilder._DEFLATED
+        return _CompressedEntry(entry, method, crc, sum(len(chunk) for chunk in chunks), chunks)
+
+    def __write_entry(self, output: BinaryIO, compressed: _CompressedEntry) -> Tuple:
+        offset = output.tell()
+        header = self.__local_header(compressed.entry, compressed.method, compressed.crc, compressed.compressed_size)
+        output.write(header)
+        for chunk in compressed.chunks:
+            output.write(chunk)
+        return compressed.entry, compressed.method, compressed.crc, compressed.compressed_size, offset
+
+    def __stream_large_entry(self, output: BinaryIO, entry: _Entry) -> Tuple:
+        # The sizes and CRC are only known after compressing, so a placeholder header is patched afterwards.
+        store = entry.name.lower().endswith(ArchiveBuilder.STORED_SUFFIXES)
+        method = ArchiveBuilder._STORED if store else ArchiveBuilder._DEFLATED
+        compressor = None if store else zlib.compressobj(self.compression_level, zlib.DEFLATED, -15)
+
+        offset = output.tell()
+        # Deflate can grow incompressible data slightly, reserve zip64 sizes if the result might overflow.
+        force_zip64 = entry.size > ArchiveBuilder._ZIP64_LIMIT - (entry.size >> 8) - 1024
+        output.write(self.__local_header(entry, method, 0, 0, force_zip64))
+
+        crc = 0
+        compressed_size = 0
+        with open(entry.path, 'rb') as file:
+            for chunk in iter(lambda: file.read(ArchiveBuilder.CHUNK_SIZE), b''):
+                crc = zlib.crc32(chunk, crc)
+                data = compressor.compress(chunk) if compressor else chunk
+                compressed_size += len(data)
+                output.write(data)
+        if compressor:
+            data = compressor.flush()
+            compressed_size += len(data)
+            output.write(data)
+
+        end = output.tell()
+        output.seek(offset)
+        output.write(self.__local_header(entry, method, crc, compressed_size, force_zip64))
+        output.seek(end)
+        return entry, method, crc, compressed_size, offset
+
+    def __local_header(
+        self,
+        entry: _Entry,
+        method: int,
+        crc: int,
+        compressed_size: int,
+        force_zip64: bool = False
+    ) -> bytes:
+        name = entry.name.encode('utf-8')
+        dos_time, dos_date = self.__dos_date_time(entry)
+        zip64 = force_zip64 or max(entry.size, compressed_size) >= ArchiveBuilder._ZIP64_LIMIT
+        extra = struct.pack('<HHQQ', 0x0001, 16, entry.size, compressed_size) if zip64 else b''
+        return struct.pack(
+            '<IHHHHHIIIHH',
+            0x04034b50,
+            45 if zip64 else 20,
+            ArchiveBuilder._UTF8_FLAG,
+            method,
+            dos_time,
+            dos_date,
+            crc,
+            ArchiveBuilder._ZIP64_LIMIT if zip64 else compressed_size,
+            ArchiveBuilder._ZIP64_LIMIT if zip64 else entry.size,
+            len(name),
+            len(extra)
+        ) + name + extra
+
+    def __dos_date_time(self, entry: _Entry) -> Tuple[int, int]:
+        if self.deterministic:
+            year, month, day, hour, minute, second = ArchiveBuilder.DETERMINISTIC_DATE_TIME
+        else:
+            local_time = time.localtime(entry.mtime)
+            year, month, day, hour, minute, second = local_time[:6]
+            year = max(1980, year)
+        return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+    def __central_header(self, entry: _Entry, method: int, crc: int, compressed_size: int, offset: int) -> bytes:
+        name = entry.name.encode('utf-8')
+        dos_time, dos_date = self.__dos_date_time(entry)
+
+        # Only the fields that overflow are moved into the zip64 extra field, in this fixed order.
+        zip64_fields = []
+        if entry.size >= ArchiveBuilder._ZIP64_LIMIT:
+            zip64_fields.append(entry.size)
+        if compressed_size >= ArchiveBuilder._ZIP64_LIMIT:
+            zip64_fields.append(compressed_size)
+        if offset >= ArchiveBuilder._ZIP64_LIMIT:
+            zip64_fields.append(offset)
+        extra = struct.pack(f'<HH{len(zip64_fields)}Q', 0x0001, 8 * len(zip64_fields), *zip64_fields) if zip64_fields else b''
+
+        is_directory = entry.path is None
+        if self.deterministic:
+            mode = ArchiveBuilder.DETERMINISTIC_DIRECTORY_MODE if is_directory else ArchiveBuilder.DETERMINISTIC_FILE_MODE
+        else:
+            mode = entry.mode
+        # The high 16 bits hold the unix mode, bit 4 is the MS-DOS directory flag.
+        external_attributes = (mode << 16) | (0x10 if is_directory else 0)
+
+        return struct.pack(
+            '<IHHHHHHIIIHHHHHII',
+            0x02014b50,
+            (3 << 8) | 45,
+            45 if zip64_fields else 20,
+            ArchiveBuilder._UTF8_FLAG,
+            method,
+            dos_time,
+            dos_date,
+            crc,
+            min(compressed_size, ArchiveBuilder._ZIP64_LIMIT),
+            min(entry.size, ArchiveBuilder._ZIP64_LIMIT),
+            len(name),
+            len(extra),
+            0,
+            0,
+            0,
+            external_attributes,
+            min(offset, ArchiveBuilder._ZIP64_LIMIT)
+        ) + name + extra
+
+    def __write_central_directory(self, output: BinaryIO, central_directory: List[Tuple]):
+        start = output.tell()
+        for entry, method, crc, compressed_size, offset in central_directory:
+            output.write(self.__central_header(entry, method, crc, compressed_size, offset))
+        end = output.tell()
+
+        count = len(central_directory)
+        size = end - start
+        if (count >= ArchiveBuilder._ZIP64_COUNT_LIMIT
+                or start >= ArchiveBuilder._ZIP64_LIMIT
+                or size >= ArchiveBuilder._ZIP64_LIMIT):
+            # Zip64 end of central directory record, followed by its locator.
+            output.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, size, start))
+            output.write(struct.pack('<IIQI', 0x07064b50, 0, end, 1))
+
+        output.write(struct.pack(
+            '<IHHHHIIH',
+            0x06054b50,
+            0,
+            0,
+            min(count, ArchiveBuilder._ZIP64_COUNT_LIMIT),
+            min(count, ArchiveBuilder._ZIP64_COUNT_LIMIT),
+            min(size, ArchiveBuilder._ZIP64_LIMIT),
+            min(start, ArchiveBuilder._ZIP64_LIMIT),
+            0
+        ))
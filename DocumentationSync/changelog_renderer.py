@@ -0,0 +1,197 @@
+# changelog_renderer.py
+
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from markdown_renderer import MarkdownRenderer
+from storage_format import StorageFormat
+
+
+class ChangelogSection(NamedTuple):
+    """
+    One release section of a CHANGELOG, or the preamble before the first release.
+    """
+    heading: str
+    source: str
+
+
+class ChangelogRenderer:
+    """
+    A CHANGELOG-aware renderer that renders and caches a CHANGELOG one release section at a time.
+
+    The file is split into sections at its release headings (`## ...`, as in Keep a Changelog), and
+    every section is rendered on its own through a `MarkdownRenderer`, whose content-addressed cache
+    memoizes the HTML per section. Since CHANGELOGs only grow, a new release renders one new section
+    and reuses the cached HTML of every older one.
+
+    Reference-style link definitions, usually collected at the bottom of a CHANGELOG, are appended to
+    the sections that use them, so each section renders exactly as it would as part of the whole file
+    while its cache key only changes when its own content does.
+
+    The class includes the following methods:
+
+    - parse(source: str) -> List[ChangelogSection]:
+    Splits a CHANGELOG into its preamble and release sections, newest first as written.
+
+    - render_sections(sections: List[ChangelogSection]) -> str:
+    Renders sections as HTML, reusing the cached HTML of unchanged sections.
+
+    - render(source: str) -> str:
+    Renders a whole CHANGELOG as HTML, section by section.
+
+    - read_file(changelog_file_path: str) -> Iterator[ChangelogSection]:
+    Reads the sections of a CHANGELOG file one at a time.
+
+    - render_file(changelog_file_path: str) -> str:
+    Renders a CHANGELOG file as HTML, streaming it one section at a time.
+
+    - render_file_pages(changelog_file_path: str, sections_per_page: Optional[int]) -> List[str]:
+    Renders a CHANGELOG file as the HTML of its page and of its archive pages.
+    """
+
+    SECTION_HEADING = re.compile(r'^##(?!#)\s')
+    FENCE = re.compile(r'^\s{0,3}(`{3,}|~{3,})')
+    REFERENCE_DEFINITION = re.compile(r'^\s{0,3}\[([^\]]+)\]:\s*\S')
+    REFERENCE_USE = re.compile(r'\[([^\]]+)\]')
+
+    def __init__(self, markdown_renderer: MarkdownRenderer):
+        """
+        :param markdown_renderer: The renderer used for, and caching, each section.
+        """
+        self.markdown_renderer = markdown_renderer
+
+    @staticmethod
+    def parse(source: str) -> List[ChangelogSection]:
+        """
+        Splits a CHANGELOG into its preamble and release sections, in document order.
+        Reference-style link definitions are attached to every section that uses them.
+
+        :param source: The Markdown source of the CHANGELOG.
+        :return: The sections. The first one is the preamble, with an empty heading, if the file has one.
+        """
+        lines = source.splitlines(keepends=True)
+        definitions = ChangelogRenderer.__definitions(lines)
+        return list(ChangelogRenderer.__sections(lines, definitions))
+
+    @staticmethod
+    def __definitions(lines: Iterable[str]) -> Dict[str, str]:
+        definitions = {}
+        for _ in ChangelogRenderer.__blocks(lines, definitions):
+            pass
+        return definitions
+
+    @staticmethod
+    def __sections(lines: Iterable[str], definitions: Dict[str, str]) -> Iterator[ChangelogSection]:
+        for block in ChangelogRenderer.__blocks(lines, {}):
+            body = ''.join(block)
+            used = {label.lower() for label in ChangelogRenderer.REFERENCE_USE.findall(body)}
+            references = ''.join(definitions[label] for label in sorted(used) if label in definitions)
+            if references:
+                body = body.rstrip('\n') + '\n\n' + references
+            heading = block[0].strip() if ChangelogRenderer.SECTION_HEADING.match(block[0]) else ''
+            yield ChangelogSection(heading, body)
+
+    @staticmethod
+    def __blocks(lines: Iterable[str], definitions: Dict[str, str]) -> Iterator[List[str]]:
+        # Yields the lines of the preamble and of every release section, without the reference definitions,
+        # which are collected into `definitions`. Only one block is held at a time.
+        block = []
+        fence = None
+        for line in lines:
+            fence_match = ChangelogRenderer.FENCE.match(line)
+            if fence_match:
+                marker = fence_match.group(1)
+                if fence is None:
+                    fence = marker
+                elif marker[0] == fence[0] and len(marker) >= len(fence):
+                    fence = None
+            elif fence is None:
+                definition = ChangelogRenderer.REFERENCE_DEFINITION.match(line)
+                if definition:
+                    definitions[definition.group(1).lower()] = line if line.endswith('\n') else line + '\n'
+                    continue
+                if ChangelogRenderer.SECTION_HEADING.match(line) and block:
+                    yield block
+                    block = []
+            block.append(line)
+        if block:
+            yield block
+
+    def render_sections(self, sections: Iterable[ChangelogSection]) -> str:
+        """
+        Renders sections as HTML, reusing the cached HTML of unchanged sections.
+        Repeated heading anchors are numbered across all of the sections, as in a whole-page render.
+
+        :param sections: The sections to render, a list or a generator, which is consumed one section at a time.
+        :return: The HTML of the sections, joined in order.
+        """
+        return ChangelogRenderer.__join(
+            self.markdown_renderer.render(section.source, number_anchors=False) for section in sections
+        )
+
+    def render(self, source: str) -> str:
+        """
+        Renders a whole CHANGELOG as HTML, section by section.
+
+        :param source: The Markdown source of the CHANGELOG.
+        :return: The rendered HTML content.
+        """
+        return self.render_sections(ChangelogRenderer.parse(source))
+
+    @staticmethod
+    def read_file(changelog_file_path: str) -> Iterator[ChangelogSection]:
+        """
+        Reads the sections of a CHANGELOG file, like `parse`, one at a time.
+
+        The file is read twice, line by line: once for its reference-style link definitions, and once
+        for its sections, each read when the previous one has been consumed. The source of more than a
+        single section is never held in memory.
+
+        :param changelog_file_path: The path of the CHANGELOG file.
+        :return: The sections, in document order.
+        """
+        with open(changelog_file_path, 'r', encoding='utf-8') as file:
+            definitions = ChangelogRenderer.__definitions(file)
+            file.seek(0)
+            yield from ChangelogRenderer.__sections(file, definitions)
+
+    def render_file(self, changelog_file_path: str) -> str:
+        """
+        Renders a CHANGELOG file as HTML, section by section.
+        Every section is rendered and dropped before the next one is read, see `read_file`.
+
+        :param changelog_file_path: The path of the CHANGELOG file.
+        :return: The rendered HTML content.
+        """
+        return self.render_sections(ChangelogRenderer.read_file(changelog_file_path))
+
+    def render_file_pages(self, changelog_file_path: str, sections_per_page: Optional[int]) -> List[str]:
+        """
+        Renders a CHANGELOG file as the HTML of its page, with the preamble and the newest releases, and of
+        its archive pages, with `sections_per_page` older releases each. Archive pages are counted from the
+        oldest release, so they stay unchanged as new releases are added. Sections are streamed like in
+        `render_file`, only their HTML is kept.
+
+        :param changelog_file_path: The path of the CHANGELOG file.
+        :param sections_per_page: The number of releases per page, or None to render every release on one page.
+        :return: The HTML of the CHANGELOG page, followed by the HTML of every archive page, oldest first.
+        """
+        preamble, releases = [], []
+        for section in ChangelogRenderer.read_file(changelog_file_path):
+            html = self.markdown_renderer.render(section.source, number_anchors=False)
+            (releases if section.heading else preamble).append(html)
+        if not sections_per_page:
+            return [ChangelogRenderer.__join(preamble + releases)]
+
+        # Releases are written newest first.
+        pages = [preamble + releases[:sections_per_page]]
+        archived = releases[sections_per_page:][::-1]
+        for start in range(0, len(archived), sections_per_page):
+            pages.append(archived[start:start + sections_per_page][::-1])
+        return [ChangelogRenderer.__join(page) for page in pages]
+
+    @staticmethod
+    def __join(htmls: Iterable[str]) -> str:
+        # Anchors are numbered section by section, which never copies the HTML of the whole page.
+        slugs = {}
+        return '\n'.join(StorageFormat.number_anchors(html, slugs) for html in htmls)
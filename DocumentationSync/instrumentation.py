@@ -0,0 +1,312 @@
+# instrumentation.py
+
+import io
+import json
+import os
+import re
+import resource
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+class Span:
+    """
+    A single timed operation, such as a build, a zip, a render or an HTTP request.
+
+    `labels` are low-cardinality values that metrics are grouped by (e.g. the HTTP method and status),
+    `measurements` are numbers summed up per metric (e.g. bytes), and `details` are free-form values
+    that only appear in the JSON lines output (e.g. the URL of a request).
+    """
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.measurements = {}
+        self.details = {}
+
+    def label(self, **labels):
+        """
+        Adds or replaces labels of the span.
+        """
+        self.labels.update(labels)
+
+    def measure(self, **measurements):
+        """
+        Adds numeric measurements to the span, summed up when a measurement is given more than once.
+        """
+        for key, value in measurements.items():
+            self.measurements[key] = self.measurements.get(key, 0) + value
+
+    def annotate(self, **details):
+        """
+        Adds free-form details to the span, only written to the JSON lines output.
+        """
+        self.details.update(details)
+
+
+class Instrumentation:
+    """
+    A lightweight, process-wide instrumentation layer for timing every stage of a sync.
+
+    Each instrumented operation is recorded as a `Span` with its wall time, the CPU time of the thread
+    that ran it, and any measurements added by the operation itself, such as bytes written or retries.
+    Spans are aggregated in memory per name and labels, which is cheap enough to be always on, and are
+    optionally appended to a JSON lines file as they finish. The aggregates can be exported in the
+    Prometheus textfile format, for the node_exporter textfile collector.
+
+    The JSON lines path is also passed on through the environment, so build worker processes append
+    their spans to the same file.
+
+    The class includes the following methods:
+
+    - configure(jsonl_path: Optional[str]):
+    Sets the JSON lines file spans are appended to, or None to only aggregate them in memory.
+
+    - span(name: str, **labels) -> ContextManager[Span]:
+    Times the operation run inside the context and records it when the context exits.
+
+    - record(name: str, seconds: float, **labels):
+    Records an operation timed elsewhere, e.g. a build phase parsed from the build output.
+
+    - summary() -> dict:
+    Returns the aggregated count, errors, seconds and measurements of every metric.
+
+    - write_prometheus(path: str):
+    Writes the aggregates to a file in the Prometheus textfile format.
+
+    - profile(stats_path: str) -> ContextManager:
+    Runs the code inside the context under cProfile, and dumps the stats to a file.
+    """
+
+    METRIC_PREFIX = 'documentation_sync'
+    JSONL_PATH_ENVIRONMENT_VARIABLE = 'DOCUMENTATION_SYNC_METRICS_JSONL'
+
+    _lock = threading.Lock()
+    _aggregates = {}
+    _jsonl_file = None
+    _jsonl_path = None
+
+    @staticmethod
+    def configure(jsonl_path: Optional[str]):
+        """
+        Sets the JSON lines file spans are appended to.
+
+        :param jsonl_path: The path of the JSON lines file, or None to stop writing spans to a file.
+        """
+        with Instrumentation._lock:
+            if Instrumentation._jsonl_file is not None:
+                Instrumentation._jsonl_file.close()
+                Instrumentation._jsonl_file = None
+            Instrumentation._jsonl_path = os.path.abspath(jsonl_path) if jsonl_path else None
+
+        if jsonl_path:
+            os.environ[Instrumentation.JSONL_PATH_ENVIRONMENT_VARIABLE] = Instrumentation._jsonl_path
+        else:
+            os.environ.pop(Instrumentation.JSONL_PATH_ENVIRONMENT_VARIABLE, None)
+
+    @staticmethod
+    @contextmanager
+    def span(name: str, **labels):
+        """
+        Times the operation run inside the context, and records it when the context exits.
+        An exception raised inside the context marks the span as failed and is re-raised.
+
+        :param name: The name of the operation, e.g. "build" or "http_request".
+        :param labels: Low-cardinality labels the metrics of the span are grouped by.
+        :return: The span, to add labels, measurements and details to.
+        """
+        span = Span(name, labels)
+        started_at = time.time()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            Instrumentation.__record(
+                span,
+                started_at,
+                time.perf_counter() - wall_start,
+                time.thread_time() - cpu_start,
+                error
+            )
+
+    @staticmethod
+    def record(
+        name: str,
+        seconds: float,
+        started_at: Optional[float] = None,
+        measurements: Optional[dict] = None,
+        details: Optional[dict] = None,
+        **labels
+    ):
+        """
+        Records an operation that was not timed by a `span` context, e.g. a build phase whose start and end
+        are parsed from the build output. It is recorded without CPU time.
+
+        :param name: The name of the operation, e.g. "build_phase".
+        :param seconds: The wall time of the operation.
+        :param started_at: The Unix time the operation started at, defaults to `seconds` ago.
+        :param measurements: Numeric measurements of the operation.
+        :param details: Free-form details, only written to the JSON lines output.
+        :param labels: Low-cardinality labels the metrics of the operation are grouped by.
+        """
+        span = Span(name, labels)
+        span.measure(**(measurements or {}))
+        span.annotate(**(details or {}))
+        Instrumentation.__record(
+            span,
+            started_at if started_at is not None else time.time() - seconds,
+            seconds,
+            0.0,
+            None
+        )
+
+    @staticmethod
+    def children_cpu_seconds() -> float:
+        """
+        Returns the CPU time used so far by the finished subprocesses of this process, e.g. a DocC build.
+        """
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    @staticmethod
+    def summary() -> dict:
+        """
+        Returns the aggregated metrics of every span recorded by this process.
+
+        :return: A mapping of (name, labels) to the `count`, `errors`, `seconds`, `cpu_seconds` and summed measurements.
+        """
+        with Instrumentation._lock:
+            return {key: dict(aggregate) for key, aggregate in Instrumentation._aggregates.items()}
+
+    @staticmethod
+    def write_prometheus(path: str):
+        """
+        Writes the aggregated metrics in the Prometheus textfile format.
+        The file is replaced atomically, so a collector never reads it half written.
+
+        :param path: The path of the .prom file to write.
+        """
+        metrics = {}
+        for (name, labels), aggregate in sorted(Instrumentation.summary().items()):
+            label_text = ','.join(f'{key}="{Instrumentation.__escape_label(value)}"' for key, value in labels)
+            for key, value in aggregate.items():
+                metric = re.sub(r'[^a-zA-Z0-9_]', '_', f'{Instrumentation.METRIC_PREFIX}_{name}_{key}_total')
+                metrics.setdefault(metric, []).append(f'{metric}{{{label_text}}} {value}')
+
+        lines = []
+        for metric, samples in metrics.items():
+            lines.append(f'# TYPE {metric} counter')
+            lines.extend(samples)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+        print(f'Wrote metrics to {path}')
+
+    @staticmethod
+    @contextmanager
+    def profile(stats_path: str, top: int = 25):
+        """
+        Runs the code inside the context under cProfile, including every thread started inside it.
+        The merged stats are dumped to a file that can be loaded with `pstats` or snakeviz, and the
+        functions with the highest cumulative time are printed. Worker processes are not profiled.
+
+        :param stats_path: The path of the stats file to write.
+        :param top: The number of functions to print.
+        """
+        import cProfile
+        import pstats
+
+        profilers = [cProfile.Profile()]
+        profilers_lock = threading.Lock()
+
+        # Installed as the profile function of new threads, it replaces itself with a profiler per thread.
+        def profile_thread(*_):
+            profiler = cProfile.Profile()
+            with profilers_lock:
+                profilers.append(profiler)
+            profiler.enable()
+
+        threading.setprofile(profile_thread)
+        profilers[0].enable()
+        try:
+            yield
+        finally:
+            profilers[0].disable()
+            threading.setprofile(None)
+
+            report = io.StringIO()
+            stats = pstats.Stats(profilers[0], stream=report)
+            with profilers_lock:
+                for profiler in profilers[1:]:
+                    profiler.disable()
+                    try:
+                        stats.add(profiler)
+                    except TypeError:
+                        # A thread that never ran any Python code has no stats.
+                        pass
+            stats.dump_stats(stats_path)
+            stats.sort_stats('cumulative').print_stats(top)
+            print(report.getvalue())
+            print(f'Wrote profile to {stats_path}')
+
+    @staticmethod
+    def __record(span: Span, started_at: float, seconds: float, cpu_seconds: float, error: Optional[BaseException]):
+        labels = tuple(sorted((key, str(value)) for key, value in span.labels.items()))
+        event = {
+            'name': span.name,
+            'started_at': round(started_at, 6),
+            'seconds': round(seconds, 6),
+            'cpu_seconds': round(cpu_seconds, 6),
+            'labels': dict(labels),
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name
+        }
+        event.update(span.measurements)
+        event.update(span.details)
+        if error is not None:
+            event['error'] = repr(error)
+
+        with Instrumentation._lock:
+            aggregate = Instrumentation._aggregates.setdefault(
+                (span.name, labels),
+                {'count': 0, 'errors': 0, 'seconds': 0.0, 'cpu_seconds': 0.0}
+            )
+            aggregate['count'] += 1
+            aggregate['errors'] += error is not None
+            aggregate['seconds'] += seconds
+            aggregate['cpu_seconds'] += cpu_seconds
+            for key, value in span.measurements.items():
+                aggregate[key] = aggregate.get(key, 0) + value
+
+            jsonl_file = Instrumentation.__jsonl_file()
+            if jsonl_file is not None:
+                # One write per line, so lines appended by several processes never interleave.
+                jsonl_file.write(json.dumps(event, default=str) + '\n')
+                jsonl_file.flush()
+
+    @staticmethod
+    def __jsonl_file():
+        # Worker processes inherit the path through the environment, and open the file on their first span.
+        if Instrumentation._jsonl_path is None:
+            Instrumentation._jsonl_path = os.environ.get(Instrumentation.JSONL_PATH_ENVIRONMENT_VARIABLE) or ''
+        if Instrumentation._jsonl_file is None and Instrumentation._jsonl_path:
+            os.makedirs(os.path.dirname(Instrumentation._jsonl_path), exist_ok=True)
+            Instrumentation._jsonl_file = open(Instrumentation._jsonl_path, 'a', encoding='utf-8')
+        return Instrumentation._jsonl_file
+
+    @staticmethod
+    def __escape_label(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
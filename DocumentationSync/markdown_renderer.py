@@ -0,0 +1,201 @@
+# markdown_renderer.py
+
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from instrumentation import Instrumentation
+from storage_format import StorageFormat
+
+
+class MarkdownRenderer:
+    """
+    A reusable Markdown to Confluence storage format renderer with a bounded, content-addressed render cache.
+
+    The Markdown parser and its extension registry are built once and reset between documents,
+    instead of being reconstructed for every file. Code macros, attachment links, heading anchors and
+    the `&` escaping needed by Confluence are produced within the rendering pass, see `StorageFormat`.
+
+    Rendered output is memoized by the SHA-256 of the Markdown source, in an in-memory LRU cache and
+    in an optional on-disk cache, both bounded. Unchanged READMEs and CHANGELOGs are therefore never
+    rendered twice, not even across runs. Rendering is serialized by a lock, so one renderer can be
+    shared between threads. Files are memory-mapped rather than read, so an unchanged file is
+    hashed without being copied into memory, and only decoded when it actually has to be rendered.
+
+    The class includes the following methods:
+
+    - render(source: str, number_anchors: bool) -> str:
+    Renders a Markdown string as storage format HTML.
+
+    - render_file(markdown_file_path: str) -> str:
+    Renders a Markdown file as storage format HTML.
+    """
+
+    # Bump whenever the rendered output changes, so stale on-disk cache entries are never used.
+    RENDERER_VERSION = '3'
+
+    DEFAULT_CACHE_DIRECTORY = '~/.documentation_sync/render_cache'
+    DEFAULT_MEMORY_ENTRIES = 256
+    DEFAULT_DISK_BYTES = 256 * 1024 * 1024
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIRECTORY,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+        disk_bytes: int = DEFAULT_DISK_BYTES
+    ):
+        """
+        :param cache_dir: The directory of the on-disk render cache, or None to only cache in memory.
+        :param memory_entries: The maximum number of rendered documents kept in memory.
+        :param disk_bytes: The maximum total size of the on-disk render cache.
+        """
+        self.cache_dir = os.path.expanduser(cache_dir) if cache_dir else None
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_bytes
+        self._memory_cache = OrderedDict()
+        self._disk_size = None
+        self._lock = threading.Lock()
+
+        # The parser is built by the first render, see `__load_parser`.
+        self._markdown = None
+        self._cache_namespace = None
+
+    def render(self, source: str, number_anchors: bool = True) -> str:
+        """
+        Renders a Markdown string as Confluence storage format HTML.
+
+        :param source: The Markdown content to render.
+        :param number_anchors: Number repeated heading anchors. A part of a page, e.g. a CHANGELOG section, is
+            rendered without, and its anchors are numbered with `StorageFormat.number_anchors` once the whole
+            page is joined.
+        :return: The rendered HTML content.
+        """
+        html = self.__render(source.encode('utf-8'), source)
+        return StorageFormat.number_anchors(html) if number_anchors else html
+
+    def render_file(self, markdown_file_path: str) -> str:
+        """
+        Renders a Markdown file as Confluence storage format HTML.
+
+        :param markdown_file_path: The path of the Markdown file to render.
+        :return: The rendered HTML content.
+        """
+        with open(markdown_file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return self.__render(b'')
+            # The file is hashed straight from the mapping, it is only decoded when the render cache misses.
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                return StorageFormat.number_anchors(self.__render(mapped_file))
+
+    def __render(self, source_bytes, source: Optional[str] = None) -> str:
+        with Instrumentation.span('render') as span:
+            span.measure(bytes=len(source_bytes))
+            return self.__cached_render(span, source_bytes, source)
+
+    def __cached_render(self, span, source_bytes, source: Optional[str]) -> str:
+        if self._markdown is None:
+            self.__load_parser()
+        hasher = hashlib.sha256(self._cache_namespace)
+        hasher.update(source_bytes)
+        digest = hasher.hexdigest()
+
+        with self._lock:
+            html = self._memory_cache.get(digest)
+            if html is not None:
+                self._memory_cache.move_to_end(digest)
+                span.label(cache='memory')
+                return html
+
+        html = self.__read_disk_cache(digest)
+        if html is None:
+            span.label(cache='miss')
+            if source is None:
+                source = str(source_bytes, 'utf-8')
+            with self._lock:
+                html = self._markdown.reset().convert(source)
+            self.__write_disk_cache(digest, html)
+        else:
+            span.label(cache='disk')
+
+        with self._lock:
+            self._memory_cache[digest] = html
+            self._memory_cache.move_to_end(digest)
+            while len(self._memory_cache) > self.memory_entries:
+                self._memory_cache.popitem(last=False)
+        return html
+
+    def __load_parser(self):
+        # markdown is imported on first use, so commands that never render do not pay for importing it.
+        import markdown
+
+        with self._lock:
+            if self._markdown is None:
+                parser = markdown.Markdown(output_format='xhtml')
+                StorageFormat.register(parser)
+                self._cache_namespace = f'{MarkdownRenderer.RENDERER_VERSION}|{markdown.__version__}|'.encode('utf-8')
+                self._markdown = parser
+
+    def __cache_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f'{digest}.html')
+
+    def __read_disk_cache(self, digest: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        path = self.__cache_path(digest)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                html = file.read()
+        except (FileNotFoundError, UnicodeDecodeError):
+            return None
+        # Touch the entry, the disk cache evicts the least recently used files first.
+        os.utime(path)
+        return html
+
+    def __write_disk_cache(self, digest: str, html: str):
+        if not self.cache_dir:
+            return
+        path = self.__cache_path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+                file.write(html)
+            os.replace(temp_path, path)
+
+            # The cache directory is only walked when it may have outgrown its cap.
+            if self._disk_size is None:
+                self._disk_size = self.__evict_disk_cache()
+            else:
+                self._disk_size += os.path.getsize(path)
+                if self._disk_size > self.disk_bytes:
+                    self._disk_size = self.__evict_disk_cache()
+        except OSError as e:
+            # The render cache is an optimization, never fail a render because of it.
+            print(f'Warning: could not write the render cache at {path}: {e}')
+
+    def __evict_disk_cache(self) -> int:
+        entries = []
+        total_size = 0
+        for directory, _, file_names in os.walk(self.cache_dir):
+            for name in file_names:
+                path = os.path.join(directory, name)
+                try:
+                    file_stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((file_stat.st_mtime, file_stat.st_size, path))
+                total_size += file_stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total_size <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        return total_size
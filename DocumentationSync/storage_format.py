@@ -0,0 +1,299 @@
+# storage_format.py
+
+import posixpath
+import re
+from typing import Dict, Optional
+
+
+class _StorageMarkup(str):
+    """
+    Storage format markup stashed by this module. It is already valid storage XHTML, and its CDATA
+    sections must not be escaped again.
+    """
+
+
+class StorageFormat:
+    """
+    Renders Markdown straight to Confluence storage format, as part of the Markdown rendering pass.
+
+    Instead of post-processing the rendered HTML, this hooks into the Markdown parser, so every
+    document is converted in the single traversal of its element tree that precedes serialization:
+
+    - Fenced and indented code blocks become `code` macros, their code kept verbatim in CDATA sections.
+    - Relative links and images point to page attachments, `#...` links to anchors of the page.
+    - Headings get an `anchor` macro with their GitHub-style slug, so README links to sections keep working.
+      Repeated slugs are numbered by `number_anchors` once the whole page is rendered.
+    - Bare `&` characters of raw HTML are escaped. Text and attributes are escaped by the serializer,
+      entities such as `&lt;` are left alone.
+
+    The preprocessor and the tree processor only need a `run` method, so they do not subclass markdown's
+    classes, and importing this module imports neither markdown nor its dependencies: build-only
+    commands import it, but never render.
+
+    The class includes the following methods:
+
+    - register(parser) -> None:
+    Registers the storage format processors with a `markdown.Markdown` parser.
+
+    - code_macro(code: str, language: Optional[str]) -> str:
+    Returns the storage format markup of a code macro.
+
+    - anchor_macro(name: str) -> str:
+    Returns the storage format markup of an anchor macro.
+
+    - attachment_name(url: str) -> Optional[str]:
+    Returns the attachment file name a relative URL refers to.
+
+    - slug(text: str) -> str:
+    Returns the anchor name of a heading.
+
+    - escape_ampersands(markup: str) -> str:
+    Escapes the `&` characters of markup that do not start an entity.
+
+    - number_anchors(markup: str, slugs: Optional[Dict[str, int]]) -> str:
+    Numbers the repeated heading anchors of a rendered page.
+    """
+
+    HEADING_TAGS = frozenset({'h1', 'h2', 'h3', 'h4', 'h5', 'h6'})
+    BARE_AMPERSAND = re.compile(r'&(?!#[0-9]+;|#[xX][0-9a-fA-F]+;|[A-Za-z][A-Za-z0-9]*;)')
+    # URLs with a scheme, root-relative and protocol-relative URLs, and fragments or queries of the page itself.
+    NON_RELATIVE_URL = re.compile(r'[A-Za-z][A-Za-z0-9+.-]*:|[/#?]|$')
+    SLUG_PUNCTUATION = re.compile(r'[^\w\- ]')
+    ANCHOR_MACRO = re.compile(
+        r'<ac:structured-macro ac:name="anchor"><ac:parameter ac:name="">([\w-]+)</ac:parameter></ac:structured-macro>'
+    )
+
+    @staticmethod
+    def register(parser):
+        """
+        Registers the storage format processors with a Markdown parser.
+
+        :param parser: The `markdown.Markdown` parser.
+        """
+        # Stashed code macros are block-level, so they are not wrapped in a paragraph.
+        parser.block_level_elements.append('ac:structured-macro')
+        # Between normalizing whitespace and stashing raw HTML blocks, like markdown's fenced_code extension.
+        parser.preprocessors.register(_FencedCodePreprocessor(parser), 'storage_fenced_code', 25)
+        # After `unescape`, so headings and URLs no longer hold placeholders of backslash escapes.
+        parser.treeprocessors.register(_StorageFormatTreeprocessor(parser), 'storage_format', -5)
+
+    @staticmethod
+    def code_macro(code: str, language: Optional[str] = None) -> str:
+        """
+        Returns the storage format markup of a code macro.
+
+        :param code: The code, unescaped.
+        :param language: The language of the code, e.g. `swift`, if known.
+        :return: The markup of the macro.
+        """
+        import html
+
+        parameter = f'<ac:parameter ac:name="language">{html.escape(language)}</ac:parameter>' if language else ''
+        # A CDATA section cannot hold `]]>`, it is split across two sections.
+        body = code.replace(']]>', ']]]]><![CDATA[>')
+        return _StorageMarkup(
+            f'<ac:structured-macro ac:name="code">{parameter}'
+            f'<ac:plain-text-body><![CDATA[{body}]]></ac:plain-text-body></ac:structured-macro>'
+        )
+
+    @staticmethod
+    def anchor_macro(name: str) -> str:
+        """
+        Returns the storage format markup of an anchor macro.
+
+        :param name: The name of the anchor, a slug, which needs no escaping.
+        :return: The markup of the macro.
+        """
+        return _StorageMarkup(
+            f'<ac:structured-macro ac:name="anchor"><ac:parameter ac:name="">{name}</ac:parameter></ac:structured-macro>'
+        )
+
+    @staticmethod
+    def attachment_name(url: str) -> Optional[str]:
+        """
+        Returns the attachment file name a relative URL refers to, e.g. `diagram.png` for `docs/diagram.png`.
+
+        :param url: The URL of a link or an image.
+        :return: The file name, or None if the URL is absolute, root-relative, or does not name a file.
+        """
+        from urllib.parse import unquote
+
+        if StorageFormat.NON_RELATIVE_URL.match(url):
+            return None
+        path = url.partition('#')[0].partition('?')[0]
+        # Attachments of a page are flat, only the file name of the path is kept.
+        return posixpath.basename(unquote(path)) or None
+
+    @staticmethod
+    def slug(text: str) -> str:
+        """
+        Returns the anchor name of a heading, the way GitHub names them, e.g. `getting-started` for "Getting Started!".
+
+        :param text: The text of the heading.
+        :return: The anchor name, empty if the heading has no word characters.
+        """
+        return StorageFormat.SLUG_PUNCTUATION.sub('', text.strip().lower()).replace(' ', '-')
+
+    @staticmethod
+    def escape_ampersands(markup: str) -> str:
+        """
+        Escapes the `&` characters of markup that do not start an entity or a character reference.
+
+        :param markup: The markup to escape.
+        :return: The escaped markup.
+        """
+        if '&' not in markup:
+            return markup
+        return StorageFormat.BARE_AMPERSAND.sub('&amp;', markup)
+
+    @staticmethod
+    def number_anchors(markup: str, slugs: Optional[Dict[str, int]] = None) -> str:
+        """
+        Numbers the repeated heading anchors of a rendered page, like GitHub does: `added`, `added-1`, `added-2`.
+
+        Headings are rendered with their plain slug and numbered once the page is rendered, so a page rendered
+        section by section, such as a CHANGELOG, gets the same anchors as when it is rendered at once, while
+        the cached HTML of a section does not depend on the sections before it.
+
+        :param markup: The storage format markup of the page, or of one of its parts.
+        :param slugs: The anchors used by the previous parts of the page, updated with the anchors of `markup`.
+            A page numbered part by part, in order, gets the same anchors as when it is numbered at once.
+        :return: The markup, with unique anchor names.
+        """
+        if 'ac:name="anchor"' not in markup:
+            return markup
+        # Every used anchor maps to the last number tried for it, so a CHANGELOG with a thousand `Added`
+        # headings is not quadratic.
+        if slugs is None:
+            slugs = {}
+
+        def number(match) -> str:
+            slug = match.group(1)
+            unique_slug, suffix = slug, slugs.get(slug, 0)
+            while unique_slug in slugs:
+                suffix += 1
+                unique_slug = f'{slug}-{suffix}'
+            slugs[slug] = suffix
+            slugs.setdefault(unique_slug, 0)
+            return match.group(0) if unique_slug == slug else StorageFormat.anchor_macro(unique_slug)
+
+        return StorageFormat.ANCHOR_MACRO.sub(number, markup)
+
+
+class _FencedCodePreprocessor:
+    FENCED_BLOCK = re.compile(
+        r'^(?P<fence>`{3,}|~{3,})[ \t]*\{?\.?(?P<language>[\w#+.-]*)[^\n]*\n(?P<code>.*?)(?<=\n)(?P=fence)[ \t]*$',
+        re.MULTILINE | re.DOTALL
+    )
+
+    def __init__(self, md):
+        self.md = md
+
+    def run(self, lines):
+        text = '\n'.join(lines)
+        if '```' not in text and '~~~' not in text:
+            return lines
+        return _FencedCodePreprocessor.FENCED_BLOCK.sub(self.__stash, text).split('\n')
+
+    def __stash(self, match) -> str:
+        # The code group ends with the line break before the closing fence.
+        macro = StorageFormat.code_macro(match.group('code')[:-1], match.group('language') or None)
+        return f'\n\n{self.md.htmlStash.store(macro)}\n\n'
+
+
+class _StorageFormatTreeprocessor:
+    CONVERTED_TAGS = StorageFormat.HEADING_TAGS | {'pre', 'img', 'a'}
+
+    def __init__(self, md):
+        self.md = md
+
+    def run(self, root):
+        raw_html_blocks = self.md.htmlStash.rawHtmlBlocks
+        for index, block in enumerate(raw_html_blocks):
+            if isinstance(block, str) and not isinstance(block, _StorageMarkup):
+                raw_html_blocks[index] = StorageFormat.escape_ampersands(block)
+
+        # The elements to convert are collected in document order before any of them changes, so the
+        # conversions never disturb the iteration, and the iteration itself stays in C.
+        converted_tags = _StorageFormatTreeprocessor.CONVERTED_TAGS
+        for element in [element for element in root.iter() if element.tag in converted_tags]:
+            tag = element.tag
+            if tag == 'a':
+                self.__convert_link(element)
+            elif tag == 'img':
+                self.__convert_image(element)
+            elif tag == 'pre':
+                if len(element) == 1 and element[0].tag == 'code':
+                    self.__convert_code_block(element)
+            else:
+                self.__add_anchor(element)
+
+    def __convert_code_block(self, pre):
+        # Indented code blocks; markdown escaped their code when it parsed them.
+        code = (pre[0].text or '').rstrip('\n')
+        code = code.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
+        language = (pre[0].get('class') or '').partition('language-')[2].split(' ')[0] or None
+        # CDATA cannot be serialized from the tree, the macro is stashed like raw HTML.
+        tail = pre.tail
+        pre.clear()
+        pre.tag = 'p'
+        pre.text = self.__stash(StorageFormat.code_macro(code, language))
+        pre.tail = tail
+
+    def __convert_image(self, image):
+        import html
+
+        source = image.get('src')
+        if not source:
+            return
+        alt, title, tail = image.get('alt'), image.get('title'), image.tail
+        image.clear()
+        image.tag = 'ac:image'
+        if alt:
+            image.set('ac:alt', alt)
+        if title:
+            image.set('ac:title', title)
+        file_name = StorageFormat.attachment_name(source)
+        if file_name:
+            image.text = self.__stash(f'<ri:attachment ri:filename="{html.escape(file_name)}" />')
+        else:
+            image.text = self.__stash(f'<ri:url ri:value="{html.escape(source)}" />')
+        image.tail = tail
+
+    def __convert_link(self, link):
+        import html
+        from urllib.parse import unquote
+
+        href = link.get('href') or ''
+        if href.startswith('#'):
+            if len(href) == 1:
+                return
+            attributes, resource = {'ac:anchor': unquote(href[1:])}, None
+        else:
+            file_name = StorageFormat.attachment_name(href)
+            if not file_name:
+                return
+            attributes, resource = {}, f'<ri:attachment ri:filename="{html.escape(file_name)}" />'
+
+        body = link.makeelement('ac:link-body', {})
+        body.text = link.text
+        body.extend(list(link))
+        tail = link.tail
+        link.clear()
+        link.tag = 'ac:link'
+        link.attrib.update(attributes)
+        if resource:
+            link.text = self.__stash(resource)
+        link.append(body)
+        link.tail = tail
+
+    def __add_anchor(self, heading):
+        slug = StorageFormat.slug(''.join(heading.itertext()))
+        if not slug:
+            return
+        # Repeated slugs are left as they are, they are numbered once the whole page is rendered.
+        heading.text = self.__stash(StorageFormat.anchor_macro(slug)) + (heading.text or '')
+
+    def __stash(self, markup: str) -> str:
+        # Markup that is stashed serializes as a single placeholder, which is faster than serializing elements.
+        return self.md.htmlStash.store(_StorageMarkup(markup))
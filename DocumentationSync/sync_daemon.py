@@ -0,0 +1,166 @@
+# sync_daemon.py
+
+import importlib
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+from typing import Callable, Iterable, List, Optional
+
+
+class SyncDaemon:
+    """
+    A long-lived server running DocumentationSync commands sent over a local Unix socket.
+
+    Starting an interpreter and importing requests, markdown and the rest of DocumentationSync can take
+    longer than a short sync itself. The daemon pays for it once: it imports every module up front, then
+    forks a child for every command it receives. The child starts with everything already imported,
+    runs the command with the client's working directory and environment, and writes its combined output,
+    including that of build tools and worker processes, straight to the client's socket. Commands run
+    concurrently, each in its own process, so they never share state.
+
+    The socket is only accessible to the user running the daemon, since commands run with that user's
+    Confluence credentials.
+
+    The class includes the following methods:
+
+    - serve(socket_path: str, run_command: Callable[[List[str]], int], preload_modules: Iterable[str]):
+    Imports the given modules, then runs every command sent to the socket until interrupted.
+
+    - submit(socket_path: str, argv: List[str]) -> Optional[int]:
+    Runs a command in the daemon, copies its output to stdout, and returns its exit status.
+    """
+
+    # The exit status follows the output, on a line starting with this marker and the nonce of the command.
+    EXIT_MARKER = b'\0documentation-sync-exit '
+
+    @staticmethod
+    def serve(socket_path: str, run_command: Callable[[List[str]], int], preload_modules: Iterable[str] = ()):
+        """
+        Imports the given modules, then runs every command sent to the socket until interrupted.
+
+        :param socket_path: The path of the Unix socket to listen on.
+        :param run_command: Runs a command line and returns its exit status, in the forked child.
+        :param preload_modules: The modules to import before accepting commands.
+        :raises RuntimeError: If another daemon is already listening on the socket.
+        """
+        for module in preload_modules:
+            importlib.import_module(module)
+
+        if os.path.exists(socket_path):
+            if SyncDaemon.__connect(socket_path) is not None:
+                raise RuntimeError(f'A daemon is already listening on {socket_path}')
+            os.remove(socket_path)
+
+        class Handler(_CommandHandler):
+            command_function = staticmethod(run_command)
+
+        # The socket is created accessible to the current user only.
+        previous_umask = os.umask(0o177)
+        try:
+            server = _ForkingUnixServer(socket_path, Handler)
+        finally:
+            os.umask(previous_umask)
+
+        # Stop on SIGTERM like on Ctrl-C, so the socket is removed.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        print(f'Serving DocumentationSync commands on {socket_path} (pid {os.getpid()})')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.remove(socket_path)
+            print(f'Stopped serving on {socket_path}')
+
+    @staticmethod
+    def submit(socket_path: str, argv: List[str]) -> Optional[int]:
+        """
+        Runs a command in the daemon listening on the socket, and copies its output to stdout.
+
+        :param socket_path: The path of the Unix socket of the daemon.
+        :param argv: The command line arguments of the command.
+        :return: The exit status of the command, or None if no daemon is listening on the socket.
+        """
+        connection = SyncDaemon.__connect(socket_path)
+        if connection is None:
+            return None
+
+        nonce = os.urandom(16).hex()
+        request = {'argv': argv, 'cwd': os.getcwd(), 'environment': dict(os.environ), 'nonce': nonce}
+        trailer = SyncDaemon.EXIT_MARKER + nonce.encode('ascii') + b' '
+        # Enough to hold the whole trailer, so it is never split between written and held back output.
+        held_back = len(trailer) + 16
+
+        with connection:
+            connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            buffered = b''
+            while True:
+                chunk = connection.recv(65536)
+                if not chunk:
+                    break
+                buffered += chunk
+                if len(buffered) > held_back:
+                    sys.stdout.buffer.write(buffered[:-held_back])
+                    sys.stdout.buffer.flush()
+                    buffered = buffered[-held_back:]
+
+        index = buffered.rfind(trailer)
+        sys.stdout.buffer.write(buffered if index < 0 else buffered[:index])
+        sys.stdout.buffer.flush()
+        if index < 0:
+            print(f'Error: the daemon on {socket_path} closed the connection without an exit status', file=sys.stderr)
+            return 1
+        return int(buffered[index + len(trailer):].strip())
+
+    @staticmethod
+    def __connect(socket_path: str) -> Optional[socket.socket]:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            connection.close()
+            return None
+        return connection
+
+
+class _ForkingUnixServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    # Runs in the forked child, which exits once the command has finished.
+    command_function = None
+
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['environment'])
+
+        # Everything written to stdout and stderr, by this process or its children, goes to the client.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        null_file_descriptor = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null_file_descriptor, 0)
+        os.close(null_file_descriptor)
+        os.dup2(self.connection.fileno(), 1)
+        os.dup2(self.connection.fileno(), 2)
+        sys.stdout.reconfigure(line_buffering=True)
+
+        try:
+            status = self.command_function(request['argv'])
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.write(1, SyncDaemon.EXIT_MARKER + request['nonce'].encode('ascii') + f' {status}\n'.encode('ascii'))
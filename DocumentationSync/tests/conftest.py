@@ -0,0 +1,70 @@
+# conftest.py
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+# The packages of DocumentationSync are imported from its root, as when it runs with `python -m DocumentationSync`.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Benchmarks.fake_confluence import FakeConfluenceServer
+from Benchmarks.fake_toolchain import FakeToolchain
+from ConfluenceUploader.config import Config
+from ConfluenceUploader.confluence_uploader import ConfluenceUploader
+
+
+@pytest.fixture
+def confluence(tmp_path, monkeypatch):
+    """
+    A fake Confluence server, with `Config` pointing at it and every local state kept in `tmp_path`.
+    """
+    server = FakeConfluenceServer().start()
+    monkeypatch.setattr(Config, 'CONFLUENCE_BASE_URL', server.base_url)
+    monkeypatch.setattr(Config, 'SYNC_MANIFEST_PATH', str(tmp_path / 'sync_manifest.json'))
+    monkeypatch.setattr(Config, 'DELTA_INDEX_DIRECTORY', str(tmp_path / 'delta_indexes'))
+    monkeypatch.setattr(Config, 'PUBLISHED_STORAGE_DIRECTORY', str(tmp_path / 'published_storage'))
+    monkeypatch.setattr(Config, 'PUBLISH_JOURNAL_DIRECTORY', str(tmp_path / 'publish_journal'))
+    monkeypatch.setattr(Config, 'CONFLUENCE_BACKOFF_SECONDS', 0.01)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def uploader(confluence):
+    """
+    A `ConfluenceUploader` sending to the fake Confluence server.
+    """
+    uploader = ConfluenceUploader()
+    yield uploader
+    uploader.close()
+
+
+@pytest.fixture
+def toolchain(tmp_path, monkeypatch):
+    """
+    The fake `swift` and `xcodebuild`, first on PATH, generating small archives.
+    """
+    toolchain = FakeToolchain(str(tmp_path / 'bin'), file_count=20, file_bytes=256)
+    toolchain.install()
+    for name, value in toolchain.environment().items():
+        monkeypatch.setenv(name, value)
+    return toolchain
+
+
+@pytest.fixture
+def build_archive(tmp_path, toolchain):
+    """
+    Builds the .doccarchive of a Swift package target with the fake toolchain, and returns its path.
+    """
+    repo_path = tmp_path / 'TestKit'
+    repo_path.mkdir()
+    (repo_path / 'Package.swift').write_text('// swift-tools-version:5.7\n', encoding='utf-8')
+
+    def build(target: str = 'TestKit') -> str:
+        shutil.rmtree(repo_path / '.build', ignore_errors=True)
+        subprocess.run(['swift', 'package', 'generate-documentation', '--target', target], check=True, cwd=repo_path)
+        return str(repo_path / '.build' / 'plugins' / 'Swift-DocC' / 'outputs' / f'{target}.doccarchive')
+
+    return build
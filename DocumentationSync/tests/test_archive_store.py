@@ -0,0 +1,48 @@
+# test_archive_store.py
+import os
+
+import pytest
+
+from DocumentationBuilder.archive_store import ArchiveStore
+
+
+def put_versions(archive_store: ArchiveStore, archive_path: str, count: int) -> list:
+    # Every version has one file of its own, all the others are shared.
+    manifests = []
+    for version in range(count):
+        with open(os.path.join(archive_path, 'version.json'), 'w', encoding='utf-8') as file:
+            file.write(f'{{"version": {version}}}')
+        manifests.append(archive_store.put('TestKit', archive_path))
+    return manifests
+
+
+def test_garbage_collection_keeps_the_latest_versions(tmp_path, build_archive):
+    archive_store = ArchiveStore(str(tmp_path / 'store'), keep_versions=2)
+    manifests = put_versions(archive_store, build_archive(), 4)
+    blobs = archive_store.stats()['blobs']
+
+    assert archive_store.collect_garbage() == {'versions': 2, 'blobs': 2, 'bytes': 2 * len('{"version": 0}')}
+    assert archive_store.versions('TestKit') == [manifests[3].version, manifests[2].version]
+    assert archive_store.stats()['blobs'] == blobs - 2
+    with pytest.raises(FileNotFoundError):
+        archive_store.manifest(manifests[0].version)
+
+    materialized = archive_store.materialize('TestKit', str(tmp_path / 'materialized'), manifests[2].version)
+    with open(materialized / 'version.json', encoding='utf-8') as file:
+        assert file.read() == '{"version": 2}'
+    assert sum(1 for path in materialized.rglob('*') if path.is_file()) == len(manifests[2].files)
+
+
+def test_garbage_collection_argument_overrides_keep_versions(tmp_path, build_archive):
+    archive_store = ArchiveStore(str(tmp_path / 'store'))
+    manifests = put_versions(archive_store, build_archive(), 3)
+
+    assert archive_store.collect_garbage(keep_versions=1)['versions'] == 2
+    assert archive_store.versions('TestKit') == [manifests[2].version]
+
+
+def test_keep_versions_must_be_positive(tmp_path):
+    with pytest.raises(ValueError):
+        ArchiveStore(str(tmp_path / 'store'), keep_versions=0)
+    with pytest.raises(ValueError):
+        ArchiveStore(str(tmp_path / 'store')).collect_garbage(keep_versions=0)
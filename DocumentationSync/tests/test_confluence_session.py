@@ -0,0 +1,61 @@
+# test_confluence_session.py
+import socket
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from Benchmarks.fake_confluence import FakeConfluenceServer
+from ConfluenceUploader import confluence_session
+from ConfluenceUploader.confluence_session import ConfluenceSession
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """
+    Records the backoff delays of `ConfluenceSession` instead of sleeping.
+    """
+    delays = []
+    monkeypatch.setattr(
+        confluence_session,
+        'time',
+        SimpleNamespace(sleep=delays.append, time=time.time, monotonic=time.monotonic)
+    )
+    return delays
+
+
+def test_retry_after_is_honoured(sleeps):
+    with FakeConfluenceServer(throttle_every=2, retry_after_seconds=3) as server:
+        with ConfluenceSession(max_retries=2, backoff_seconds=0.5) as session:
+            assert session.get(f'{server.base_url}/pages/1').status_code == 200
+            assert session.get(f'{server.base_url}/pages/1').status_code == 200
+
+    assert server.request_counts['429'] == 1
+    assert server.request_counts['GET'] == 2
+    assert len(sleeps) == 1
+    assert 3 <= sleeps[0] <= 3.5
+
+
+def test_gives_up_after_max_retries(sleeps):
+    with FakeConfluenceServer(throttle_every=1) as server:
+        with ConfluenceSession(max_retries=2, backoff_seconds=0.5) as session:
+            response = session.get(f'{server.base_url}/pages/1')
+
+    assert response.status_code == 429
+    assert server.request_counts['429'] == 3
+    assert len(sleeps) == 2
+
+
+def test_connection_errors_back_off_exponentially(sleeps, monkeypatch):
+    # The highest delay allowed by the full jitter, to check the exponential ceiling and its cap.
+    monkeypatch.setattr(confluence_session, 'random', SimpleNamespace(uniform=lambda low, high: high))
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    with ConfluenceSession(max_retries=4, backoff_seconds=1.0, max_backoff_seconds=5.0) as session:
+        with pytest.raises(requests.exceptions.ConnectionError):
+            session.get(f'http://127.0.0.1:{port}/wiki/api/v2/pages/1')
+
+    assert sleeps == [1.0, 2.0, 4.0, 5.0]
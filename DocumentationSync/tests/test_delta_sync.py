@@ -0,0 +1,99 @@
+# test_delta_sync.py
+import json
+import os
+import zipfile
+
+import pytest
+
+from ConfluenceUploader.delta_sync import DeltaSync
+
+
+@pytest.fixture
+def uploads(uploader, monkeypatch):
+    """
+    Records the name of every uploaded attachment, and the `delta.json` of every uploaded delta package.
+    """
+    uploaded = []
+    upload = uploader.upload_file_to_confluence_page_as_attachment
+
+    def record(zip_file, page_id, force=False, progress_callback=None):
+        delta = None
+        if zip_file.endswith('.delta.zip'):
+            with zipfile.ZipFile(zip_file) as archive:
+                delta = json.loads(archive.read('delta.json'))
+        uploaded.append((os.path.basename(zip_file), delta))
+        return upload(zip_file, page_id, force, progress_callback)
+
+    monkeypatch.setattr(uploader, 'upload_file_to_confluence_page_as_attachment', record)
+    return uploaded
+
+
+def test_delta_lists_added_changed_and_removed_files(uploader, uploads, build_archive):
+    archive_path = build_archive()
+    delta_sync = DeltaSync(uploader)
+    base_index = DeltaSync.build_index(archive_path)
+
+    assert delta_sync.sync_archive(archive_path, '10')['mode'] == 'full'
+    assert [name for name, _ in uploads] == ['TestKit.zip', 'TestKit.index.json.gz']
+
+    changed, removed = sorted(base_index)[:2]
+    with open(os.path.join(archive_path, changed), 'a', encoding='utf-8') as file:
+        file.write('changed')
+    os.remove(os.path.join(archive_path, removed))
+    os.makedirs(os.path.join(archive_path, 'data', 'added'))
+    with open(os.path.join(archive_path, 'data', 'added', 'symbol.json'), 'w', encoding='utf-8') as file:
+        file.write('{}')
+    uploads.clear()
+
+    summary = delta_sync.sync_archive(archive_path, '10')
+
+    assert summary == {'mode': 'delta', 'added': 1, 'changed': 1, 'removed': 1}
+    assert [name for name, _ in uploads] == ['TestKit.delta.zip', 'TestKit.index.json.gz']
+    delta = uploads[0][1]
+    assert delta['added'] == ['data/added/symbol.json']
+    assert delta['changed'] == [changed]
+    assert delta['removed'] == [removed]
+    assert delta['base_index_digest'] == DeltaSync.index_digest(base_index)
+    assert delta['index_digest'] == DeltaSync.index_digest(DeltaSync.build_index(archive_path))
+
+
+def test_unchanged_archive_is_skipped_unless_full(uploader, uploads, confluence, build_archive):
+    archive_path = build_archive()
+    delta_sync = DeltaSync(uploader)
+    delta_sync.sync_archive(archive_path, '10')
+    uploads.clear()
+    confluence.reset_counts()
+
+    assert delta_sync.sync_archive(archive_path, '10')['mode'] == 'unchanged'
+    assert uploads == []
+
+    # The zip and index are the same as the last upload, and still sent to Confluence.
+    assert delta_sync.sync_archive(archive_path, '10', full=True)['mode'] == 'full'
+    assert [name for name, _ in uploads] == ['TestKit.zip', 'TestKit.index.json.gz']
+    assert confluence.request_counts['PUT'] == 2
+
+
+def test_sync_after_a_failed_index_upload_is_full(uploader, uploads, build_archive, monkeypatch):
+    archive_path = build_archive()
+    delta_sync = DeltaSync(uploader)
+    delta_sync.sync_archive(archive_path, '10')
+    with open(os.path.join(archive_path, 'data', 'added.json'), 'w', encoding='utf-8') as file:
+        file.write('{}')
+
+    record = uploader.upload_file_to_confluence_page_as_attachment
+
+    def fail_index(zip_file, page_id, force=False, progress_callback=None):
+        record(zip_file, page_id, force, progress_callback)
+        if zip_file.endswith('.index.json.gz'):
+            raise ConnectionError('Connection reset')
+
+    monkeypatch.setattr(uploader, 'upload_file_to_confluence_page_as_attachment', fail_index)
+    with pytest.raises(ConnectionError):
+        delta_sync.sync_archive(archive_path, '10')
+    monkeypatch.setattr(uploader, 'upload_file_to_confluence_page_as_attachment', record)
+    uploads.clear()
+
+    assert delta_sync.sync_archive(archive_path, '10')['mode'] == 'full'
+    assert [name for name, _ in uploads] == ['TestKit.zip', 'TestKit.index.json.gz']
+    assert os.listdir(delta_sync.index_dir) == ['10-TestKit.index.json']
+    assert delta_sync.sync_archive(archive_path, '10')['mode'] == 'unchanged'
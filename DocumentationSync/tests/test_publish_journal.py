@@ -0,0 +1,69 @@
+# test_publish_journal.py
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+
+from ConfluenceUploader.config import Config
+from ConfluenceUploader.publish_journal import PublishJournal
+from ConfluenceUploader.sync_manifest import SyncManifest
+
+
+def test_enqueue_supersedes_pending_jobs_of_the_same_target(tmp_path):
+    journal = PublishJournal(str(tmp_path))
+    first = journal.enqueue_page('1', 'Title', '<p>First</p>', 'digest-1')
+    other = journal.enqueue_page('2', 'Other', '<p>Other</p>', 'digest-2')
+    second = journal.enqueue_page('1', 'Title', '<p>Second</p>', 'digest-3')
+
+    assert not journal.claim(first)
+    assert journal.claim(second)
+    assert [(job.id, job.target) for job in journal.unfinished()] == [(other, '2')]
+    assert journal.counts() == {'superseded': 1, 'in_flight': 1, 'pending': 1}
+    assert len(os.listdir(tmp_path / 'payloads' / 'pages')) == 2
+    journal.close()
+
+
+def test_failed_jobs_are_pending_until_max_attempts(tmp_path):
+    journal = PublishJournal(str(tmp_path), max_attempts=2)
+    job_id = journal.enqueue_page('1', 'Title', '<p>Body</p>', 'digest')
+
+    for state in ('pending', 'failed'):
+        assert journal.claim(job_id)
+        journal.fail(job_id, ConnectionError('Connection reset'))
+        assert journal.counts() == {state: 1}
+    journal.close()
+
+
+def test_in_flight_jobs_of_stopped_processes_are_recovered_on_open(tmp_path):
+    journal = PublishJournal(str(tmp_path))
+    abandoned = journal.enqueue_page('1', 'Title', '<p>Abandoned</p>', 'digest-1')
+    running = journal.enqueue_page('2', 'Title', '<p>Running</p>', 'digest-2')
+    assert journal.claim(abandoned)
+    assert journal.claim(running)
+    journal.close()
+
+    stopped = subprocess.Popen([sys.executable, '-c', 'pass'])
+    stopped.wait()
+    with sqlite3.connect(tmp_path / 'journal.sqlite3') as connection:
+        connection.execute(
+            'UPDATE jobs SET owner = ? WHERE id = ?', (f'{socket.gethostname()}:{stopped.pid}', abandoned)
+        )
+    connection.close()
+
+    journal = PublishJournal(str(tmp_path))
+    assert journal.counts() == {'pending': 1, 'in_flight': 1}
+    assert [job.id for job in journal.unfinished()] == [abandoned]
+    journal.close()
+
+
+def test_resume_sends_only_the_newest_update_of_a_page(uploader, confluence):
+    journal = PublishJournal(Config.PUBLISH_JOURNAL_DIRECTORY)
+    for body in ('<p>First</p>', '<p>Second</p>'):
+        journal.enqueue_page('10', 'Resumed', body, SyncManifest.digest('Resumed', body))
+    journal.close()
+
+    assert uploader.resume_journal() == [None]
+    assert confluence.pages['10']['body'] == '<p>Second</p>'
+    assert confluence.request_counts['PUT'] == 1
+    assert uploader.async_uploader.journal.counts() == {'superseded': 1, 'completed': 1}
@@ -1,9 +1,11 @@
 # utility.py
 
-import markdown
-import shutil
 import os
-import sys
+from typing import Optional
+from archive_builder import ArchiveBuilder
+from changelog_renderer import ChangelogRenderer
+from instrumentation import Instrumentation
+from markdown_renderer import MarkdownRenderer
 
 
 class Utility:
@@ -12,78 +14,58 @@ A utility class containing methods for working with files and Markdown content.
 
 The class includes the following methods:
 
-- render_markdown_content_as_HTML(content: str) -> str: Renders a Markdown content string as HTML, 
-escaping & characters.
+- render_markdown_file_as_HTML(markdown_file_path: str) -> str: Renders a Markdown file as Confluence storage
+format HTML. Rendering uses a shared, cached MarkdownRenderer, files are streamed and rendered section by section.
 
-- create_zip(file_path: str) -> str: Creates a zip archive from a specified file path and returns the zipped 
-file's destination.
-
-- find_changelog_and_readme_files(repo_file_path: str) -> tuple[str, str]: Finds the changelog and readme files
- in a given repository directory and returns a tuple containing their paths.
+- create_zip(file_path: str, compression_level: int, workers: Optional[int], deterministic: bool) -> str: Creates a
+zip archive from a specified file path, compressing entries in parallel, and returns the zipped file's destination.
 
 """
 
+    MARKDOWN_RENDERER = MarkdownRenderer()
+
     @staticmethod
     def render_markdown_file_as_HTML(markdown_file_path: str) -> str:
         """
-        Renders a Markdown file content as HTML, escaping `&` characters.
+        Renders a Markdown file content as Confluence storage format HTML.
+        Unchanged sections are served from the render cache of `Utility.MARKDOWN_RENDERER`.
+
+        The Markdown parser holds a tree of the whole document, about 20 times the size of the file. Files
+        are therefore streamed and rendered one `## ` section at a time, like the CHANGELOG page, which only
+        ever holds the source and the tree of a single section, whatever the size of the file. Each section
+        is rendered on its own, so Markdown that spans a section heading, e.g. a list continued past it, may
+        render differently than in a render of the whole file.
 
         :param content: The Markdown file path string to be rendered as HTML.
         :return: The rendered HTML content.
         """
-        with open(markdown_file_path, 'r', encoding='utf-8') as file:
-            file_content = file.read()
-            markdown_content = markdown.markdown(file_content, output_format='xhtml')
-            return markdown_content.replace('&', '&amp;')
+        return ChangelogRenderer(Utility.MARKDOWN_RENDERER).render_file(markdown_file_path)
 
 
     @staticmethod
-    def create_zip(file_path: str) -> str:
+    def create_zip(
+        file_path: str,
+        compression_level: int = 6,
+        workers: Optional[int] = None,
+        deterministic: bool = False
+    ) -> str:
         """
         Creates a zip archive from a specified file path.
+        Entries are compressed in parallel, and already compressed assets are stored without recompression.
 
         :param file_path: The path to the file to be zipped.
+        :param compression_level: The zlib compression level, from 1 (fastest) to 9 (smallest).
+        :param workers: The number of compression threads, defaults to the number of available cores.
+        :param deterministic: Produce byte-identical archives for identical inputs.
         :return: The zipped file's destination path.
         """
         root_path, _ = os.path.splitext(file_path)
         print(
             f"Attempting to create .zip archive for root: {root_path}, from file path: {file_path}")
-        return shutil.make_archive(root_path, 'zip', file_path)
-
-
-    @staticmethod
-    def find_changelog_and_readme_files(repo_file_path: str) -> tuple[str, str]:
-        """
-        Finds the changelog and readme files in a given repository directory.
-
-        :param repo_file_path: The path to the repository directory.
-        :return: A tuple containing the paths to the changelog and readme files, respectively.
-        :raises SystemExit: If either the changelog or readme file is not found in the repository directory.
-        """
-        changelog_file = None
-        readme_file = None
-
-        files = os.listdir(repo_file_path)
-
-        for file in files:
-            file_lower = file.lower()
-            if file_lower == 'changelog.md':
-                changelog_file = os.path.join(repo_file_path, file)
-            elif file_lower == 'readme.md':
-                readme_file = os.path.join(repo_file_path, file)
-
-            if changelog_file and readme_file:
-                break
-
-        if not changelog_file:
-            print('changelog.md file not found in the repository',
-                    file=sys.stderr)
-            sys.exit(1)
-
-        if not readme_file:
-            print('readme.md file not found in the repository',
-                    file=sys.stderr)
-            sys.exit(1)
+        archive_builder = ArchiveBuilder(compression_level, workers, deterministic)
+        with Instrumentation.span('zip', compression_level=compression_level) as span:
+            zip_file_path = archive_builder.build(file_path, f'{root_path}.zip')
+            span.measure(bytes=os.path.getsize(zip_file_path))
+            span.annotate(path=zip_file_path)
+        return zip_file_path
 
-        print(f'Found changelog and readme files.')
-        return changelog_file, readme_file
\ No newline at end of file